@@ -6,16 +6,29 @@
  */
 import { DataLoader } from './DataLoader.js';
 import { TreemapViz } from './TreemapViz.js';
-import { TreeViz } from './TreeViz.js';
+import { TreeViewLoader } from './TreeViewLoader.js';
+import { VirtualList } from './VirtualList.js';
+import { InventairesPager } from './InventairesPager.js';
+
+// Hauteur fixe d'une ligne de la liste laterale (voir .virtual-rows dans index.html)
+const INVENTAIRE_ROW_HEIGHT = 92;
 
 class App {
   constructor() {
     this.dataLoader = new DataLoader();
     this.treemapViz = null;
-    this.treeViz = null;
+    // Arbre (et D3) charges a la premiere ouverture de la vue
+    this.treeView = new TreeViewLoader(this.dataLoader, 'tree-container', {
+      onNodeClick: (data) => this.handleTreeNodeClick(data),
+      // Inventaires des pages suivantes et producteurs d'une thematique,
+      // charges a son premier depliage
+      loadChildren: (data) => this.dataLoader.buildThematiqueNodes(data.themeId)
+    });
     this.currentView = 'treemap';
-    this.currentInventaires = [];
-    this.filteredInventaires = [];
+    this.pager = null;
+    this.filteredInventaires = null;
+    this.filterToken = 0;
+    this.virtualList = null;
   }
 
   /**
@@ -25,6 +38,8 @@ class App {
     try {
       this.showLoader(true);
 
+      // Donnees servies depuis le cache : une version plus recente peut arriver ensuite
+      this.dataLoader.onUpdate = (data) => this.refreshData(data);
       const data = await this.dataLoader.load();
 
       this.displayStats();
@@ -38,22 +53,13 @@ class App {
       });
       this.treemapViz.render(data);
 
-      const treeData = this.dataLoader.buildTreeData();
-      const treeContainer = document.getElementById('tree-container');
-      const treeHeight = treeContainer ? treeContainer.clientHeight || 600 : 600;
-      const treeWidth = treeContainer ? treeContainer.clientWidth || 1200 : 1200;
-      
-      this.treeViz = new TreeViz('tree-container', {
-        width: treeWidth,
-        height: treeHeight,
-        onNodeClick: (data) => this.handleTreeNodeClick(data)
-      });
-      this.treeViz.render(treeData);
-
       this.setupEventListeners();
 
       this.showLoader(false);
 
+      // D3 et les modules de l'arbre, pendant un temps mort
+      this.treeView.prefetchWhenIdle();
+
       console.log('Application initialisee');
     } catch (error) {
       console.error('Erreur lors de l\'initialisation:', error);
@@ -61,6 +67,16 @@ class App {
     }
   }
 
+  /**
+   * Redessine les vues apres la mise a jour des donnees
+   */
+  async refreshData(data) {
+    if (!this.treemapViz) return;
+    this.displayStats();
+    this.treemapViz.render(data);
+    await this.treeView.refresh();
+  }
+
   /**
    * Affiche les statistiques globales
    */
@@ -88,16 +104,20 @@ class App {
 
     // Controles arbre
     document.getElementById('expand-all')?.addEventListener('click', () => {
-      this.treeViz?.expandAll();
+      this.treeView.treeViz?.expandAll();
     });
 
     document.getElementById('collapse-all')?.addEventListener('click', () => {
-      this.treeViz?.collapseAll();
+      this.treeView.treeViz?.collapseAll();
     });
 
     // Recherche instantanee
     const searchInput = document.getElementById('search-input');
     if (searchInput) {
+      searchInput.addEventListener('focus', () => {
+        this.pager?.prepareSearch().catch(error =>
+          console.error('Erreur lors du chargement des inventaires:', error));
+      });
       searchInput.addEventListener('input', (e) => {
         this.filterInventaires(e.target.value);
       });
@@ -127,40 +147,83 @@ class App {
     if (view === 'treemap' && this.treemapViz) {
       setTimeout(() => this.treemapViz.resize(), 100);
     }
+
+    // Premiere ouverture de l'arbre : chargement de D3, construction et rendu
+    // (le conteneur est visible, ses dimensions sont connues)
+    if (view === 'tree' && !this.treeView.ready) {
+      this.showLoader(true);
+      this.treeView.load()
+        .catch(error => {
+          console.error('Erreur lors du chargement de l\'arbre:', error);
+          this.showError(error.message);
+        })
+        .finally(() => this.showLoader(false));
+    }
   }
 
   /**
    * Gere le clic sur le treemap
    */
-  handleTreemapClick(point) {
+  async handleTreemapClick(point) {
     const customdata = point.customdata || {};
     console.log('Treemap click:', point.label, customdata.type);
 
-    // Si c'est une thematique (serie), afficher les inventaires
-    if (customdata.type === 'thematique' && customdata.inventaires) {
-      this.showInventairesList(point.label, customdata);
+    // Si c'est une thematique (serie), ajouter ses inventaires au treemap
+    // et les afficher dans la liste
+    if (customdata.type === 'thematique') {
+      this.showThematique(point.id, point.label, customdata);
+    }
+    // Case "autres" ou sous-thematique : la liste complete de la thematique
+    else if (customdata.type === 'autres' || customdata.type === 'sous-thematique') {
+      const hierarchy = this.dataLoader.hierarchyData;
+      const index = hierarchy.ids.indexOf(customdata.thematique);
+      if (index >= 0) {
+        this.showThematique(customdata.thematique, hierarchy.labels[index], hierarchy.customdata[index]);
+      }
     }
     // Si c'est un inventaire, ouvrir le lien
     else if (customdata.type === 'inventaire' && customdata.url) {
       window.open(customdata.url, '_blank');
     }
+    // Producteur : description dans le panneau
+    else if (customdata.type === 'producteur') {
+      this.showProducteurInfo(point.label, customdata);
+    }
     // Si c'est une fonction, afficher info
     else if (customdata.type === 'fonction') {
       this.showFonctionInfo(point.label, customdata);
     }
   }
 
+  /**
+   * Entree dans une thematique : feuilles du treemap (inventaires, et
+   * producteurs charges a ce moment dans une case a part) et liste laterale
+   */
+  async showThematique(themeId, label, customdata) {
+    try {
+      if (!this.treemapViz.hasLeaves(themeId)) {
+        const leaves = await this.dataLoader.buildThematiqueLeaves(themeId);
+        this.treemapViz.addLeaves(themeId, leaves);
+      }
+      const inventaires = await this.dataLoader.getInventaires(themeId);
+      this.showInventairesList(label, { ...customdata, themeId, inventaires });
+    } catch (error) {
+      console.error('Erreur lors du chargement des inventaires:', error);
+    }
+  }
+
   /**
    * Affiche la liste des inventaires pour une serie
    */
   showInventairesList(serieName, customdata) {
-    const inventaires = customdata.inventaires || [];
-    this.currentInventaires = inventaires;
-    this.filteredInventaires = inventaires;
+    this.pager = new InventairesPager(customdata.themeId, customdata.pagination,
+      customdata.inventaires || [], this.dataLoader);
+    this.filteredInventaires = null;
+    this.filterToken++;
 
     // Mettre a jour le header
     document.getElementById('panel-serie-name').textContent = serieName;
-    document.getElementById('panel-count').textContent = inventaires.length;
+    document.getElementById('panel-count').textContent = this.pager.total;
     document.getElementById('panel-subtitle').textContent = 
       `${customdata.nbNotices?.toLocaleString() || 0} notices au total`;
 
@@ -169,7 +232,7 @@ class App {
     if (searchInput) searchInput.value = '';
 
     // Afficher les inventaires
-    this.renderInventairesList(inventaires);
+    this.renderInventairesList();
 
     // Afficher le panel sur mobile
     document.getElementById('inventaires-panel')?.classList.add('visible');
@@ -184,6 +247,7 @@ class App {
     document.getElementById('panel-subtitle').textContent = 
       `${customdata.nbNoticesEnLigne?.toLocaleString() || 0} notices - Cliquez sur une serie`;
 
+    this.virtualList?.detach();
     const listContainer = document.getElementById('inventaires-list');
     listContainer.innerHTML = `
       <div class="placeholder-message">
@@ -194,40 +258,77 @@ class App {
       </div>
     `;
 
-    this.currentInventaires = [];
-    this.filteredInventaires = [];
+    this.pager = null;
+    this.filteredInventaires = null;
+    this.filterToken++;
+  }
+
+  /**
+   * Affiche les informations d'un producteur
+   */
+  showProducteurInfo(name, customdata) {
+    document.getElementById('panel-serie-name').textContent = name;
+    document.getElementById('panel-count').textContent = customdata.nombreEntrees || 0;
+    document.getElementById('panel-subtitle').textContent =
+      `Producteur - ${customdata.dateExtreme || 'dates inconnues'}`;
+
+    this.virtualList?.detach();
+    const listContainer = document.getElementById('inventaires-list');
+    listContainer.innerHTML = `
+      <div class="placeholder-message">
+        <div class="icon">🏛</div>
+        <p><strong>${name}</strong></p>
+        <p style="margin-top: 0.5rem; font-size: 0.7rem;">${customdata.description || ''}</p>
+        <p style="margin-top: 1rem;">${customdata.metrage || 0} ml, ${customdata.nombreEntrees || 0} entree(s)</p>
+      </div>
+    `;
+
+    this.pager = null;
+    this.filteredInventaires = null;
+    this.filterToken++;
   }
 
   /**
    * Filtre les inventaires selon la recherche
    */
-  filterInventaires(query) {
+  async filterInventaires(query) {
+    if (!this.pager) return;
+
     const q = query.toLowerCase().trim();
-    
+    const token = ++this.filterToken;
+
     if (!q) {
-      this.filteredInventaires = this.currentInventaires;
+      this.filteredInventaires = null;
     } else {
-      this.filteredInventaires = this.currentInventaires.filter(inv => {
-        const cote = (inv.cote || '').toLowerCase();
-        const titre = (inv.titre || '').toLowerCase();
-        const dates = (inv.dates || '').toLowerCase();
-        return cote.includes(q) || titre.includes(q) || dates.includes(q);
-      });
+      try {
+        const filtered = await this.pager.filter(q);
+        // Ignorer les resultats d'une frappe depassee
+        if (token !== this.filterToken) return;
+        this.filteredInventaires = filtered;
+      } catch (error) {
+        console.error('Erreur lors du chargement des inventaires:', error);
+        return;
+      }
     }
 
     // Mettre a jour le compteur
-    document.getElementById('panel-count').textContent = this.filteredInventaires.length;
+    document.getElementById('panel-count').textContent =
+      this.filteredInventaires ? this.filteredInventaires.length : this.pager.total;
 
-    this.renderInventairesList(this.filteredInventaires);
+    this.renderInventairesList();
   }
 
   /**
-   * Affiche la liste des inventaires
+   * Affiche la liste des inventaires (resultats filtres ou pages de la serie)
+   * via une liste virtualisee : seules les lignes visibles sont creees.
    */
-  renderInventairesList(inventaires) {
+  renderInventairesList() {
     const listContainer = document.getElementById('inventaires-list');
-    
-    if (inventaires.length === 0) {
+    const filtered = this.filteredInventaires;
+    const count = filtered ? filtered.length : this.pager.total;
+
+    if (count === 0) {
+      this.virtualList?.detach();
       listContainer.innerHTML = `
         <div class="no-results">
           Aucun inventaire trouve.
@@ -236,20 +337,58 @@ class App {
       return;
     }
 
-    const html = inventaires.map(inv => `
-      <a href="${inv.url || '#'}" target="_blank" class="inventaire-item" 
-         title="${inv.titre || inv.cote}">
+    if (!this.virtualList) {
+      this.virtualList = new VirtualList(listContainer, {
+        rowHeight: INVENTAIRE_ROW_HEIGHT,
+        renderRow: (inv) => this.renderInventaireItem(inv),
+        renderPlaceholder: () => '<div class="inventaire-item loading-item">Chargement...</div>',
+        onMissingRange: (first, last) => this.loadInventairesRange(first, last)
+      });
+    }
+
+    const pager = this.pager;
+    // Resultats d'une recherche : index des inventaires dans la serie
+    this.virtualList.setItems(count, filtered ? (i) => pager.get(filtered[i]) : (i) => pager.get(i));
+  }
+
+  /**
+   * Charge les pages manquantes de la fenetre visible
+   */
+  loadInventairesRange(first, last) {
+    const pager = this.pager;
+    if (!pager) return;
+
+    const filtered = this.filteredInventaires;
+    const load = filtered
+      ? pager.ensureIndexes(filtered.subarray(first, last + 1))
+      : pager.ensureRange(first, last);
+    load
+      .then(() => {
+        if (pager === this.pager && filtered === this.filteredInventaires) {
+          this.virtualList.refresh();
+        }
+      })
+      .catch(error => console.error('Erreur lors du chargement des inventaires:', error));
+  }
+
+  /**
+   * Rend une ligne de la liste des inventaires
+   */
+  renderInventaireItem(inv) {
+    const broken = inv.lien_casse ? ' lien-casse' : '';
+    const title = inv.lien_casse ? `${inv.titre || inv.cote} (lien indisponible)` : (inv.titre || inv.cote);
+    return `
+      <a href="${inv.url || '#'}" target="_blank" class="inventaire-item${broken}" 
+         title="${title}">
         <div class="cote">${inv.cote}</div>
         <div class="titre">${inv.titre || 'Sans titre'}</div>
         <div class="meta">
           <span class="dates">${inv.dates || '-'}</span>
           <span class="notices">${(inv.nb_notices || 0).toLocaleString()} notices</span>
-          <span class="link-icon">→</span>
+          <span class="link-icon">${inv.lien_casse ? '⚠' : '→'}</span>
         </div>
       </a>
-    `).join('');
-
-    listContainer.innerHTML = html;
+    `;
   }
 
   /**
@@ -264,9 +403,22 @@ class App {
       return;
     }
 
-    // Si serie avec inventaires
-    if (data.children && data.children.length > 0 && data.children[0].type === 'inventaire') {
-      const inventaires = data.children.map(child => ({
+    // Producteur : description dans le panneau
+    if (data.type === 'producteur') {
+      this.showProducteurInfo(data.name, {
+        description: data.description,
+        dateExtreme: data.dates,
+        metrage: data.metrage,
+        nombreEntrees: data.nombreEntrees
+      });
+      return;
+    }
+
+    // Si serie avec inventaires (pages suivantes et producteurs charges a la
+    // suite ; le pager ne garde que la premiere page)
+    const invChildren = (data.children || []).filter(child => child.type === 'inventaire');
+    if (invChildren.length > 0) {
+      const inventaires = invChildren.map(child => ({
         cote: child.name,
         titre: child.titre,
         dates: child.dates,
@@ -275,7 +427,9 @@ class App {
       }));
       
       this.showInventairesList(data.name, {
+        themeId: data.themeId,
         inventaires: inventaires,
+        pagination: data.pagination,
         nbNotices: data.nbNotices
       });
     }
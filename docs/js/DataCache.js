@@ -0,0 +1,73 @@
+/**
+ * DataCache - Cache IndexedDB des donnees de la visualisation
+ * Archives departementales des Bouches-du-Rhone (AD13)
+ *
+ * Stocke des objets structures (sans passer par JSON) : la lecture evite le
+ * telechargement, l'analyse du JSON et la construction de la hierarchie.
+ * Sans IndexedDB (navigation privee, stockage desactive), le cache est
+ * simplement vide.
+ *
+ * Auteur: Barbara Proenca
+ */
+const DB_NAME = 'ad13-visualisation';
+const DB_VERSION = 1;
+const STORE_NAME = 'donnees';
+
+export class DataCache {
+  constructor() {
+    this.dbPromise = null;
+  }
+
+  /**
+   * Ouvre la base (une seule fois)
+   */
+  open() {
+    if (!this.dbPromise) {
+      this.dbPromise = new Promise((resolve, reject) => {
+        if (typeof indexedDB === 'undefined') {
+          reject(new Error('IndexedDB indisponible'));
+          return;
+        }
+        const request = indexedDB.open(DB_NAME, DB_VERSION);
+        request.onupgradeneeded = () => request.result.createObjectStore(STORE_NAME);
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+      });
+    }
+    return this.dbPromise;
+  }
+
+  /**
+   * Retourne la valeur associee a `key`, ou null
+   */
+  async get(key) {
+    try {
+      const db = await this.open();
+      return await new Promise((resolve, reject) => {
+        const request = db.transaction(STORE_NAME, 'readonly').objectStore(STORE_NAME).get(key);
+        request.onsuccess = () => resolve(request.result ?? null);
+        request.onerror = () => reject(request.error);
+      });
+    } catch (error) {
+      return null;
+    }
+  }
+
+  /**
+   * Enregistre une valeur (les erreurs, quota compris, sont ignorees)
+   */
+  async put(key, value) {
+    try {
+      const db = await this.open();
+      await new Promise((resolve, reject) => {
+        const transaction = db.transaction(STORE_NAME, 'readwrite');
+        transaction.objectStore(STORE_NAME).put(value, key);
+        transaction.oncomplete = () => resolve();
+        transaction.onerror = () => reject(transaction.error);
+        transaction.onabort = () => reject(transaction.error);
+      });
+    } catch (error) {
+      console.warn('Cache des donnees non enregistre:', error);
+    }
+  }
+}
@@ -1,231 +1,206 @@
 /**
  * DataLoader - Charge et transforme les donnees d'archives pour la visualisation
  * Archives departementales des Bouches-du-Rhone (AD13)
- * 
+ *
+ * Les donnees brutes sont tenues par un DataService execute dans un Web
+ * Worker (DataWorker.js) : telechargement, analyse du JSON, construction
+ * de la hierarchie et recherche ne bloquent pas l'interface. Sans Web
+ * Worker, le meme DataService est execute dans la page.
+ *
  * Auteur: Barbara Proenca
  */
+import { DataService } from './DataService.js';
+
 export class DataLoader {
-  constructor(dataUrl = 'data/archives.json') {
+  constructor(dataUrl = 'data/archives.json', manifestUrl = 'data/manifest.json') {
     this.dataUrl = dataUrl;
-    this.rawData = null;
+    this.manifestUrl = manifestUrl;
+    this.version = null;
     this.hierarchyData = null;
-    this.rootName = 'Archives departementales 13';
+    this.stats = null;
+    // Appele quand la revalidation en arriere-plan apporte une nouvelle version
+    this.onUpdate = null;
+
+    this.nextId = 0;
+    this.requests = new Map();
+    this.service = null;
+    this.worker = this.createWorker();
+    if (!this.worker) this.useInlineService();
   }
 
   /**
-   * Charge les donnees JSON
+   * Demarre le worker des donnees (null si les Web Workers sont indisponibles)
    */
-  async load() {
+  createWorker() {
+    if (typeof Worker === 'undefined') return null;
     try {
-      const response = await fetch(this.dataUrl);
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
-      this.rawData = await response.json();
-      this.hierarchyData = this.buildHierarchy();
-      return this.hierarchyData;
+      const worker = new Worker(new URL('./DataWorker.js', import.meta.url), { type: 'module' });
+      worker.onmessage = (event) => this.handleMessage(event.data);
+      worker.onerror = (event) => {
+        // Worker non charge (modules non supportes...) : repli dans la page
+        event.preventDefault();
+        console.warn('Worker des donnees indisponible, calculs dans la page:', event.message);
+        this.useInlineService();
+      };
+      return worker;
     } catch (error) {
-      console.error('Erreur lors du chargement des donnees:', error);
-      throw error;
+      return null;
     }
   }
 
   /**
-   * Construit la structure hierarchique pour Plotly Treemap
-   * Format: { ids, labels, parents, values, customdata }
-   */
-  buildHierarchy() {
-    const ids = [];
-    const labels = [];
-    const parents = [];
-    const values = [];
-    const customdata = [];
-    const colors = [];
-
-    // Palette de couleurs pour les fonctions
-    const colorPalette = [
-      '#4A90D9', '#50C8C6', '#6B8E8E', '#7CB342', '#A4A424',
-      '#FF9800', '#5C4A72', '#FF4081', '#9C7BB8', '#E53935',
-      '#00ACC1', '#8D6E63', '#5E35B1', '#43A047', '#FB8C00'
-    ];
-
-    // Construire le mapping des couleurs et URLs dynamiquement
-    const functionColors = {};
-    const functionUrls = {};
-    const functionSearchUrls = {};
-    if (this.rawData.fonctions) {
-      this.rawData.fonctions.forEach((func, index) => {
-        functionColors[func.fonction] = colorPalette[index % colorPalette.length];
-        functionUrls[func.fonction] = func.url || '';
-        functionSearchUrls[func.fonction] = func.url_recherche || 'https://www.archives13.fr/archive/recherche/fonds/n:93';
-      });
+   * Execute les calculs dans la page et rejoue les demandes en attente
+   */
+  useInlineService() {
+    this.worker?.terminate();
+    this.worker = null;
+    this.service = new DataService();
+    this.service.onUpdate = (result) => this.handleUpdate(result);
+
+    const pending = [...this.requests.values()];
+    this.requests.clear();
+    for (const request of pending) {
+      this.call(request.type, request.args).then(request.resolve, request.reject);
     }
+  }
 
-    // Racine
-    const rootId = this.rootName;
-    ids.push(rootId);
-    labels.push(rootId);
-    parents.push('');
-    values.push(0);
-    customdata.push({
-      type: 'root',
-      description: 'Fonds des Archives departementales des Bouches-du-Rhone'
-    });
-    colors.push('#6366F1');
-
-    // Niveau 1: Fonctions
-    for (const func of this.rawData.fonctions) {
-      const funcId = func.fonction;
-      ids.push(funcId);
-      labels.push(func.fonction);
-      parents.push(rootId);
-      values.push(func['Métrage réel'] || 0);
-      customdata.push({
-        type: 'fonction',
-        description: func.Description || '',
-        dateExtreme: func.date_extreme_fonction || '',
-        metrage: func['Métrage réel'] || 0,
-        nombreEntrees: func["Nombre d'entrée"] || 0,
-        url: func.url || '',
-        urlRecherche: func.url_recherche || 'https://www.archives13.fr/archive/recherche/fonds/n:93',
-        nbInventairesEnLigne: func.nb_inventaires_en_ligne || 0,
-        nbNoticesEnLigne: func.nb_notices_en_ligne || 0,
-        inventairesPrincipaux: func.inventaires_principaux || []
-      });
-      colors.push(functionColors[func.fonction] || '#888888');
+  /**
+   * Appelle une methode du DataService (dans le worker ou dans la page)
+   */
+  call(type, args = []) {
+    if (!this.worker) {
+      return Promise.resolve().then(() => this.service[type](...args));
     }
+    const id = ++this.nextId;
+    return new Promise((resolve, reject) => {
+      this.requests.set(id, { type, args, resolve, reject });
+      this.worker.postMessage({ id, type, args });
+    });
+  }
 
-    // Niveau 2: Thematiques (series)
-    for (const theme of this.rawData.thematiques) {
-      const funcName = theme.Fonction || theme.fonction;
-      const themeName = theme.Thématique || theme.Thematique;
-      const themeId = `${funcName}/${themeName}`;
-      const inventaires = theme.inventaires || [];
-      
-      ids.push(themeId);
-      labels.push(themeName);
-      parents.push(funcName);
-      values.push(theme['Métrage réel'] || theme.nb_notices || 0);
-      customdata.push({
-        type: 'thematique',
-        fonction: funcName,
-        description: theme.Description || `${inventaires.length} inventaires en ligne`,
-        metrage: theme['Métrage réel'] || 0,
-        nombreEntrees: theme["Nombre d'entrée"] || inventaires.length,
-        nbInventaires: theme.nb_inventaires || inventaires.length,
-        nbNotices: theme.nb_notices || 0,
-        url: functionUrls[funcName] || '',
-        urlRecherche: functionSearchUrls[funcName] || 'https://www.archives13.fr/archive/recherche/fonds/n:93',
-        inventaires: inventaires
-      });
-      const parentColor = functionColors[funcName] || '#888888';
-      colors.push(this.adjustColor(parentColor, 0.15));
-      // Les inventaires sont stockes dans customdata mais pas affiches dans le treemap
-      // Ils apparaissent uniquement dans la liste laterale
+  handleMessage({ id, type, result, error }) {
+    if (type === 'update') {
+      this.handleUpdate(result);
+      return;
     }
+    const request = this.requests.get(id);
+    if (!request) return;
+    this.requests.delete(id);
+    if (error) request.reject(new Error(error));
+    else request.resolve(result);
+  }
+
+  handleUpdate(state) {
+    this.setState(state);
+    if (this.onUpdate) this.onUpdate(this.hierarchyData);
+  }
 
-    return { ids, labels, parents, values, customdata, colors, functionColors };
+  setState({ version, hierarchy, stats }) {
+    this.version = version;
+    this.hierarchyData = hierarchy;
+    this.stats = stats;
+  }
+
+  /**
+   * Charge les donnees et retourne la hierarchie du treemap
+   */
+  async load() {
+    try {
+      const state = await this.call('load', [
+        new URL(this.dataUrl, document.baseURI).href,
+        new URL(this.manifestUrl, document.baseURI).href,
+        document.baseURI
+      ]);
+      this.setState(state);
+      return this.hierarchyData;
+    } catch (error) {
+      console.error('Erreur lors du chargement des donnees:', error);
+      throw error;
+    }
   }
 
   /**
    * Construit les donnees pour l'arbre D3.js (structure nested)
    */
   buildTreeData() {
-    // Construire le mapping des URLs par fonction
-    const functionUrls = {};
-    for (const func of this.rawData.fonctions) {
-      functionUrls[func.fonction] = func.url || '';
-    }
+    return this.call('buildTreeData');
+  }
 
-    const root = {
-      name: this.rootName,
-      url: 'https://www.archives13.fr/n/presentation-des-fonds/n:94',
-      children: []
-    };
-
-    // Grouper les thematiques par fonction
-    const themesByFunction = {};
-    for (const theme of this.rawData.thematiques) {
-      const funcName = theme.Fonction || theme.fonction;
-      const themeName = theme.Thématique || theme.Thematique;
-      const inventaires = theme.inventaires || [];
-      
-      if (!themesByFunction[funcName]) {
-        themesByFunction[funcName] = [];
-      }
-      
-      // Creer les enfants (inventaires) pour cette thematique
-      const invChildren = inventaires.map(inv => ({
-        name: inv.cote,
-        titre: inv.titre,
-        dates: inv.dates,
-        value: inv.nb_notices || 1,
-        nbNotices: inv.nb_notices || 0,
-        url: inv.url || '',
-        type: 'inventaire'
-      }));
-      
-      themesByFunction[funcName].push({
-        name: themeName,
-        value: theme['Métrage réel'] || theme.nb_notices || 0,
-        description: theme.Description || `${inventaires.length} inventaires`,
-        nbInventaires: inventaires.length,
-        nbNotices: theme.nb_notices || 0,
-        url: functionUrls[funcName] || '',
-        urlRecherche: 'https://www.archives13.fr/archive/recherche/fonds/n:93',
-        children: invChildren
-      });
-    }
+  /**
+   * Inventaires fournis avec une thematique (premiere page si paginee)
+   */
+  getInventaires(themeId) {
+    return this.call('getInventaires', [themeId]);
+  }
 
-    // Construire l'arbre
-    for (const func of this.rawData.fonctions) {
-      const funcNode = {
-        name: func.fonction,
-        value: func['Métrage réel'] || 0,
-        description: func.Description || '',
-        nbInventaires: func.nb_inventaires_en_ligne || 0,
-        nbNotices: func.nb_notices_en_ligne || 0,
-        url: func.url || '',
-        urlRecherche: func.url_recherche || 'https://www.archives13.fr/archive/recherche/fonds/n:93',
-        children: themesByFunction[func.fonction] || []
-      };
-      root.children.push(funcNode);
-    }
+  /**
+   * Page `num` des inventaires d'une thematique (chargee par le worker)
+   */
+  getInventairePage(themeId, num) {
+    return this.call('getInventairePage', [themeId, num]);
+  }
+
+  /**
+   * Feuilles du treemap (principaux inventaires et "autres") d'une thematique
+   */
+  buildInventaireLeaves(themeId, topN) {
+    return this.call('buildInventaireLeaves', topN === undefined ? [themeId] : [themeId, topN]);
+  }
+
+  /**
+   * Producteurs d'une thematique (fichier charge a la premiere demande)
+   */
+  getProducteurs(themeId) {
+    return this.call('getProducteurs', [themeId]);
+  }
+
+  /**
+   * Feuilles du treemap (producteurs) d'une thematique
+   */
+  buildProducteurLeaves(themeId) {
+    return this.call('buildProducteurLeaves', [themeId]);
+  }
+
+  /**
+   * Feuilles du treemap d'une thematique (inventaires, puis producteurs groupes)
+   */
+  buildThematiqueLeaves(themeId) {
+    return this.call('buildThematiqueLeaves', [themeId]);
+  }
+
+  /**
+   * Noeuds de l'arbre (producteurs) d'une thematique
+   */
+  buildProducteurNodes(themeId) {
+    return this.call('buildProducteurNodes', [themeId]);
+  }
+
+  /**
+   * Noeuds de l'arbre ajoutes au depliage d'une thematique (pages
+   * suivantes des inventaires, producteurs)
+   */
+  buildThematiqueNodes(themeId) {
+    return this.call('buildThematiqueNodes', [themeId]);
+  }
 
-    return root;
+  /**
+   * Indexe tous les inventaires d'une thematique pour la recherche
+   */
+  indexInventaires(themeId) {
+    return this.call('indexInventaires', [themeId]);
   }
 
   /**
-   * Ajuste la luminosite d'une couleur hex
+   * Index (Uint32Array) des inventaires de la thematique contenant `query`
    */
-  adjustColor(hex, percent) {
-    const num = parseInt(hex.replace('#', ''), 16);
-    const amt = Math.round(2.55 * percent * 100);
-    const R = Math.min(255, Math.max(0, (num >> 16) + amt));
-    const G = Math.min(255, Math.max(0, ((num >> 8) & 0x00FF) + amt));
-    const B = Math.min(255, Math.max(0, (num & 0x0000FF) + amt));
-    return `#${(0x1000000 + R * 0x10000 + G * 0x100 + B).toString(16).slice(1)}`;
+  filterInventaires(themeId, query) {
+    return this.call('filterInventaires', [themeId, query]);
   }
 
   /**
    * Retourne les statistiques globales
    */
   getStats() {
-    if (!this.rawData) return null;
-
-    const totalInventaires = this.rawData.fonctions.reduce(
-      (sum, f) => sum + (f.nb_inventaires_en_ligne || 0), 0
-    );
-    const totalNotices = this.rawData.fonctions.reduce(
-      (sum, f) => sum + (f.nb_notices_en_ligne || 0), 0
-    );
-
-    return {
-      nombreFonctions: this.rawData.fonctions.length,
-      nombreThematiques: this.rawData.thematiques.length,
-      nombreProducteurs: this.rawData.producteurs?.length || 0,
-      totalInventaires,
-      totalNotices
-    };
+    return this.stats;
   }
 }
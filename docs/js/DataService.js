@@ -0,0 +1,718 @@
+/**
+ * DataService - Donnees de la visualisation : chargement, cache et calculs
+ * Archives departementales des Bouches-du-Rhone (AD13)
+ *
+ * Possede les donnees brutes et repond aux demandes de DataLoader :
+ * hierarchie du treemap, donnees de l'arbre, recherche dans les
+ * inventaires, pages d'inventaires et producteurs des thematiques (charges
+ * a la demande). Execute dans DataWorker.js pour ne pas bloquer l'interface,
+ * ou directement dans la page si les Web Workers sont indisponibles.
+ *
+ * Auteur: Barbara Proenca
+ */
+import { applyPatch } from './JsonPatch.js';
+import { DataCache } from './DataCache.js';
+
+// Cle du cache IndexedDB des donnees (version, donnees brutes et hierarchie)
+const CACHE_KEY = 'archives';
+
+// Format de la hierarchie en cache : une hierarchie d'un autre format est reconstruite
+const HIERARCHY_FORMAT = 3;
+
+// Inventaires affiches comme feuilles d'une thematique dans le treemap
+const TOP_INVENTAIRES = 20;
+
+// Part de la surface d'une thematique donnee a ses producteurs (producteurs
+// et inventaires n'ont pas d'unite commune : la part est fixe)
+const PART_PRODUCTEURS = 0.3;
+
+export class DataService {
+  constructor() {
+    this.cache = new DataCache();
+    this.dataUrl = null;
+    this.manifestUrl = null;
+    this.baseUrl = null;
+    this.version = null;
+    this.rawData = null;
+    this.hierarchyData = null;
+    this.themesById = null;
+    this.rootName = 'Archives departementales 13';
+    // Cles de recherche des inventaires (promesses), par thematique
+    this.searchIndexes = new Map();
+    // Fichiers charges a la demande (promesses), par URL
+    this.shards = new Map();
+    // Appele quand la revalidation en arriere-plan apporte une nouvelle version
+    this.onUpdate = null;
+  }
+
+  /**
+   * Charge les donnees : depuis le cache IndexedDB s'il existe (la version
+   * est revalidee en arriere-plan), sinon depuis le reseau.
+   * Les URL doivent etre absolues : un worker les resoudrait depuis js/.
+   * `baseUrl` (l'adresse de la page) sert a resoudre celles du manifeste.
+   */
+  async load(dataUrl, manifestUrl, baseUrl) {
+    this.dataUrl = dataUrl;
+    this.manifestUrl = manifestUrl;
+    this.baseUrl = baseUrl;
+
+    const cached = await this.cache.get(CACHE_KEY);
+    if (cached) {
+      if (cached.format === HIERARCHY_FORMAT) {
+        this.version = cached.version;
+        this.rawData = cached.data;
+        this.themesById = null;
+        this.shards = new Map();
+        this.searchIndexes = new Map();
+        this.hierarchyData = cached.hierarchy;
+      } else {
+        this.setData(cached.version, cached.data);
+      }
+      this.revalidate(cached);
+    } else {
+      const { version, data } = await this.fetchData(null);
+      this.setData(version, data);
+    }
+    return this.getState();
+  }
+
+  /**
+   * Etat transmis a la page : version, hierarchie et statistiques
+   */
+  getState() {
+    return { version: this.version, hierarchy: this.hierarchyData, stats: this.getStats() };
+  }
+
+  /**
+   * Installe une version des donnees et l'enregistre dans le cache
+   */
+  setData(version, data) {
+    this.version = version;
+    this.rawData = data;
+    this.themesById = null;
+    this.shards = new Map();
+    this.searchIndexes = new Map();
+    this.hierarchyData = this.buildHierarchy();
+    // Sans manifeste, pas de version pour revalider : rien n'est mis en cache
+    if (version) {
+      this.cache.put(CACHE_KEY, {
+        version, data, format: HIERARCHY_FORMAT, hierarchy: this.hierarchyData
+      });
+    }
+  }
+
+  /**
+   * Verifie la version publiee et met a jour les donnees si elle a change
+   */
+  async revalidate(cached) {
+    try {
+      const { version, data } = await this.fetchData(cached);
+      if (version === cached.version) return;
+      this.setData(version, data);
+      if (this.onUpdate) this.onUpdate(this.getState());
+    } catch (error) {
+      console.warn('Revalidation des donnees impossible:', error);
+    }
+  }
+
+  /**
+   * Recupere la version publiee des donnees en partant de `cached` : si
+   * elle est recente, seuls les deltas publies depuis sont telecharges.
+   */
+  async fetchData(cached) {
+    let manifest = null;
+    try {
+      manifest = await this.fetchJson(this.manifestUrl, { cache: 'no-cache' });
+    } catch (error) {
+      // Pas de manifeste (publication ancienne) : chargement complet
+      return { version: null, data: await this.fetchJson(this.dataUrl) };
+    }
+
+    const version = manifest.version;
+    if (cached && cached.version === version) {
+      return { version, data: cached.data };
+    }
+
+    const chain = cached ? this.findDeltaChain(manifest, cached.version) : null;
+    if (chain) {
+      try {
+        // Copie : les donnees en cache restent affichees pendant la mise a jour
+        let data = structuredClone(cached.data);
+        for (const delta of chain) {
+          data = applyPatch(data, await this.fetchJson(new URL(delta.url, this.baseUrl).href));
+        }
+        return { version, data };
+      } catch (error) {
+        console.warn('Deltas inutilisables, chargement complet:', error);
+      }
+    }
+
+    return { version, data: await this.fetchJson(`${this.dataUrl}?v=${version}`) };
+  }
+
+  /**
+   * Suite de deltas menant de `version` a la version du manifeste, ou null
+   * si elle n'existe pas ou pese plus lourd que le fichier complet
+   */
+  findDeltaChain(manifest, version) {
+    const chain = [];
+    let current = version;
+    while (current !== manifest.version) {
+      const delta = manifest.deltas.find(d => d.from === current);
+      // Une version peut reapparaitre (retour arriere) : pas de boucle
+      if (!delta || chain.length >= manifest.deltas.length) return null;
+      chain.push(delta);
+      current = delta.to;
+    }
+    const size = chain.reduce((sum, d) => sum + (d.size || 0), 0);
+    return size < manifest.size ? chain : null;
+  }
+
+  async fetchJson(url, options = {}) {
+    const response = await fetch(url, options);
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+    return response.json();
+  }
+
+  /**
+   * Construit la structure hierarchique pour Plotly Treemap
+   * Format: { ids, labels, parents, values, customdata }
+   */
+  buildHierarchy() {
+    const ids = [];
+    const labels = [];
+    const parents = [];
+    const values = [];
+    const customdata = [];
+    const colors = [];
+
+    // Palette de couleurs pour les fonctions
+    const colorPalette = [
+      '#4A90D9', '#50C8C6', '#6B8E8E', '#7CB342', '#A4A424',
+      '#FF9800', '#5C4A72', '#FF4081', '#9C7BB8', '#E53935',
+      '#00ACC1', '#8D6E63', '#5E35B1', '#43A047', '#FB8C00'
+    ];
+
+    // Construire le mapping des couleurs et URLs dynamiquement
+    const functionColors = {};
+    const functionUrls = {};
+    const functionSearchUrls = {};
+    if (this.rawData.fonctions) {
+      this.rawData.fonctions.forEach((func, index) => {
+        functionColors[func.fonction] = colorPalette[index % colorPalette.length];
+        functionUrls[func.fonction] = func.url || '';
+        functionSearchUrls[func.fonction] = func.url_recherche || 'https://www.archives13.fr/archive/recherche/fonds/n:93';
+      });
+    }
+
+    // Racine
+    const rootId = this.rootName;
+    ids.push(rootId);
+    labels.push(rootId);
+    parents.push('');
+    values.push(0);
+    customdata.push({
+      type: 'root',
+      description: 'Fonds des Archives departementales des Bouches-du-Rhone'
+    });
+    colors.push('#6366F1');
+
+    // Niveau 1: Fonctions
+    for (const func of this.rawData.fonctions) {
+      const funcId = func.fonction;
+      ids.push(funcId);
+      labels.push(func.fonction);
+      parents.push(rootId);
+      values.push(func['Métrage réel'] || 0);
+      customdata.push({
+        type: 'fonction',
+        description: func.Description || '',
+        dateExtreme: func.date_extreme_fonction || '',
+        metrage: func['Métrage réel'] || 0,
+        nombreEntrees: func["Nombre d'entrée"] || 0,
+        url: func.url || '',
+        urlRecherche: func.url_recherche || 'https://www.archives13.fr/archive/recherche/fonds/n:93',
+        nbInventairesEnLigne: func.nb_inventaires_en_ligne || 0,
+        nbNoticesEnLigne: func.nb_notices_en_ligne || 0,
+        inventairesPrincipaux: func.inventaires_principaux || []
+      });
+      colors.push(functionColors[func.fonction] || '#888888');
+    }
+
+    // Niveau 2: Thematiques (series)
+    for (const theme of this.rawData.thematiques) {
+      const funcName = theme.Fonction || theme.fonction;
+      const themeName = theme.Thématique || theme.Thematique;
+      const themeId = `${funcName}/${themeName}`;
+      const inventaires = theme.inventaires || [];
+      
+      ids.push(themeId);
+      labels.push(themeName);
+      parents.push(funcName);
+      values.push(theme['Métrage réel'] || theme.nb_notices || 0);
+      customdata.push({
+        type: 'thematique',
+        fonction: funcName,
+        description: theme.Description || `${inventaires.length} inventaires en ligne`,
+        metrage: theme['Métrage réel'] || 0,
+        nombreEntrees: theme["Nombre d'entrée"] || inventaires.length,
+        nbInventaires: theme.nb_inventaires || inventaires.length,
+        nbNotices: theme.nb_notices || 0,
+        url: functionUrls[funcName] || '',
+        urlRecherche: functionSearchUrls[funcName] || 'https://www.archives13.fr/archive/recherche/fonds/n:93',
+        pagination: theme.pagination || null,
+        producteurs: theme.producteurs || null
+      });
+      const parentColor = functionColors[funcName] || '#888888';
+      colors.push(this.adjustColor(parentColor, 0.15));
+      // Les inventaires et les producteurs ne sont pas dans la trace initiale :
+      // ils sont ajoutes comme feuilles a l'entree dans la thematique
+      // (buildThematiqueLeaves)
+    }
+
+    return { ids, labels, parents, values, customdata, colors, functionColors };
+  }
+
+  /**
+   * Construit les donnees pour l'arbre D3.js (structure nested)
+   */
+  buildTreeData() {
+    // Construire le mapping des URLs par fonction
+    const functionUrls = {};
+    for (const func of this.rawData.fonctions) {
+      functionUrls[func.fonction] = func.url || '';
+    }
+
+    const root = {
+      name: this.rootName,
+      url: 'https://www.archives13.fr/n/presentation-des-fonds/n:94',
+      children: []
+    };
+
+    // Grouper les thematiques par fonction
+    const themesByFunction = {};
+    for (const theme of this.rawData.thematiques) {
+      const funcName = theme.Fonction || theme.fonction;
+      const themeName = theme.Thématique || theme.Thematique;
+      const inventaires = theme.inventaires || [];
+      
+      if (!themesByFunction[funcName]) {
+        themesByFunction[funcName] = [];
+      }
+      
+      // Creer les enfants (inventaires de la premiere page) pour cette thematique
+      const invChildren = inventaires.map(inv => this.buildInventaireNode(inv));
+      
+      themesByFunction[funcName].push({
+        name: themeName,
+        value: theme['Métrage réel'] || theme.nb_notices || 0,
+        description: theme.Description || `${theme.nb_inventaires || inventaires.length} inventaires`,
+        nbInventaires: theme.nb_inventaires || inventaires.length,
+        pagination: theme.pagination || null,
+        nbNotices: theme.nb_notices || 0,
+        url: functionUrls[funcName] || '',
+        urlRecherche: 'https://www.archives13.fr/archive/recherche/fonds/n:93',
+        themeId: `${funcName}/${themeName}`,
+        producteurs: theme.producteurs || null,
+        // Pages suivantes et producteurs ajoutes au depliage (buildThematiqueNodes)
+        lazy: (theme.pagination?.pages || 1) > 1 || Boolean(theme.producteurs?.total),
+        children: invChildren
+      });
+    }
+
+    // Construire l'arbre
+    for (const func of this.rawData.fonctions) {
+      const funcNode = {
+        name: func.fonction,
+        value: func['Métrage réel'] || 0,
+        description: func.Description || '',
+        nbInventaires: func.nb_inventaires_en_ligne || 0,
+        nbNotices: func.nb_notices_en_ligne || 0,
+        url: func.url || '',
+        urlRecherche: func.url_recherche || 'https://www.archives13.fr/archive/recherche/fonds/n:93',
+        children: themesByFunction[func.fonction] || []
+      };
+      root.children.push(funcNode);
+    }
+
+    return root;
+  }
+
+  /**
+   * Noeud de l'arbre pour un inventaire
+   */
+  buildInventaireNode(inv) {
+    return {
+      name: inv.cote,
+      titre: inv.titre,
+      dates: inv.dates,
+      value: inv.nb_notices || 1,
+      nbNotices: inv.nb_notices || 0,
+      url: inv.url || '',
+      type: 'inventaire'
+    };
+  }
+
+  /**
+   * Ajuste la luminosite d'une couleur hex
+   */
+  adjustColor(hex, percent) {
+    const num = parseInt(hex.replace('#', ''), 16);
+    const amt = Math.round(2.55 * percent * 100);
+    const R = Math.min(255, Math.max(0, (num >> 16) + amt));
+    const G = Math.min(255, Math.max(0, ((num >> 8) & 0x00FF) + amt));
+    const B = Math.min(255, Math.max(0, (num & 0x0000FF) + amt));
+    return `#${(0x1000000 + R * 0x10000 + G * 0x100 + B).toString(16).slice(1)}`;
+  }
+
+  /**
+   * Retourne les statistiques globales
+   */
+  getStats() {
+    if (!this.rawData) return null;
+
+    const totalInventaires = this.rawData.fonctions.reduce(
+      (sum, f) => sum + (f.nb_inventaires_en_ligne || 0), 0
+    );
+    const totalNotices = this.rawData.fonctions.reduce(
+      (sum, f) => sum + (f.nb_notices_en_ligne || 0), 0
+    );
+
+    return {
+      nombreFonctions: this.rawData.fonctions.length,
+      nombreThematiques: this.rawData.thematiques.length,
+      // Producteurs sans thematique et producteurs publies par thematique
+      nombreProducteurs: (this.rawData.producteurs?.length || 0) + this.rawData.thematiques.reduce(
+        (sum, t) => sum + (t.producteurs?.total || 0), 0
+      ),
+      totalInventaires,
+      totalNotices
+    };
+  }
+
+  /**
+   * Thematique d'identifiant `fonction/thematique` (celui du treemap)
+   */
+  getTheme(themeId) {
+    if (!this.themesById) {
+      this.themesById = new Map();
+      for (const theme of this.rawData.thematiques) {
+        const funcName = theme.Fonction || theme.fonction;
+        const themeName = theme.Thématique || theme.Thematique;
+        this.themesById.set(`${funcName}/${themeName}`, theme);
+      }
+    }
+    const theme = this.themesById.get(themeId);
+    if (!theme) {
+      throw new Error(`Thematique inconnue: ${themeId}`);
+    }
+    return theme;
+  }
+
+  /**
+   * Inventaires fournis avec une thematique (premiere page si paginee)
+   */
+  getInventaires(themeId) {
+    return this.getTheme(themeId).inventaires || [];
+  }
+
+  /**
+   * Page `num` des inventaires d'une thematique : la premiere est fournie
+   * avec la thematique, les suivantes sont chargees a la premiere demande
+   * (data/inventaires/<thematique>/<num>.<empreinte>.json)
+   */
+  async getInventairePage(themeId, num) {
+    const theme = this.getTheme(themeId);
+    const pagination = theme.pagination;
+    if (num === 0) return theme.inventaires || [];
+    if (!pagination?.url || num >= pagination.pages) return [];
+
+    const empreinte = pagination.empreintes?.[num];
+    const name = empreinte ? `${num}.${empreinte}` : num;
+    const data = await this.fetchShard(`${pagination.url}/${name}.json`, empreinte);
+    return data.inventaires || [];
+  }
+
+  /**
+   * Pages `first` et suivantes des inventaires d'une thematique, a la suite
+   */
+  async getInventairesFrom(themeId, first) {
+    const nbPages = this.getTheme(themeId).pagination?.pages || 1;
+    const pages = [];
+    for (let num = first; num < nbPages; num++) {
+      pages.push(this.getInventairePage(themeId, num));
+    }
+    return (await Promise.all(pages)).flat();
+  }
+
+  /**
+   * Feuilles du treemap pour une thematique : les `topN` inventaires les plus
+   * importants et une case "autres" pour le reste. Les valeurs sont reparties
+   * au prorata des notices pour que la thematique garde sa surface.
+   */
+  buildInventaireLeaves(themeId, topN = TOP_INVENTAIRES) {
+    const theme = this.getTheme(themeId);
+    const color = this.hierarchyData.colors[this.hierarchyData.ids.indexOf(themeId)] || '#888888';
+    const inventaires = [...(theme.inventaires || [])]
+      .sort((a, b) => (b.nb_notices || 0) - (a.nb_notices || 0));
+    const top = inventaires.slice(0, topN);
+
+    const leaves = { ids: [], labels: [], parents: [], values: [], customdata: [], colors: [] };
+    const themeValue = theme['Métrage réel'] || theme.nb_notices || 0;
+    // nb_notices peut manquer ou ne compter qu'une partie des inventaires
+    const totalNotices = Math.max(theme.nb_notices || 0,
+      inventaires.reduce((sum, inv) => sum + (inv.nb_notices || 0), 0));
+    if (!top.length || !totalNotices || !themeValue) return leaves;
+    if (theme.sous_thematiques?.length) {
+      return this.buildSousThematiqueLeaves(themeId, theme, top, leaves, color);
+    }
+
+    let used = 0;
+    // Les cotes ne sont pas uniques ("10 G" deux fois) : identifiant par rang
+    for (const [rank, inv] of top.entries()) {
+      const value = themeValue * (inv.nb_notices || 0) / totalNotices;
+      used += value;
+      leaves.ids.push(`${themeId}/inventaire-${rank}`);
+      leaves.labels.push(inv.cote);
+      leaves.parents.push(themeId);
+      leaves.values.push(value);
+      leaves.customdata.push({
+        type: 'inventaire',
+        titre: inv.titre || '',
+        dates: inv.dates || '',
+        nbNotices: inv.nb_notices || 0,
+        url: inv.url || ''
+      });
+      leaves.colors.push(this.adjustColor(color, 0.3));
+    }
+
+    const nbAutres = Math.max(theme.nb_inventaires || 0, inventaires.length) - top.length;
+    if (nbAutres > 0 && themeValue - used > 0) {
+      leaves.ids.push(`${themeId}/autres`);
+      leaves.labels.push(`${nbAutres} autres`);
+      leaves.parents.push(themeId);
+      leaves.values.push(themeValue - used);
+      leaves.customdata.push({ type: 'autres', thematique: themeId, nbInventaires: nbAutres });
+      leaves.colors.push(this.adjustColor(color, -0.1));
+    }
+    return leaves;
+  }
+
+  /**
+   * Feuilles du treemap d'une thematique decoupee en sous-thematiques
+   * (regroupement des titres a la construction) : une case par
+   * sous-thematique, a la surface de ses notices, contenant ses inventaires
+   * parmi les `top` ; le reste de la case represente ses autres inventaires.
+   */
+  buildSousThematiqueLeaves(themeId, theme, top, leaves, color) {
+    const themeValue = theme['Métrage réel'] || theme.nb_notices || 0;
+    const groupes = theme.sous_thematiques;
+    const totalNotices = groupes.reduce((sum, g) => sum + (g.nb_notices || 0), 0);
+    if (!totalNotices) return leaves;
+
+    const groupValues = new Map(groupes.map(g => [g.id, themeValue * (g.nb_notices || 0) / totalNotices]));
+    const used = new Map();
+    const invLeaves = { ids: [], labels: [], parents: [], values: [], customdata: [], colors: [] };
+    for (const [rank, inv] of top.entries()) {
+      if (!groupValues.has(inv.sous_thematique)) continue;
+      const value = themeValue * (inv.nb_notices || 0) / totalNotices;
+      used.set(inv.sous_thematique, (used.get(inv.sous_thematique) || 0) + value);
+      invLeaves.ids.push(`${themeId}/groupe-${inv.sous_thematique}/inventaire-${rank}`);
+      invLeaves.labels.push(inv.cote);
+      invLeaves.parents.push(`${themeId}/groupe-${inv.sous_thematique}`);
+      invLeaves.values.push(value);
+      invLeaves.customdata.push({
+        type: 'inventaire',
+        titre: inv.titre || '',
+        dates: inv.dates || '',
+        nbNotices: inv.nb_notices || 0,
+        url: inv.url || ''
+      });
+      invLeaves.colors.push(this.adjustColor(color, 0.3));
+    }
+
+    // Cases des sous-thematiques (valeur propre : la part non couverte par leurs feuilles)
+    for (const groupe of groupes) {
+      leaves.ids.push(`${themeId}/groupe-${groupe.id}`);
+      leaves.labels.push(groupe.nom);
+      leaves.parents.push(themeId);
+      leaves.values.push(Math.max(0, groupValues.get(groupe.id) - (used.get(groupe.id) || 0)));
+      leaves.customdata.push({
+        type: 'sous-thematique',
+        thematique: themeId,
+        nbInventaires: groupe.nb_inventaires || 0,
+        nbNotices: groupe.nb_notices || 0
+      });
+      leaves.colors.push(this.adjustColor(color, 0.1));
+    }
+    for (const key of Object.keys(leaves)) {
+      leaves[key].push(...invLeaves[key]);
+    }
+    return leaves;
+  }
+
+  /**
+   * Fichier de donnees charge a la demande (pages d'inventaires,
+   * producteurs), une seule fois par URL
+   */
+  fetchShard(path, empreinte) {
+    const url = new URL(path, this.baseUrl);
+    // Un fichier nomme par l'empreinte de son contenu ne change jamais ; pour
+    // les autres (constructions anciennes), la version des donnees invalide
+    // le cache HTTP
+    if (!empreinte && this.version) url.searchParams.set('v', this.version);
+    if (!this.shards.has(url.href)) {
+      const promise = this.fetchJson(url.href).catch(error => {
+        this.shards.delete(url.href);
+        throw error;
+      });
+      this.shards.set(url.href, promise);
+    }
+    return this.shards.get(url.href);
+  }
+
+  /**
+   * Producteurs d'une thematique, charges a la premiere demande depuis
+   * leur fichier (data/producteurs/<thematique>.<empreinte>.json)
+   */
+  async getProducteurs(themeId) {
+    const shard = this.getTheme(themeId).producteurs;
+    if (!shard?.total) return [];
+
+    const data = await this.fetchShard(shard.url, shard.empreinte);
+    return data.producteurs || [];
+  }
+
+  /**
+   * Feuilles du treemap pour les producteurs d'une thematique. Les valeurs
+   * sont reparties au prorata du metrage de chaque producteur (a defaut du
+   * nombre d'entrees) pour que la thematique garde sa surface.
+   */
+  async buildProducteurLeaves(themeId) {
+    const theme = this.getTheme(themeId);
+    const producteurs = await this.getProducteurs(themeId);
+    const color = this.hierarchyData.colors[this.hierarchyData.ids.indexOf(themeId)] || '#888888';
+    const leaves = { ids: [], labels: [], parents: [], values: [], customdata: [], colors: [] };
+    const themeValue = theme['Métrage réel'] || theme.nb_notices || 0;
+    const weight = (prod) => Number(prod['Métrage réel']) || Number(prod["Nombre d'entrée"]) || 1;
+    const totalWeight = producteurs.reduce((sum, prod) => sum + weight(prod), 0);
+    if (!producteurs.length || !themeValue) return leaves;
+
+    for (const prod of producteurs) {
+      const name = prod.producteur || prod.Producteur || prod.Nom || `Producteur ${prod.id}`;
+      leaves.ids.push(`${themeId}/producteur-${prod.id}`);
+      leaves.labels.push(name);
+      leaves.parents.push(themeId);
+      leaves.values.push(themeValue * weight(prod) / totalWeight);
+      leaves.customdata.push({
+        type: 'producteur',
+        thematique: themeId,
+        description: prod.Description || '',
+        dateExtreme: prod.date_extreme_producteur || '',
+        metrage: prod['Métrage réel'] || 0,
+        nombreEntrees: prod["Nombre d'entrée"] || 0
+      });
+      leaves.colors.push(this.adjustColor(color, 0.3));
+    }
+    return leaves;
+  }
+
+  /**
+   * Feuilles du treemap a l'entree dans une thematique : ses inventaires
+   * (buildInventaireLeaves) et, si elle en a, ses producteurs regroupes
+   * dans une case "Producteurs" (charges a ce moment).
+   */
+  async buildThematiqueLeaves(themeId) {
+    const leaves = this.buildInventaireLeaves(themeId);
+    const total = this.getTheme(themeId).producteurs?.total;
+    if (!total) return leaves;
+
+    const producteurs = await this.buildProducteurLeaves(themeId);
+    if (!producteurs.ids.length) return leaves;
+    const groupId = `${themeId}/producteurs`;
+    const color = this.hierarchyData.colors[this.hierarchyData.ids.indexOf(themeId)] || '#888888';
+    // Sans inventaires, les producteurs occupent toute la thematique
+    const part = leaves.ids.length ? PART_PRODUCTEURS : 1;
+
+    leaves.values = leaves.values.map(value => value * (1 - part));
+    leaves.ids.push(groupId);
+    leaves.labels.push(`Producteurs (${total})`);
+    leaves.parents.push(themeId);
+    leaves.values.push(0);
+    leaves.customdata.push({ type: 'producteurs', thematique: themeId, total });
+    leaves.colors.push(this.adjustColor(color, -0.1));
+
+    leaves.ids.push(...producteurs.ids);
+    leaves.labels.push(...producteurs.labels);
+    leaves.parents.push(...producteurs.parents.map(() => groupId));
+    leaves.values.push(...producteurs.values.map(value => value * part));
+    leaves.customdata.push(...producteurs.customdata);
+    leaves.colors.push(...producteurs.colors);
+    return leaves;
+  }
+
+  /**
+   * Noeuds de l'arbre pour les producteurs d'une thematique
+   */
+  async buildProducteurNodes(themeId) {
+    const producteurs = await this.getProducteurs(themeId);
+    return producteurs.map(prod => ({
+      name: prod.producteur || prod.Producteur || prod.Nom || `Producteur ${prod.id}`,
+      description: prod.Description || '',
+      dates: prod.date_extreme_producteur || '',
+      value: Number(prod['Métrage réel']) || 1,
+      metrage: prod['Métrage réel'] || 0,
+      nombreEntrees: prod["Nombre d'entrée"] || 0,
+      type: 'producteur'
+    }));
+  }
+
+  /**
+   * Enfants de l'arbre ajoutes au premier depliage d'une thematique : ses
+   * inventaires au-dela de la premiere page, puis ses producteurs
+   */
+  async buildThematiqueNodes(themeId) {
+    const [inventaires, producteurs] = await Promise.all([
+      this.getInventairesFrom(themeId, 1),
+      this.buildProducteurNodes(themeId)
+    ]);
+    return [...inventaires.map(inv => this.buildInventaireNode(inv)), ...producteurs];
+  }
+
+  /**
+   * Calcule les cles de recherche (cote, titre, dates) de tous les
+   * inventaires d'une thematique, pages chargees ici ; les recherches
+   * suivantes ne portent que sur la requete. Retourne leur nombre.
+   */
+  async indexInventaires(themeId) {
+    if (!this.searchIndexes.has(themeId)) {
+      const promise = this.getInventairesFrom(themeId, 0)
+        .then(inventaires => inventaires.map(inv =>
+          `${inv.cote || ''}\u0000${inv.titre || ''}\u0000${inv.dates || ''}`.toLowerCase()
+        ))
+        .catch(error => {
+          this.searchIndexes.delete(themeId);
+          throw error;
+        });
+      this.searchIndexes.set(themeId, promise);
+    }
+    return (await this.searchIndexes.get(themeId)).length;
+  }
+
+  /**
+   * Retourne les index (rang dans la thematique) des inventaires contenant
+   * `query` (Uint32Array, transferable sans copie vers la page)
+   */
+  async filterInventaires(themeId, query) {
+    await this.indexInventaires(themeId);
+    const searchKeys = await this.searchIndexes.get(themeId);
+    const matches = new Uint32Array(searchKeys.length);
+    let count = 0;
+    for (let i = 0; i < searchKeys.length; i++) {
+      if (searchKeys[i].includes(query)) matches[count++] = i;
+    }
+    return matches.slice(0, count);
+  }
+}
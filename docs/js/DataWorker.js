@@ -0,0 +1,37 @@
+/**
+ * DataWorker - Web Worker des donnees de la visualisation
+ * Archives departementales des Bouches-du-Rhone (AD13)
+ *
+ * Messages recus : { id, type, args } ou `type` est une methode de
+ * DataService (voir METHODS).
+ * Reponses : { id, result } ou { id, error } ; les mises a jour trouvees
+ * en arriere-plan sont envoyees sous la forme { type: 'update', result }.
+ *
+ * Auteur: Barbara Proenca
+ */
+import { DataService } from './DataService.js';
+
+// Methodes accessibles depuis la page
+const METHODS = [
+  'load', 'buildTreeData', 'getInventaires', 'getInventairePage', 'buildInventaireLeaves',
+  'getProducteurs', 'buildProducteurLeaves', 'buildThematiqueLeaves', 'buildProducteurNodes',
+  'buildThematiqueNodes', 'indexInventaires', 'filterInventaires'
+];
+
+const service = new DataService();
+service.onUpdate = (result) => self.postMessage({ type: 'update', result });
+
+self.onmessage = async (event) => {
+  const { id, type, args = [] } = event.data;
+  try {
+    if (!METHODS.includes(type)) {
+      throw new Error(`Message inconnu: ${type}`);
+    }
+    const result = await service[type](...args);
+    // Les tableaux types sont transferes (pas de copie)
+    const transfer = ArrayBuffer.isView(result) ? [result.buffer] : [];
+    self.postMessage({ id, result }, transfer);
+  } catch (error) {
+    self.postMessage({ id, error: error.message });
+  }
+};
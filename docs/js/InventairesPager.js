@@ -0,0 +1,108 @@
+/**
+ * InventairesPager - Acces pagine aux inventaires d'une serie
+ * Archives departementales des Bouches-du-Rhone (AD13)
+ *
+ * Les inventaires sont publies tries par nombre de notices, en pages de
+ * taille fixe (data/inventaires/<serie>/<n>.<empreinte>.json, nommees par
+ * l'empreinte de leur contenu). La premiere page est fournie avec la serie,
+ * les suivantes sont chargees a la demande par le worker des donnees
+ * (DataLoader). La recherche porte sur toute la serie et est executee par le
+ * worker, qui ne renvoie que les index des resultats : seules les pages
+ * affichees sont transmises a la page.
+ *
+ * Auteur: Barbara Proenca
+ */
+export class InventairesPager {
+  constructor(themeId, pagination, firstPage = [], dataLoader) {
+    // Sans pagination (donnees issues de l'Excel), tout est dans la premiere page
+    this.pagination = pagination || {
+      taille: Math.max(firstPage.length, 1),
+      pages: 1,
+      total: firstPage.length,
+      url: null
+    };
+    this.themeId = themeId;
+    this.total = this.pagination.total;
+    this.pageSize = this.pagination.taille;
+    this.pages = new Map([[0, firstPage.slice(0, this.pageSize)]]);
+    this.pending = new Map();
+    this.dataLoader = dataLoader;
+    this.indexed = null;
+  }
+
+  /**
+   * Retourne l'inventaire d'index i, ou null si sa page n'est pas chargee
+   */
+  get(i) {
+    const page = this.pages.get(Math.floor(i / this.pageSize));
+    return page ? page[i % this.pageSize] || null : null;
+  }
+
+  /**
+   * Charge une page (une seule requete par page, meme si appelee plusieurs fois)
+   */
+  loadPage(num) {
+    if (this.pages.has(num)) return Promise.resolve(this.pages.get(num));
+    if (this.pending.has(num)) return this.pending.get(num);
+
+    const promise = this.dataLoader.getInventairePage(this.themeId, num)
+      .then(inventaires => {
+        this.pages.set(num, inventaires);
+        this.pending.delete(num);
+        return inventaires;
+      })
+      .catch(error => {
+        this.pending.delete(num);
+        throw error;
+      });
+
+    this.pending.set(num, promise);
+    return promise;
+  }
+
+  /**
+   * Charge les pages couvrant les index [first, last]
+   */
+  ensureRange(first, last) {
+    const loads = [];
+    const lastPage = Math.min(Math.floor(last / this.pageSize), this.pagination.pages - 1);
+    for (let num = Math.floor(first / this.pageSize); num <= lastPage; num++) {
+      loads.push(this.loadPage(num));
+    }
+    return Promise.all(loads);
+  }
+
+  /**
+   * Charge les pages contenant les inventaires d'index `indexes`
+   * (resultats d'une recherche)
+   */
+  ensureIndexes(indexes) {
+    const nums = new Set(Array.from(indexes, i => Math.floor(i / this.pageSize)));
+    return Promise.all(Array.from(nums, num => this.loadPage(num)));
+  }
+
+  /**
+   * Prepare la recherche : le worker charge toutes les pages de la serie et
+   * calcule leurs cles, une fois par serie. Appele des que la recherche
+   * recoit le focus, pour que la premiere frappe n'attende pas le reseau.
+   */
+  prepareSearch() {
+    if (!this.indexed) {
+      this.indexed = this.dataLoader.indexInventaires(this.themeId)
+        .catch(error => {
+          this.indexed = null;
+          throw error;
+        });
+    }
+    return this.indexed;
+  }
+
+  /**
+   * Index (Uint32Array) des inventaires de la serie dont la cote, le titre
+   * ou les dates contiennent `query`
+   */
+  async filter(query) {
+    await this.prepareSearch();
+    return this.dataLoader.filterInventaires(this.themeId, query);
+  }
+}
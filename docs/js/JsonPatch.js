@@ -0,0 +1,53 @@
+/**
+ * JsonPatch - Application des deltas publies entre deux versions des donnees
+ * Archives departementales des Bouches-du-Rhone (AD13)
+ *
+ * Les deltas sont des JSON Patch (RFC 6902) generes par
+ * scripts/data_versions.py : seules les operations add, remove et replace
+ * y figurent.
+ *
+ * Auteur: Barbara Proenca
+ */
+
+/**
+ * Decode un JSON Pointer (RFC 6901) en liste de cles
+ */
+function parsePointer(path) {
+  return path.split('/').slice(1).map(token => token.replace(/~1/g, '/').replace(/~0/g, '~'));
+}
+
+/**
+ * Applique un patch a un document (modifie et retourne le document)
+ */
+export function applyPatch(doc, ops) {
+  for (const op of ops) {
+    if (op.path === '') {
+      if (op.op === 'remove') throw new Error('Suppression de la racine impossible');
+      doc = op.value;
+      continue;
+    }
+
+    const tokens = parsePointer(op.path);
+    const last = tokens.pop();
+    let parent = doc;
+    for (const token of tokens) {
+      parent = Array.isArray(parent) ? parent[Number(token)] : parent[token];
+      if (parent === undefined || parent === null) {
+        throw new Error(`Chemin introuvable: ${op.path}`);
+      }
+    }
+
+    if (Array.isArray(parent)) {
+      const index = last === '-' ? parent.length : Number(last);
+      if (op.op === 'add') parent.splice(index, 0, op.value);
+      else if (op.op === 'remove') parent.splice(index, 1);
+      else if (op.op === 'replace') parent[index] = op.value;
+      else throw new Error(`Operation non supportee: ${op.op}`);
+    } else {
+      if (op.op === 'remove') delete parent[last];
+      else if (op.op === 'add' || op.op === 'replace') parent[last] = op.value;
+      else throw new Error(`Operation non supportee: ${op.op}`);
+    }
+  }
+  return doc;
+}
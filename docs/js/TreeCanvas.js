@@ -0,0 +1,364 @@
+/**
+ * TreeCanvas - Arbre dessine dans un canvas, pour les grands arbres
+ * Archives departementales des Bouches-du-Rhone (AD13)
+ *
+ * Utilise par TreeViz au-dela d'un certain nombre de noeuds :
+ * - seuls les enfants des noeuds deplies entrent dans la mise en page ;
+ * - les noeuds sont tries par position verticale : le dessin et la
+ *   detection des clics ne parcourent que la bande visible (recherche
+ *   dichotomique) ;
+ * - en vue eloignee, un seul noeud par ligne de pixels et par niveau est
+ *   dessine, et les libelles sont masques.
+ * Le deplacement et le zoom (d3.zoom) ne font que redessiner. Les enfants
+ * des noeuds `lazy` sont charges au premier depliage (option loadChildren).
+ *
+ * Auteur: Barbara Proenca
+ */
+
+// Espacement vertical entre deux feuilles et horizontal entre deux niveaux
+const ROW_HEIGHT = 22;
+const LEVEL_WIDTH = 250;
+
+// Zoom minimal pour afficher les libelles
+const LABEL_MIN_SCALE = 0.6;
+
+/**
+ * Index du premier noeud dont la position verticale est >= value
+ */
+function lowerBound(nodes, value) {
+  let lo = 0;
+  let hi = nodes.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    if (nodes[mid].x < value) lo = mid + 1;
+    else hi = mid;
+  }
+  return lo;
+}
+
+export class TreeCanvas {
+  constructor(container, options = {}) {
+    this.container = container;
+    this.options = {
+      nodeRadius: 8,
+      onNodeClick: null,
+      loadChildren: null,
+      getNodeColor: () => '#6366F1',
+      formatLabel: (text) => text || '',
+      ...options
+    };
+
+    // Donnees des noeuds deplies (les enfants des autres ne sont pas mis en page)
+    this.expanded = new Set();
+    this.nodes = [];
+    this.parents = [];
+    this.transform = d3.zoomIdentity;
+    this.frame = null;
+    this.resizeObserver = null;
+  }
+
+  /**
+   * Rend l'arbre : seule la racine est depliee
+   */
+  render(data) {
+    this.data = data;
+    this.expanded = new Set([data]);
+
+    this.container.innerHTML = '';
+    this.canvas = document.createElement('canvas');
+    this.canvas.style.display = 'block';
+    this.canvas.style.width = '100%';
+    this.canvas.style.height = '100%';
+    this.container.appendChild(this.canvas);
+    this.ctx = this.canvas.getContext('2d');
+    this.resize();
+
+    this.zoom = d3.zoom()
+      .scaleExtent([0.02, 4])
+      .on('zoom', (event) => {
+        this.transform = event.transform;
+        this.scheduleDraw();
+      });
+    d3.select(this.canvas).call(this.zoom).on('dblclick.zoom', null);
+
+    this.canvas.addEventListener('click', (event) => this.handleClick(event));
+    this.canvas.addEventListener('mousemove', (event) => {
+      this.canvas.style.cursor = this.nodeAt(event) ? 'pointer' : 'grab';
+    });
+
+    if (typeof ResizeObserver !== 'undefined') {
+      this.resizeObserver = new ResizeObserver(() => {
+        this.resize();
+        this.scheduleDraw();
+      });
+      this.resizeObserver.observe(this.container);
+    }
+
+    this.layout();
+    d3.select(this.canvas).call(this.zoom.transform, d3.zoomIdentity.translate(200, this.height / 2));
+  }
+
+  /**
+   * Libere les observateurs (avant un nouveau rendu)
+   */
+  destroy() {
+    this.resizeObserver?.disconnect();
+    if (this.frame) cancelAnimationFrame(this.frame);
+    this.frame = null;
+  }
+
+  resize() {
+    const rect = this.container.getBoundingClientRect();
+    const ratio = window.devicePixelRatio || 1;
+    this.width = rect.width || 1200;
+    this.height = rect.height || 600;
+    this.canvas.width = Math.round(this.width * ratio);
+    this.canvas.height = Math.round(this.height * ratio);
+  }
+
+  /**
+   * Met en page les noeuds visibles (appele a chaque depliage / repliage)
+   */
+  layout() {
+    const root = d3.hierarchy(this.data, d => this.expanded.has(d) ? d.children : null);
+    d3.tree()
+      .nodeSize([ROW_HEIGHT, LEVEL_WIDTH])
+      .separation((a, b) => a.parent === b.parent ? 1 : 1.5)(root);
+
+    this.root = root;
+    // Tri vertical pour la recherche dichotomique ; les enfants d'un noeud
+    // sont deja dans l'ordre vertical
+    this.nodes = root.descendants().sort((a, b) => a.x - b.x);
+    this.parents = this.nodes.filter(node => node.children);
+    this.scheduleDraw();
+  }
+
+  scheduleDraw() {
+    if (this.frame) return;
+    this.frame = requestAnimationFrame(() => {
+      this.frame = null;
+      this.draw();
+    });
+  }
+
+  /**
+   * Dessine les liens et les noeuds de la zone visible
+   */
+  draw() {
+    const { ctx, width, height } = this;
+    const t = this.transform;
+    const ratio = window.devicePixelRatio || 1;
+    const radius = this.options.nodeRadius;
+
+    ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+    ctx.clearRect(0, 0, width, height);
+    ctx.translate(t.x, t.y);
+    ctx.scale(t.k, t.k);
+
+    // Zone visible dans le repere de l'arbre (x vertical, y horizontal)
+    const margin = radius * 2;
+    const top = -t.y / t.k - margin;
+    const bottom = (height - t.y) / t.k + margin;
+    const left = -t.x / t.k - margin;
+    const right = (width - t.x) / t.k + LEVEL_WIDTH;
+
+    // Liens : parents dont l'eventail d'enfants croise la zone visible
+    ctx.beginPath();
+    for (const parent of this.parents) {
+      const kids = parent.children;
+      const spanTop = Math.min(parent.x, kids[0].x);
+      const spanBottom = Math.max(parent.x, kids[kids.length - 1].x);
+      if (spanBottom < top || spanTop > bottom || parent.y > right || parent.y + LEVEL_WIDTH < left) {
+        continue;
+      }
+      // Un enfant de part et d'autre de la zone pour les liens qui la traversent
+      const first = Math.max(0, lowerBound(kids, top) - 1);
+      const last = Math.min(kids.length - 1, lowerBound(kids, bottom));
+      let lastRow = null;
+      for (let i = first; i <= last; i++) {
+        const kid = kids[i];
+        const row = Math.round(kid.x * t.k);
+        if (row === lastRow) continue;
+        lastRow = row;
+        const midY = (parent.y + kid.y) / 2;
+        ctx.moveTo(parent.y, parent.x);
+        ctx.bezierCurveTo(midY, parent.x, midY, kid.x, kid.y, kid.x);
+      }
+    }
+    ctx.globalAlpha = 0.6;
+    ctx.strokeStyle = '#4a5568';
+    ctx.lineWidth = Math.max(1.5, 1 / t.k);
+    ctx.stroke();
+    ctx.globalAlpha = 1;
+
+    // Noeuds de la bande visible, un seul par ligne de pixels et par niveau
+    const visible = [];
+    const lastRowByDepth = [];
+    const end = lowerBound(this.nodes, bottom);
+    for (let i = lowerBound(this.nodes, top); i < end; i++) {
+      const node = this.nodes[i];
+      if (node.y < left || node.y > right) continue;
+      const row = Math.round(node.x * t.k);
+      if (lastRowByDepth[node.depth] === row) continue;
+      lastRowByDepth[node.depth] = row;
+      visible.push(node);
+    }
+
+    // Un chemin par couleur ; des carres d'un pixel quand les cercles sont trop petits
+    const asDots = radius * t.k < 1.5;
+    const dot = 2 / t.k;
+    const byColor = new Map();
+    for (const node of visible) {
+      const color = this.options.getNodeColor(node);
+      if (!byColor.has(color)) byColor.set(color, []);
+      byColor.get(color).push(node);
+    }
+    for (const [color, nodes] of byColor) {
+      ctx.beginPath();
+      for (const node of nodes) {
+        if (asDots) {
+          ctx.rect(node.y - dot / 2, node.x - dot / 2, dot, dot);
+        } else {
+          ctx.moveTo(node.y + radius, node.x);
+          ctx.arc(node.y, node.x, radius, 0, 2 * Math.PI);
+        }
+      }
+      ctx.fillStyle = color;
+      ctx.fill();
+    }
+
+    // Noeuds replies qui ont des enfants : contour clair
+    if (!asDots) {
+      ctx.beginPath();
+      for (const node of visible) {
+        if ((node.data.children?.length || node.data.lazy) && !this.expanded.has(node.data)) {
+          ctx.moveTo(node.y + radius, node.x);
+          ctx.arc(node.y, node.x, radius, 0, 2 * Math.PI);
+        }
+      }
+      ctx.strokeStyle = '#e2e8f0';
+      ctx.lineWidth = 2;
+      ctx.stroke();
+    }
+
+    if (t.k >= LABEL_MIN_SCALE) {
+      this.drawLabels(visible);
+    }
+  }
+
+  drawLabels(nodes) {
+    const ctx = this.ctx;
+    ctx.font = '12px JetBrains Mono, monospace';
+    ctx.textBaseline = 'middle';
+    ctx.lineWidth = 3;
+    ctx.strokeStyle = '#1a1a2e';
+    ctx.fillStyle = '#e2e8f0';
+
+    for (const node of nodes) {
+      const hasChildren = node.data.children?.length > 0 || Boolean(node.data.lazy);
+      const label = this.options.formatLabel(node.data.name);
+      const x = node.y + (hasChildren ? -15 : 15);
+      ctx.textAlign = hasChildren ? 'end' : 'start';
+      ctx.strokeText(label, x, node.x);
+      ctx.fillText(label, x, node.x);
+    }
+  }
+
+  /**
+   * Noeud sous le pointeur, ou null
+   */
+  nodeAt(event) {
+    const rect = this.canvas.getBoundingClientRect();
+    const t = this.transform;
+    const treeX = (event.clientY - rect.top - t.y) / t.k;
+    const treeY = (event.clientX - rect.left - t.x) / t.k;
+    // Au moins 4 pixels ecran de tolerance
+    const tolerance = Math.max(this.options.nodeRadius, 4 / t.k);
+
+    let best = null;
+    let bestDistance = tolerance;
+    const end = lowerBound(this.nodes, treeX + tolerance);
+    for (let i = lowerBound(this.nodes, treeX - tolerance); i < end; i++) {
+      const node = this.nodes[i];
+      const distance = Math.hypot(node.x - treeX, node.y - treeY);
+      if (distance <= bestDistance) {
+        best = node;
+        bestDistance = distance;
+      }
+    }
+    return best;
+  }
+
+  async handleClick(event) {
+    const node = this.nodeAt(event);
+    if (!node) return;
+    if (node.data.lazy && this.options.loadChildren) {
+      try {
+        await this.loadChildren(node.data);
+      } catch (error) {
+        console.error('Erreur lors du chargement des enfants:', error);
+      }
+    }
+    this.toggle(node);
+    if (this.options.onNodeClick) {
+      this.options.onNodeClick(node.data);
+    }
+  }
+
+  /**
+   * Ajoute les enfants differes d'un noeud `lazy` ; le noeud est marque
+   * replie pour que le clic le deplie
+   */
+  async loadChildren(data) {
+    data.lazy = false;
+    try {
+      const children = await this.options.loadChildren(data);
+      data.children = [...(data.children || []), ...children];
+      this.expanded.delete(data);
+    } catch (error) {
+      data.lazy = true;
+      throw error;
+    }
+  }
+
+  /**
+   * Deplie ou replie un noeud en le gardant a la meme position a l'ecran
+   */
+  toggle(node) {
+    const data = node.data;
+    if (!data.children?.length) return;
+
+    const t = this.transform;
+    const screenX = t.x + node.y * t.k;
+    const screenY = t.y + node.x * t.k;
+
+    if (this.expanded.has(data)) this.expanded.delete(data);
+    else this.expanded.add(data);
+    this.layout();
+
+    const moved = this.nodes.find(n => n.data === data);
+    if (moved) {
+      const transform = d3.zoomIdentity
+        .translate(screenX - moved.y * t.k, screenY - moved.x * t.k)
+        .scale(t.k);
+      d3.select(this.canvas).call(this.zoom.transform, transform);
+    }
+  }
+
+  expandAll() {
+    const stack = [this.data];
+    while (stack.length) {
+      const data = stack.pop();
+      if (data.children?.length) {
+        this.expanded.add(data);
+        stack.push(...data.children);
+      }
+    }
+    this.layout();
+  }
+
+  collapseAll() {
+    this.expanded = new Set([this.data]);
+    this.layout();
+  }
+}
@@ -0,0 +1,119 @@
+/**
+ * TreeViewLoader - Chargement differe de la vue arbre
+ * Archives departementales des Bouches-du-Rhone (AD13)
+ *
+ * La vue par defaut est le treemap : D3, les modules de l'arbre
+ * (TreeViz.js, TreeCanvas.js) et les donnees de l'arbre ne sont charges
+ * et calcules qu'a la premiere ouverture de l'onglet "Arbre". Pendant un
+ * temps mort du navigateur, D3 et les modules sont telecharges a l'avance
+ * (sans etre executes pour D3) pour que l'ouverture reste immediate.
+ *
+ * Auteur: Barbara Proenca
+ */
+const D3_URL = 'https://d3js.org/d3.v7.min.js';
+
+// Delai maximal avant la prelecture si le navigateur n'est jamais inactif (ms)
+const IDLE_TIMEOUT = 5000;
+
+export class TreeViewLoader {
+  constructor(dataLoader, containerId, options = {}) {
+    this.dataLoader = dataLoader;
+    this.containerId = containerId;
+    this.options = options;
+    this.treeViz = null;
+    this.loading = null;
+    this.d3Loading = null;
+    this.prefetched = false;
+  }
+
+  /**
+   * Indique si l'arbre a deja ete construit
+   */
+  get ready() {
+    return this.treeViz !== null;
+  }
+
+  /**
+   * Telecharge D3 et les modules de l'arbre pendant un temps mort
+   */
+  prefetchWhenIdle() {
+    const prefetch = () => this.prefetch();
+    if (typeof requestIdleCallback === 'function') {
+      requestIdleCallback(prefetch, { timeout: IDLE_TIMEOUT });
+    } else {
+      setTimeout(prefetch, IDLE_TIMEOUT);
+    }
+  }
+
+  prefetch() {
+    if (this.prefetched || this.loading) return;
+    this.prefetched = true;
+    if (typeof window.d3 === 'undefined') {
+      // Mis en cache sans etre execute : l'execution attend l'ouverture de l'arbre
+      const link = document.createElement('link');
+      link.rel = 'prefetch';
+      link.as = 'script';
+      link.href = D3_URL;
+      document.head.appendChild(link);
+    }
+    // Les modules sont seulement evalues (declarations de classes)
+    import('./TreeViz.js').catch(error => console.warn('Prelecture de l\'arbre impossible:', error));
+  }
+
+  /**
+   * Charge D3 (une seule fois)
+   */
+  loadD3() {
+    if (typeof window.d3 !== 'undefined') return Promise.resolve(window.d3);
+    if (!this.d3Loading) {
+      this.d3Loading = new Promise((resolve, reject) => {
+        const script = document.createElement('script');
+        script.src = D3_URL;
+        script.onload = () => resolve(window.d3);
+        script.onerror = () => {
+          this.d3Loading = null;
+          script.remove();
+          reject(new Error('Chargement de D3 impossible'));
+        };
+        document.head.appendChild(script);
+      });
+    }
+    return this.d3Loading;
+  }
+
+  /**
+   * Construit et rend l'arbre a la premiere demande ; retourne le TreeViz
+   */
+  load() {
+    if (this.treeViz) return Promise.resolve(this.treeViz);
+    if (!this.loading) {
+      this.loading = Promise.all([
+        this.loadD3(),
+        import('./TreeViz.js'),
+        this.dataLoader.buildTreeData()
+      ])
+        .then(([, { TreeViz }, treeData]) => {
+          const container = document.getElementById(this.containerId);
+          this.treeViz = new TreeViz(this.containerId, {
+            width: container?.clientWidth || 1200,
+            height: container?.clientHeight || 600,
+            ...this.options
+          });
+          this.treeViz.render(treeData);
+          return this.treeViz;
+        })
+        .finally(() => {
+          this.loading = null;
+        });
+    }
+    return this.loading;
+  }
+
+  /**
+   * Nouvelles donnees : l'arbre n'est reconstruit que s'il a deja ete affiche
+   */
+  async refresh() {
+    if (!this.treeViz) return;
+    this.treeViz.render(await this.dataLoader.buildTreeData());
+  }
+}
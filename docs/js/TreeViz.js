@@ -1,9 +1,17 @@
 /**
  * TreeViz - Arbre collapsible avec D3.js
  * Archives departementales des Bouches-du-Rhone (AD13)
+ *
+ * Les noeuds marques `lazy` (thematiques avec producteurs) recoivent leurs
+ * enfants supplementaires au premier depliage (option loadChildren).
  * 
  * Auteur: Barbara Proenca
  */
+import { TreeCanvas } from './TreeCanvas.js';
+
+// Au-dela de ce nombre de noeuds, l'arbre est dessine dans un canvas (TreeCanvas)
+const CANVAS_NODE_THRESHOLD = 1000;
+
 export class TreeViz {
   constructor(containerId, options = {}) {
     this.containerId = containerId;
@@ -14,11 +22,16 @@ export class TreeViz {
       nodeRadius: options.nodeRadius || 8,
       duration: options.duration || 500,
       onNodeClick: options.onNodeClick || null,
+      // (donnees du noeud) => Promise des enfants a ajouter aux noeuds `lazy`
+      loadChildren: options.loadChildren || null,
+      // 'svg', 'canvas' ou 'auto' (selon le nombre de noeuds)
+      renderer: options.renderer || 'auto',
       ...options
     };
     
     this.margin = { top: 40, right: 200, bottom: 40, left: 200 };
     this.nodeId = 0;
+    this.canvasTree = null;
   }
 
   /**
@@ -27,7 +40,21 @@ export class TreeViz {
   render(data) {
     this.data = data;
     
+    this.canvasTree?.destroy();
+    this.canvasTree = null;
     this.container.innerHTML = '';
+
+    if (this.useCanvas(data)) {
+      this.canvasTree = new TreeCanvas(this.container, {
+        nodeRadius: this.options.nodeRadius,
+        onNodeClick: this.options.onNodeClick,
+        loadChildren: this.options.loadChildren,
+        getNodeColor: (d) => this.getNodeColor(d),
+        formatLabel: (text) => this.truncateLabel(text, 40)
+      });
+      this.canvasTree.render(data);
+      return;
+    }
     
     const containerRect = this.container.getBoundingClientRect();
     const actualWidth = containerRect.width || this.options.width;
@@ -58,6 +85,23 @@ export class TreeViz {
     this.update(this.root);
   }
 
+  /**
+   * Choisit le rendu canvas pour les grands arbres
+   */
+  useCanvas(data) {
+    if (this.options.renderer !== 'auto') {
+      return this.options.renderer === 'canvas';
+    }
+    let count = 0;
+    const stack = [data];
+    while (stack.length) {
+      const node = stack.pop();
+      if (++count > CANVAS_NODE_THRESHOLD) return true;
+      if (node.children) stack.push(...node.children);
+    }
+    return false;
+  }
+
   /**
    * Collapse un noeud et ses enfants
    */
@@ -92,6 +136,53 @@ export class TreeViz {
     }
   }
 
+  /**
+   * Charge les enfants d'un noeud `lazy` et les ajoute deplies a la suite
+   * des enfants existants
+   */
+  async loadChildren(node) {
+    const data = node.data;
+    data.lazy = false;
+    let children;
+    try {
+      children = await this.options.loadChildren(data);
+    } catch (error) {
+      data.lazy = true;
+      throw error;
+    }
+    if (!children.length) return;
+
+    data.children = [...(data.children || []), ...children];
+    this.expand(node);
+    const added = children.map(child => {
+      const childNode = d3.hierarchy(child);
+      childNode.depth = node.depth + 1;
+      childNode.parent = node;
+      this.collapse(childNode);
+      return childNode;
+    });
+    node.children = [...(node.children || []), ...added];
+  }
+
+  /**
+   * Clic sur un noeud : chargement des enfants differes, sinon depliage / repliage
+   */
+  async handleClick(node) {
+    if (node.data.lazy && this.options.loadChildren) {
+      try {
+        await this.loadChildren(node);
+      } catch (error) {
+        console.error('Erreur lors du chargement des enfants:', error);
+      }
+    } else {
+      this.toggle(node);
+    }
+    this.update(node);
+    if (this.options.onNodeClick) {
+      this.options.onNodeClick(node.data);
+    }
+  }
+
   /**
    * Met a jour l'arbre
    */
@@ -113,17 +204,11 @@ export class TreeViz {
       .append('g')
       .attr('class', 'node')
       .attr('transform', d => `translate(${source.y0},${source.x0})`)
-      .on('click', (event, d) => {
-        this.toggle(d);
-        this.update(d);
-        if (this.options.onNodeClick) {
-          this.options.onNodeClick(d.data);
-        }
-      });
+      .on('click', (event, d) => this.handleClick(d));
 
     nodeEnter.append('circle')
       .attr('r', 1e-6)
-      .attr('class', d => d._children ? 'node-circle has-children' : 'node-circle')
+      .attr('class', d => d._children || d.data.lazy ? 'node-circle has-children' : 'node-circle')
       .style('fill', d => this.getNodeColor(d))
       .style('stroke', d => d3.rgb(this.getNodeColor(d)).darker(0.5))
       .style('stroke-width', 2)
@@ -131,8 +216,8 @@ export class TreeViz {
 
     nodeEnter.append('text')
       .attr('dy', '.35em')
-      .attr('x', d => d.children || d._children ? -15 : 15)
-      .attr('text-anchor', d => d.children || d._children ? 'end' : 'start')
+      .attr('x', d => d.children || d._children || d.data.lazy ? -15 : 15)
+      .attr('text-anchor', d => d.children || d._children || d.data.lazy ? 'end' : 'start')
       .text(d => this.truncateLabel(d.data.name, 40))
       .style('font-family', 'JetBrains Mono, monospace')
       .style('font-size', '12px')
@@ -150,7 +235,7 @@ export class TreeViz {
 
     nodeUpdate.select('circle')
       .attr('r', this.options.nodeRadius)
-      .attr('class', d => d._children ? 'node-circle has-children' : 'node-circle')
+      .attr('class', d => d._children || d.data.lazy ? 'node-circle has-children' : 'node-circle')
       .style('fill', d => d._children ? this.getNodeColor(d) : 
                           d.children ? d3.rgb(this.getNodeColor(d)).brighter(0.3) : 
                           this.getNodeColor(d));
@@ -239,6 +324,10 @@ export class TreeViz {
    * Expand tous les noeuds
    */
   expandAll() {
+    if (this.canvasTree) {
+      this.canvasTree.expandAll();
+      return;
+    }
     const expandRecursive = (node) => {
       if (node._children) {
         node.children = node._children;
@@ -256,6 +345,10 @@ export class TreeViz {
    * Collapse tous les noeuds
    */
   collapseAll() {
+    if (this.canvasTree) {
+      this.canvasTree.collapseAll();
+      return;
+    }
     if (this.root.children) {
       this.root.children.forEach(child => this.collapse(child));
     }
@@ -1,6 +1,11 @@
 /**
  * TreemapViz - Visualisation Treemap interactive avec Plotly
  * Archives departementales des Bouches-du-Rhone (AD13)
+ *
+ * La trace initiale s'arrete aux thematiques. Les producteurs d'une
+ * thematique (a defaut ses inventaires) sont ajoutes comme feuilles
+ * lorsqu'on y entre (addLeaves) ; maxdepth les masque tant que la vue est
+ * au-dessus de la thematique.
  * 
  * Auteur: Barbara Proenca
  */
@@ -14,6 +19,10 @@ export class TreemapViz {
       onNodeClick: options.onNodeClick || null,
       ...options
     };
+    // Feuilles ajoutees, par thematique
+    this.leaves = new Map();
+    this.animating = false;
+    this.afterAnimation = null;
   }
 
   /**
@@ -21,23 +30,88 @@ export class TreemapViz {
    */
   render(data) {
     this.data = data;
+    this.leaves = new Map();
+
+    // Apercu statique insere a la construction (treemap_snapshot.py)
+    this.container.querySelector('.treemap-snapshot')?.remove();
 
     const containerHeight = this.container.clientHeight || this.options.height;
     this.options.height = containerHeight;
 
+    this.layout = {
+      height: this.options.height,
+      margin: { t: 40, l: 5, r: 5, b: 5 },
+      font: {
+        family: 'JetBrains Mono, monospace',
+        color: '#f1f5f9'
+      },
+      paper_bgcolor: 'rgba(0,0,0,0)',
+      plot_bgcolor: 'rgba(0,0,0,0)'
+    };
+
+    this.config = {
+      responsive: true,
+      displayModeBar: true,
+      modeBarButtonsToRemove: ['lasso2d', 'select2d'],
+      displaylogo: false,
+      toImageButtonOptions: {
+        format: 'png',
+        filename: 'archives_ad13_treemap',
+        height: 1200,
+        width: 1600,
+        scale: 2
+      }
+    };
+
+    Plotly.newPlot(this.containerId, [this.buildTrace()], this.layout, this.config);
+
+    // Le zoom vers un noeud est anime : les feuilles sont ajoutees apres
+    this.container.on('plotly_treemapclick', () => {
+      this.animating = true;
+    });
+    this.container.on('plotly_animated', () => {
+      this.animating = false;
+      const callback = this.afterAnimation;
+      this.afterAnimation = null;
+      if (callback) callback();
+    });
+
+    // Gerer les clics
+    this.container.on('plotly_click', (eventData) => {
+      if (eventData.points && eventData.points[0]) {
+        const point = eventData.points[0];
+        if (this.options.onNodeClick) {
+          this.options.onNodeClick({
+            id: point.id,
+            label: point.label,
+            value: point.value,
+            customdata: point.customdata
+          });
+        }
+      }
+    });
+  }
+
+  /**
+   * Construit la trace : hierarchie de base et feuilles deja ajoutees.
+   * `level` est le noeud affiche a la racine de la vue.
+   */
+  buildTrace(level = undefined) {
+    const data = this.data;
     const trace = {
       type: 'treemap',
-      ids: data.ids,
-      labels: data.labels,
-      parents: data.parents,
-      values: data.values,
-      customdata: data.customdata,
+      ids: [...data.ids],
+      labels: [...data.labels],
+      parents: [...data.parents],
+      values: [...data.values],
+      customdata: [...data.customdata],
+      level,
       
       branchvalues: 'remainder',
       textinfo: 'label+percent parent',
       
       marker: {
-        colors: data.colors,
+        colors: [...data.colors],
         line: {
           width: 1.5,
           color: 'rgba(15, 15, 26, 0.6)'
@@ -69,50 +143,60 @@ export class TreemapViz {
         side: 'top'
       },
       
+      // Racine, fonctions et thematiques ; les feuilles (producteurs ou
+      // inventaires) n'apparaissent qu'une fois entre dans leur thematique
       maxdepth: 3
     };
 
-    const layout = {
-      height: this.options.height,
-      margin: { t: 40, l: 5, r: 5, b: 5 },
-      font: {
-        family: 'JetBrains Mono, monospace',
-        color: '#f1f5f9'
-      },
-      paper_bgcolor: 'rgba(0,0,0,0)',
-      plot_bgcolor: 'rgba(0,0,0,0)'
-    };
+    for (const leaves of this.leaves.values()) {
+      trace.ids.push(...leaves.ids);
+      trace.labels.push(...leaves.labels);
+      trace.parents.push(...leaves.parents);
+      trace.values.push(...leaves.values);
+      trace.customdata.push(...leaves.customdata);
+      trace.marker.colors.push(...leaves.colors);
+    }
 
-    const config = {
-      responsive: true,
-      displayModeBar: true,
-      modeBarButtonsToRemove: ['lasso2d', 'select2d'],
-      displaylogo: false,
-      toImageButtonOptions: {
-        format: 'png',
-        filename: 'archives_ad13_treemap',
-        height: 1200,
-        width: 1600,
-        scale: 2
+    // La thematique garde sa surface : sa valeur est repartie entre ses feuilles
+    for (const parentId of this.leaves.keys()) {
+      if (this.leaves.get(parentId).ids.length) {
+        trace.values[data.ids.indexOf(parentId)] = 0;
       }
-    };
+    }
 
-    Plotly.newPlot(this.containerId, [trace], layout, config);
+    return trace;
+  }
 
-    // Gerer les clics
-    this.container.on('plotly_click', (eventData) => {
-      if (eventData.points && eventData.points[0]) {
-        const point = eventData.points[0];
-        if (this.options.onNodeClick) {
-          this.options.onNodeClick({
-            id: point.id,
-            label: point.label,
-            value: point.value,
-            customdata: point.customdata
-          });
+  /**
+   * Indique si les feuilles d'une thematique ont deja ete ajoutees
+   */
+  hasLeaves(parentId) {
+    return this.leaves.has(parentId);
+  }
+
+  /**
+   * Ajoute les feuilles (producteurs ou inventaires) d'une thematique et
+   * garde la vue sur cette thematique
+   */
+  addLeaves(parentId, leaves) {
+    if (this.leaves.has(parentId)) return;
+    this.leaves.set(parentId, leaves);
+    if (!leaves.ids.length) return;
+
+    const redraw = () => Plotly.react(this.containerId, [this.buildTrace(parentId)], this.layout, this.config);
+    if (this.animating) {
+      this.afterAnimation = redraw;
+      // Filet de securite si l'animation ne se termine pas (clic sans zoom)
+      setTimeout(() => {
+        if (this.afterAnimation === redraw) {
+          this.animating = false;
+          this.afterAnimation = null;
+          redraw();
         }
-      }
-    });
+      }, 1000);
+    } else {
+      redraw();
+    }
   }
 
   /**
@@ -134,15 +218,8 @@ export class TreemapViz {
    */
   update(data) {
     this.data = data;
-    Plotly.react(this.containerId, [{
-      type: 'treemap',
-      ids: data.ids,
-      labels: data.labels,
-      parents: data.parents,
-      values: data.values,
-      customdata: data.customdata,
-      marker: { colors: data.colors }
-    }]);
+    this.leaves = new Map();
+    Plotly.react(this.containerId, [this.buildTrace()], this.layout, this.config);
   }
 
   /**
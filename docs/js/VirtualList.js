@@ -0,0 +1,126 @@
+/**
+ * VirtualList - Liste virtualisee a hauteur de ligne fixe
+ * Archives departementales des Bouches-du-Rhone (AD13)
+ *
+ * Seules les lignes visibles (plus une marge) sont presentes dans le DOM,
+ * quelle que soit la taille de la liste.
+ *
+ * Auteur: Barbara Proenca
+ */
+export class VirtualList {
+  constructor(container, options = {}) {
+    this.container = container;
+    this.options = {
+      rowHeight: options.rowHeight || 80,
+      overscan: options.overscan || 6,
+      renderRow: options.renderRow || (() => ''),
+      renderPlaceholder: options.renderPlaceholder || (() => ''),
+      onMissingRange: options.onMissingRange || null,
+      ...options
+    };
+
+    this.count = 0;
+    this.getItem = () => null;
+    this.firstRendered = -1;
+    this.lastRendered = -1;
+    this.frame = null;
+
+    this.onScroll = () => this.scheduleRender();
+  }
+
+  /**
+   * Affiche une nouvelle liste
+   * @param {number} count - Nombre total de lignes
+   * @param {Function} getItem - Retourne l'element d'index i, ou null s'il n'est pas encore charge
+   */
+  setItems(count, getItem) {
+    this.count = count;
+    this.getItem = getItem;
+
+    this.container.innerHTML = '';
+    this.spacer = document.createElement('div');
+    this.spacer.className = 'virtual-spacer';
+    this.spacer.style.height = `${count * this.options.rowHeight}px`;
+    this.rows = document.createElement('div');
+    this.rows.className = 'virtual-rows';
+    this.spacer.appendChild(this.rows);
+    this.container.appendChild(this.spacer);
+
+    this.container.removeEventListener('scroll', this.onScroll);
+    this.container.addEventListener('scroll', this.onScroll, { passive: true });
+    this.container.scrollTop = 0;
+
+    this.firstRendered = -1;
+    this.lastRendered = -1;
+    this.renderWindow();
+  }
+
+  /**
+   * Redessine la fenetre visible (par exemple apres le chargement d'une page)
+   */
+  refresh() {
+    this.firstRendered = -1;
+    this.lastRendered = -1;
+    this.scheduleRender();
+  }
+
+  /**
+   * Detache la liste du conteneur
+   */
+  detach() {
+    this.container.removeEventListener('scroll', this.onScroll);
+    if (this.frame) {
+      cancelAnimationFrame(this.frame);
+      this.frame = null;
+    }
+    this.count = 0;
+  }
+
+  /**
+   * Regroupe les rendus sur la prochaine frame
+   */
+  scheduleRender() {
+    if (this.frame) return;
+    this.frame = requestAnimationFrame(() => {
+      this.frame = null;
+      this.renderWindow();
+    });
+  }
+
+  /**
+   * Rend uniquement les lignes de la fenetre visible
+   */
+  renderWindow() {
+    if (!this.rows) return;
+
+    const { rowHeight, overscan } = this.options;
+    const viewHeight = this.container.clientHeight || rowHeight * 10;
+    const first = Math.max(0, Math.floor(this.container.scrollTop / rowHeight) - overscan);
+    const last = Math.min(this.count - 1, Math.ceil((this.container.scrollTop + viewHeight) / rowHeight) + overscan);
+
+    if (first === this.firstRendered && last === this.lastRendered) return;
+    this.firstRendered = first;
+    this.lastRendered = last;
+
+    let html = '';
+    let firstMissing = -1;
+    let lastMissing = -1;
+    for (let i = first; i <= last; i++) {
+      const item = this.getItem(i);
+      if (item) {
+        html += this.options.renderRow(item, i);
+      } else {
+        html += this.options.renderPlaceholder(i);
+        if (firstMissing < 0) firstMissing = i;
+        lastMissing = i;
+      }
+    }
+
+    this.rows.style.transform = `translateY(${first * rowHeight}px)`;
+    this.rows.innerHTML = html;
+
+    if (firstMissing >= 0 && this.options.onMissingRange) {
+      this.options.onMissingRange(firstMissing, lastMissing);
+    }
+  }
+}
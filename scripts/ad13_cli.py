@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Point d'entree unique des commandes du projet : `ad13 <commande>`.
+
+Les modules des commandes (et leurs dependances lourdes : pandas, requests,
+bs4) ne sont importes qu'au lancement de la commande choisie ; `ad13 stats`
+et `ad13 validate` n'utilisent que la bibliotheque standard.
+
+Auteur: Barbara Proenca
+"""
+
+import argparse
+import importlib
+import json
+import sys
+from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+
+ARCHIVES_JSON_PATH = PROJECT_ROOT / "docs" / "data" / "archives.json"
+
+# Commande -> (module, description), importe a la demande
+COMMANDS = {
+    'scrape': ('scrape_ad13_inventaires', "Extraction des inventaires depuis archives13.fr"),
+    'scrape-sites': ('scrape_ligeo_sites', "Extraction des inventaires de plusieurs portails Ligeo"),
+    'build': ('build_full_visualization', "Construction de la visualisation complete"),
+    'integrate': ('integrate_inventaires', "Integration des inventaires dans la visualisation"),
+    'convert': ('convert_excel_to_json', "Conversion du classeur Excel en JSON"),
+    'create-data': ('create_ad13_data', "Creation du classeur des AD13"),
+    'publish': ('publish_site', "Publication du site avec des fichiers empreintes"),
+    'check-links': ('check_links', "Verification des liens des inventaires et des categories"),
+    'history': ('history_store', "Historique des extractions et evolutions"),
+    'watch': ('watch_site', "Reconstruction a la volee et serveur de developpement"),
+    'snapshot': ('treemap_snapshot', "Apercu statique du treemap dans index.html"),
+    'query': ('fonds_index', "Requetes par facettes sur les inventaires"),
+    'preview': ('preview_site', "Serveur de previsualisation (compression, cache, plages)"),
+    'cote': ('cote_index', "Recherche des fonds par cote"),
+    'clusters': ('title_clusters', "Sous-thematiques des grandes series"),
+}
+
+
+def load_json(path):
+    """Charge un fichier JSON."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compute_stats(archives_data):
+    """Statistiques globales du JSON de la visualisation."""
+    fonctions = archives_data.get('fonctions', [])
+    return {
+        'fonctions': len(fonctions),
+        'thematiques': len(archives_data.get('thematiques', [])),
+        # Producteurs sans thematique et producteurs publies par thematique
+        'producteurs': len(archives_data.get('producteurs', [])) + sum(
+            (t.get('producteurs') or {}).get('total', 0) for t in archives_data.get('thematiques', [])),
+        'inventaires': sum(f.get('nb_inventaires_en_ligne', 0) for f in fonctions),
+        'notices': sum(f.get('nb_notices_en_ligne', 0) for f in fonctions),
+        'par_fonction': {
+            f.get('fonction', ''): {
+                'inventaires': f.get('nb_inventaires_en_ligne', 0),
+                'notices': f.get('nb_notices_en_ligne', 0)
+            }
+            for f in fonctions
+        }
+    }
+
+
+def validate_archives(archives_data, docs_dir=None):
+    """
+    Verifie la structure du JSON de la visualisation. Si `docs_dir` est
+    fourni, verifie aussi la presence des pages d'inventaires.
+
+    Returns:
+        Liste des erreurs (vide si le fichier est valide)
+    """
+    errors = []
+
+    for key in ('fonctions', 'thematiques', 'producteurs'):
+        if not isinstance(archives_data.get(key), list):
+            errors.append(f"Cle '{key}' absente ou qui n'est pas une liste")
+    if errors:
+        return errors
+
+    noms_fonctions = set()
+    for index, func in enumerate(archives_data['fonctions']):
+        name = func.get('fonction')
+        if not name:
+            errors.append(f"fonctions[{index}]: champ 'fonction' manquant")
+        elif name in noms_fonctions:
+            errors.append(f"fonctions[{index}]: fonction '{name}' en double")
+        noms_fonctions.add(name)
+
+    for index, theme in enumerate(archives_data['thematiques']):
+        name = theme.get('Thématique') or theme.get('Thematique')
+        func_name = theme.get('Fonction') or theme.get('fonction')
+        if not name:
+            errors.append(f"thematiques[{index}]: champ 'Thématique' manquant")
+        if func_name not in noms_fonctions:
+            errors.append(f"thematiques[{index}]: fonction inconnue '{func_name}'")
+
+        pagination = theme.get('pagination')
+        if pagination:
+            if pagination.get('total') != theme.get('nb_inventaires', pagination.get('total')):
+                errors.append(f"thematiques[{index}]: pagination.total different de nb_inventaires")
+            if docs_dir is not None:
+                page_dir = docs_dir / pagination.get('url', '')
+                empreintes = pagination.get('empreintes') or []
+                for num in range(pagination.get('pages', 0)):
+                    name = f"{num}.{empreintes[num]}.json" if num < len(empreintes) else f"{num}.json"
+                    if not (page_dir / name).exists():
+                        errors.append(f"thematiques[{index}]: page manquante {page_dir / name}")
+
+        producteurs = theme.get('producteurs')
+        if producteurs and docs_dir is not None:
+            shard_path = docs_dir / producteurs.get('url', '')
+            if not shard_path.is_file():
+                errors.append(f"thematiques[{index}]: producteurs manquants {shard_path}")
+
+    # Fonds par serie tries par cote (construction complete)
+    cotes = (archives_data.get('metadata') or {}).get('cotes') or {}
+    if docs_dir is not None:
+        for serie, shard in cotes.items():
+            shard_path = docs_dir / shard.get('url', '')
+            if not shard_path.is_file():
+                errors.append(f"metadata.cotes[{serie}]: fichier manquant {shard_path}")
+
+    return errors
+
+
+def stats_main(argv=None):
+    """Affiche les statistiques du JSON de la visualisation."""
+    parser = argparse.ArgumentParser(prog='ad13 stats', description="Statistiques des donnees")
+    parser.add_argument('path', nargs='?', type=Path, default=ARCHIVES_JSON_PATH)
+    parser.add_argument('--json', action='store_true', help="Sortie JSON")
+    args = parser.parse_args(argv)
+
+    stats = compute_stats(load_json(args.path))
+
+    if args.json:
+        print(json.dumps(stats, ensure_ascii=False, indent=2))
+        return
+
+    print(f"{args.path}:")
+    print(f"  {stats['fonctions']} fonctions, {stats['thematiques']} thematiques, "
+          f"{stats['producteurs']} producteurs")
+    print(f"  {stats['inventaires']} inventaires, {stats['notices']} notices")
+    for name, data in sorted(stats['par_fonction'].items(), key=lambda x: -x[1]['notices']):
+        print(f"  {name[:40]:40} : {data['inventaires']:5} inv, {data['notices']:7} notices")
+
+
+def validate_main(argv=None):
+    """Valide le JSON de la visualisation (code de sortie 1 en cas d'erreur)."""
+    parser = argparse.ArgumentParser(prog='ad13 validate', description="Validation des donnees")
+    parser.add_argument('path', nargs='?', type=Path, default=ARCHIVES_JSON_PATH)
+    args = parser.parse_args(argv)
+
+    try:
+        archives_data = load_json(args.path)
+    except (OSError, ValueError) as e:
+        print(f"Erreur: {args.path}: {e}")
+        sys.exit(1)
+
+    # Les pages d'inventaires sont relatives au dossier docs/
+    errors = validate_archives(archives_data, docs_dir=args.path.parent.parent)
+    if errors:
+        print(f"{args.path}: {len(errors)} erreur(s)")
+        for error in errors:
+            print(f"  - {error}")
+        sys.exit(1)
+
+    print(f"{args.path}: valide")
+
+
+def main(argv=None):
+    """Point d'entree `ad13 <commande> [options]`."""
+    argv = sys.argv[1:] if argv is None else argv
+
+    usage = "\n".join(
+        [f"  {name:12} {description}" for name, (_, description) in COMMANDS.items()]
+        + [f"  {'stats':12} Statistiques des donnees", f"  {'validate':12} Validation des donnees"]
+    )
+
+    if not argv or argv[0] in ('-h', '--help'):
+        print(f"usage: ad13 <commande> [options]\n\nCommandes:\n{usage}")
+        return
+
+    command, args = argv[0], argv[1:]
+    if command == 'stats':
+        return stats_main(args)
+    if command == 'validate':
+        return validate_main(args)
+    if command not in COMMANDS:
+        print(f"Commande inconnue: {command}\n\nCommandes:\n{usage}")
+        sys.exit(2)
+
+    module = importlib.import_module(COMMANDS[command][0])
+    return module.main(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Racine du projet pour les scripts, qu'ils soient lances depuis le depot
+(python scripts/...) ou installes comme commandes (pip install .).
+
+Ordre de resolution :
+1. la variable d'environnement AD13_ROOT ;
+2. le depot contenant ce fichier (dossiers data/ et docs/ presents) ;
+3. le repertoire courant.
+
+Auteur: Barbara Proenca
+"""
+
+import os
+from pathlib import Path
+
+
+def find_project_root() -> Path:
+    """Determine la racine du projet (voir l'ordre de resolution ci-dessus)."""
+    env_root = os.environ.get('AD13_ROOT')
+    if env_root:
+        return Path(env_root)
+
+    repo_root = Path(__file__).resolve().parent.parent
+    if (repo_root / "data").is_dir() and (repo_root / "docs").is_dir():
+        return repo_root
+
+    return Path.cwd()
+
+
+PROJECT_ROOT = find_project_root()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Banc de performance de la chaine de traitement des inventaires.
+Genere des catalogues synthetiques (1k a 1M fonds) calques sur la
+distribution reelle de inventaires_ad13.json, chronometre chaque etape et
+enregistre le temps et le pic memoire dans un rapport JSON comparable
+d'une execution a l'autre.
+
+Usage:
+    python scripts/benchmark.py --sizes 1000 10000 --output bench.json
+    python scripts/benchmark.py --sizes 1000 10000 --baseline bench.json
+
+Auteur: Barbara Proenca
+"""
+
+import argparse
+import json
+import platform
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+
+# Chemins
+SCRIPTS_DIR = Path(__file__).parent
+REFERENCE_PATH = PROJECT_ROOT / "data" / "inventaires_ad13.json"
+
+# Tailles de catalogue par defaut
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+# Au-dela, le classeur Excel n'est pas genere (ecriture tres longue)
+DEFAULT_MAX_WORKBOOK_SIZE = 100000
+
+# Tolerance par defaut avant de signaler une regression (20 %)
+DEFAULT_TOLERANCE = 0.2
+
+# Les etapes plus courtes ne sont pas comparees (bruit de mesure)
+MIN_COMPARABLE_SECONDS = 0.01
+
+
+def load_reference(path=REFERENCE_PATH):
+    """Charge les fonds reels servant de modele a la generation."""
+    with open(path, 'r', encoding='utf-8') as f:
+        fonds = json.load(f)['fonds']
+    if not fonds:
+        raise ValueError(f"Aucun fonds de reference dans {path}")
+    return fonds
+
+
+def generate_fonds(size, reference, seed=13):
+    """
+    Genere `size` fonds synthetiques.
+
+    Chaque fonds reprend la forme de cote, les dates, le titre et le nombre
+    de notices d'un fonds reel tire au hasard : la repartition par serie et
+    par periode suit donc celle du catalogue reel. Seul le numero de la cote
+    est redistribue pour produire des cotes distinctes.
+    """
+    rng = random.Random(seed)
+    fonds_list = []
+
+    for i in range(size):
+        model = rng.choice(reference)
+        cote = model.get('cote', '')
+        if re.match(r'^\d+', cote):
+            cote = re.sub(r'^\d+', str(rng.randint(1, 5000)), cote, count=1)
+        fonds_id = str(100000 + i)
+        fonds_list.append({
+            'cote': cote,
+            'titre': model.get('titre', ''),
+            'dates': model.get('dates', ''),
+            'nb_notices': model.get('nb_notices', 0),
+            'fonds_id': fonds_id,
+            'url': f"https://www.archives13.fr/archive/fonds/FRAD013_{fonds_id}"
+        })
+
+    return fonds_list
+
+
+def write_streaming_workbook(path, sheets):
+    """
+    Ecrit un classeur en flux (mode ecriture seule d'openpyxl). Le banc
+    garde son propre generateur : les scripts mesures (--scripts-dir) peuvent
+    etre une version qui ne fournit pas d'ecriture en flux.
+
+    Args:
+        sheets: Liste de tuples (nom de feuille, colonnes, lignes) ou les
+            lignes sont des dictionnaires
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for sheet_name, columns, rows in sheets:
+        ws = wb.create_sheet(sheet_name)
+        ws.append(columns)
+        for row in rows:
+            ws.append([row.get(col) for col in columns])
+    wb.save(path)
+
+
+def write_workbook(path, inventaires_data):
+    """
+    Ecrit un classeur au format de data/archives.xlsx (une ligne de
+    producteur par fonds), en flux.
+    """
+    from build_full_visualization import CATEGORY_INFO, extract_serie
+
+    fonds_list = inventaires_data['fonds']
+
+    themes = {}
+    for fonds in fonds_list:
+        key = (extract_serie(fonds['cote']), fonds.get('categorie', ''))
+        themes[key] = themes.get(key, 0) + 1
+
+    write_streaming_workbook(path, [
+        ('Fonction',
+         ['fonction', 'Description', 'Métrage réel', "Nombre d'entrée", 'url'],
+         ({'fonction': name, 'Description': info['description'], 'Métrage réel': 0,
+           "Nombre d'entrée": 0, 'url': info['url']}
+          for name, info in CATEGORY_INFO.items())),
+        ('Thématique',
+         ['Thématique', 'Fonction', 'Métrage réel', "Nombre d'entrée"],
+         ({'Thématique': f"Serie {serie}", 'Fonction': categorie,
+           'Métrage réel': count / 10, "Nombre d'entrée": count}
+          for (serie, categorie), count in sorted(themes.items()))),
+        ('Producteur',
+         ['Numero Ligeo', 'Nom', 'date_extreme_producteur', 'Métrage réel',
+          "Nombre d'entrée", 'Thematique'],
+         ({'Numero Ligeo': fonds['fonds_id'], 'Nom': fonds['titre'],
+           'date_extreme_producteur': fonds['dates'], 'Métrage réel': fonds['nb_notices'] / 10,
+           "Nombre d'entrée": 1, 'Thematique': f"Serie {extract_serie(fonds['cote'])}"}
+          for fonds in fonds_list)),
+    ])
+
+
+def measure(func, *args, trace_memory=True):
+    """
+    Execute une etape et retourne (resultat, mesures).
+
+    Le temps est mesure sur une premiere execution sans tracemalloc (qui
+    ralentit fortement les allocations) ; le pic memoire sur une seconde
+    execution tracee.
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    wall = time.perf_counter() - start
+
+    metrics = {'wall_s': round(wall, 6)}
+
+    if trace_memory:
+        tracemalloc.start()
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        metrics['peak_mb'] = round(peak / (1024 * 1024), 3)
+
+    return result, metrics
+
+
+def run_size(size, reference, workdir, max_workbook_size, trace_memory=True):
+    """Execute toutes les etapes pour un catalogue de `size` fonds."""
+    from scrape_ad13_inventaires import categorize_fonds
+    from build_full_visualization import build_visualization_data
+    from integrate_inventaires import compute_stats_by_category
+    from convert_excel_to_json import convert_excel_to_json
+
+    results = {}
+    inventaires_path = workdir / f"inventaires_{size}.json"
+
+    inventaires = {
+        'metadata': {'source': 'benchmark', 'total_fonds': size},
+        'fonds': generate_fonds(size, reference)
+    }
+
+    def dump():
+        with open(inventaires_path, 'w', encoding='utf-8') as f:
+            json.dump(inventaires, f, ensure_ascii=False, indent=2)
+
+    def load():
+        with open(inventaires_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def categorize(data):
+        for fonds in data['fonds']:
+            fonds['categorie'] = categorize_fonds(fonds)
+
+    _, results['json_dump'] = measure(dump, trace_memory=trace_memory)
+    inventaires, results['json_load'] = measure(load, trace_memory=trace_memory)
+    _, results['categorize_fonds'] = measure(categorize, inventaires, trace_memory=trace_memory)
+    _, results['build_visualization_data'] = measure(
+        build_visualization_data, inventaires, trace_memory=trace_memory)
+    _, results['compute_stats_by_category'] = measure(
+        compute_stats_by_category, inventaires, trace_memory=trace_memory)
+
+    if size <= max_workbook_size:
+        excel_path = workdir / f"archives_{size}.xlsx"
+        write_workbook(excel_path, inventaires)
+        _, results['convert_excel_to_json'] = measure(
+            convert_excel_to_json, str(excel_path), str(workdir / f"archives_{size}.json"),
+            trace_memory=trace_memory)
+
+    inventaires_path.unlink(missing_ok=True)
+    return results
+
+
+def compare_reports(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare deux rapports et retourne la liste des regressions.
+
+    Une regression est une etape dont le temps depasse celui de la reference
+    de plus de `tolerance` (les etapes tres courtes sont ignorees).
+    """
+    regressions = []
+
+    for size, stages in report['results'].items():
+        base_stages = baseline.get('results', {}).get(size, {})
+        for stage, metrics in stages.items():
+            base = base_stages.get(stage)
+            if not base or base['wall_s'] < MIN_COMPARABLE_SECONDS:
+                continue
+            ratio = metrics['wall_s'] / base['wall_s']
+            if ratio > 1 + tolerance:
+                regressions.append({
+                    'size': size,
+                    'stage': stage,
+                    'baseline_s': base['wall_s'],
+                    'current_s': metrics['wall_s'],
+                    'ratio': round(ratio, 3)
+                })
+
+    return regressions
+
+
+def print_results(report, baseline=None):
+    """Affiche le tableau des mesures."""
+    print()
+    print(f"  {'Fonds':>9} {'Etape':28} {'Temps (s)':>10} {'Pic (Mo)':>10} {'Ref (s)':>10}")
+    print("  " + "-" * 71)
+    for size, stages in report['results'].items():
+        base_stages = (baseline or {}).get('results', {}).get(size, {})
+        for stage, metrics in stages.items():
+            base = base_stages.get(stage, {}).get('wall_s')
+            peak = metrics.get('peak_mb')
+            print(f"  {size:>9} {stage:28} {metrics['wall_s']:>10.3f} "
+                  f"{peak if peak is not None else '-':>10} "
+                  f"{base if base is not None else '-':>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de performance des scripts AD13")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="Tailles de catalogue a generer (nombre de fonds)")
+    parser.add_argument('--output', type=Path, default=None,
+                        help="Fichier JSON du rapport")
+    parser.add_argument('--baseline', type=Path, default=None,
+                        help="Rapport de reference a comparer")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Ralentissement tolere avant regression (0.2 = 20%%)")
+    parser.add_argument('--max-workbook-size', type=int, default=DEFAULT_MAX_WORKBOOK_SIZE,
+                        help="Taille maximale pour l'etape convert_excel_to_json")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="Ne pas mesurer le pic memoire (deux fois plus rapide)")
+    parser.add_argument('--scripts-dir', type=Path, default=SCRIPTS_DIR,
+                        help="Dossier des scripts a mesurer (pour comparer deux versions)")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(args.scripts_dir.resolve()))
+
+    print("=" * 60)
+    print("Banc de performance")
+    print("=" * 60)
+
+    reference = load_reference()
+    print(f"\n{len(reference)} fonds de reference charges")
+
+    report = {
+        'metadata': {
+            'date': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'scripts_dir': str(args.scripts_dir)
+        },
+        'results': {}
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            print(f"\nCatalogue de {size} fonds...")
+            report['results'][str(size)] = run_size(
+                size, reference, Path(tmp), args.max_workbook_size,
+                trace_memory=not args.no_memory)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print_results(report, baseline)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nRapport sauvegarde dans: {args.output}")
+
+    if baseline:
+        regressions = compare_reports(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) detectee(s):")
+            for reg in regressions:
+                print(f"  {reg['size']:>9} {reg['stage']:28} "
+                      f"{reg['baseline_s']:.3f}s -> {reg['current_s']:.3f}s (x{reg['ratio']})")
+            sys.exit(1)
+        print("\nAucune regression detectee.")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,14 +6,26 @@ Integre les 982 inventaires comme elements cliquables dans la visualisation.
 Auteur: Barbara Proenca
 """
 
+import argparse
 import json
 from pathlib import Path
 from collections import defaultdict
 
+from ad13_paths import PROJECT_ROOT
+from cote_index import SHARDS_DIR as COTES_DIR, cote_key, save_cote_shards
+from data_versions import content_hash, publish_version
+from instrumentation import RunMetrics, add_metrics_arguments
+from json_stream import SORT_CHUNK_SIZE, ExternalSorter, chunks, iter_records, records
+from title_clusters import MIN_INVENTAIRES, TitleClusters, TitleSample, cluster_count
+from treemap_snapshot import write_snapshot
+
 # Chemins
-PROJECT_ROOT = Path(__file__).parent.parent
 INVENTAIRES_PATH = PROJECT_ROOT / "data" / "inventaires_ad13.json"
 OUTPUT_PATH = PROJECT_ROOT / "docs" / "data" / "archives.json"
+PAGES_DIR = PROJECT_ROOT / "docs" / "data" / "inventaires"
+
+# Nombre d'inventaires par page de la liste laterale
+INVENTAIRES_PAGE_SIZE = 50
 
 # URL de base
 AD13_BASE_URL = "https://www.archives13.fr"
@@ -74,15 +86,21 @@ CATEGORY_INFO = {
 }
 
 
-def load_inventaires():
-    """Charge les inventaires scrapes."""
-    if not INVENTAIRES_PATH.exists():
-        print(f"Erreur: {INVENTAIRES_PATH} non trouve")
+# Categorie des fonds sans categorie
+DEFAULT_CATEGORY = "ARCHIVES MODERNES ET CONTEMPORAINES"
+
+
+def iter_inventaires(path=INVENTAIRES_PATH):
+    """
+    Parcourt les inventaires scrapes un par un (JSON ou NDJSON), sans
+    charger le fichier en memoire. None si le fichier n'existe pas.
+    """
+    if not Path(path).exists():
+        print(f"Erreur: {path} non trouve")
         print("Executez d'abord: python scripts/scrape_ad13_inventaires.py")
         return None
     
-    with open(INVENTAIRES_PATH, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return iter_records(path, 'fonds')
 
 
 def extract_serie(cote):
@@ -102,38 +120,186 @@ def group_inventaires_by_serie(inventaires_data):
     """Groupe les inventaires par serie."""
     by_serie = defaultdict(list)
     
-    for inv in inventaires_data['fonds']:
+    for inv in records(inventaires_data):
         serie = extract_serie(inv.get('cote', ''))
         by_serie[serie].append(inv)
     
     return dict(by_serie)
 
 
-def build_visualization_data(inventaires_data):
-    """Construit les donnees de visualisation avec les inventaires."""
+def slugify(text):
+    """Convertit un libelle en identifiant utilisable dans un chemin."""
+    import re
+    import unicodedata
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+def paginate_thematiques(viz_data, page_size=INVENTAIRES_PAGE_SIZE, write_page=None):
+    """
+    Decoupe les inventaires de chaque thematique en pages de taille fixe.
+    
+    Les inventaires sont deja tries par nombre de notices decroissant (liste
+    ou iterateur, voir build_visualization_data). La premiere page reste dans
+    la thematique, les suivantes sont chargees a la demande par la liste
+    laterale. Chaque page est nommee par l'empreinte de son contenu
+    (<thematique>/<n>.<empreinte>.json, empreintes dans la pagination) : son
+    URL change avec son contenu, elle peut etre mise en cache definitivement.
+    
+    Args:
+        write_page: Fonction (chemin relatif, contenu) appelee pour chaque
+            page ; par defaut les pages sont rassemblees dans le resultat
     
-    # Grouper par categorie et serie
-    by_category = defaultdict(lambda: defaultdict(list))
+    Returns:
+        Dictionnaire {chemin relatif: contenu} des pages (vide avec `write_page`)
+    """
+    pages = {}
+    write_page = write_page or pages.__setitem__
+    
+    for theme in viz_data['thematiques']:
+        slug = slugify(f"{theme['Fonction']}-{theme['Thématique']}")
+        first_page = []
+        empreintes = []
+        total = 0
+        
+        for num, inventaires in enumerate(chunks(theme.get('inventaires', []), page_size)):
+            page = {"page": num, "inventaires": inventaires}
+            empreintes.append(content_hash(page))
+            write_page(f"{slug}/{num}.{empreintes[-1]}.json", page)
+            if num == 0:
+                first_page = inventaires
+            total += len(inventaires)
+        
+        if not empreintes:
+            page = {"page": 0, "inventaires": []}
+            empreintes.append(content_hash(page))
+            write_page(f"{slug}/0.{empreintes[-1]}.json", page)
+        
+        theme['inventaires'] = first_page
+        theme['pagination'] = {
+            "taille": page_size,
+            "pages": len(empreintes),
+            "total": total,
+            "url": f"data/inventaires/{slug}",
+            "empreintes": empreintes
+        }
+    
+    return pages
+
+
+def clear_pages(pages_dir=PAGES_DIR):
+    """Supprime les pages d'inventaires d'une construction precedente."""
+    import shutil
+    if pages_dir.exists():
+        shutil.rmtree(pages_dir)
+
+
+def write_page(rel_path, page, pages_dir=PAGES_DIR):
+    """Ecrit une page d'inventaires."""
+    page_path = pages_dir / rel_path
+    page_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(page_path, 'w', encoding='utf-8') as f:
+        json.dump(page, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def save_pages(pages, pages_dir=PAGES_DIR):
+    """Ecrit les pages d'inventaires et supprime les pages obsoletes."""
+    clear_pages(pages_dir)
+    for rel_path, page in pages.items():
+        write_page(rel_path, page, pages_dir)
+
+
+class SortedGroups:
+    """
+    Decoupe un flux trie d'elements [categorie, serie, rang, inventaire] en
+    groupes par (categorie, serie), lus dans l'ordre du flux.
+    """
     
-    for inv in inventaires_data['fonds']:
-        cat = inv.get('categorie', 'ARCHIVES MODERNES ET CONTEMPORAINES')
+    def __init__(self, items):
+        self.items = iter(items)
+        self.head = None
+    
+    def group(self, key):
+        """Inventaires du groupe `key` ; les groupes precedents non lus sont sautes."""
+        while True:
+            if self.head is None:
+                self.head = next(self.items, None)
+            if self.head is None or tuple(self.head[:2]) > key:
+                return
+            item, self.head = self.head, None
+            if tuple(item[:2]) == key:
+                yield item[3]
+
+
+def _inventaire_order(item):
+    """Ordre du tri : categorie, serie, notices decroissantes, ordre d'origine."""
+    return (item[0], item[1], -item[3]['nb_notices'], item[2])
+
+
+def build_visualization_data(inventaires_data, lazy=False, sort_chunk_size=SORT_CHUNK_SIZE,
+                             min_sous_thematiques=MIN_INVENTAIRES):
+    """
+    Construit les donnees de visualisation avec les inventaires.
+    
+    Les inventaires sont agreges un par un : `inventaires_data` peut etre le
+    dictionnaire charge ({'fonds': [...]}) ou un iterateur (iter_inventaires).
+    Le tri des inventaires par thematique passe par un tri externe : au-dela
+    de `sort_chunk_size` inventaires, les blocs tries sont ecrits sur disque.
+    
+    Args:
+        lazy: Si vrai, les inventaires des thematiques sont des iterateurs
+            lus dans l'ordre des thematiques (par paginate_thematiques), et
+            non des listes
+        min_sous_thematiques: Les thematiques d'au moins ce nombre
+            d'inventaires sont decoupees en sous-thematiques par regroupement
+            des titres (title_clusters) ; None pour ne pas decouper. Avec
+            `lazy`, la liste "sous_thematiques" est remplie a la lecture des
+            inventaires.
+    """
+    category_order = {cat_name: i for i, cat_name in enumerate(CATEGORY_INFO)}
+    # (categorie, serie) -> echantillon des titres (apprentissage des sous-thematiques)
+    samples = defaultdict(TitleSample)
+    sorter = ExternalSorter(key=_inventaire_order, chunk_size=sort_chunk_size)
+    # (categorie, serie) -> [inventaires, notices]
+    serie_stats = defaultdict(lambda: [0, 0])
+    total_inventaires = 0
+    total_notices = 0
+    
+    for rank, inv in enumerate(records(inventaires_data)):
+        nb_notices = inv.get('nb_notices', 0)
+        total_inventaires += 1
+        total_notices += nb_notices
+        
+        cat = inv.get('categorie', DEFAULT_CATEGORY)
+        if cat not in category_order:
+            continue
         serie = extract_serie(inv.get('cote', ''))
-        by_category[cat][serie].append(inv)
+        stats = serie_stats[(category_order[cat], serie)]
+        stats[0] += 1
+        stats[1] += nb_notices
+        samples[(category_order[cat], serie)].add(inv.get('titre', ''))
+        sorter.add([category_order[cat], serie, rank, {
+            "cote": inv.get('cote', ''),
+            "cle_cote": cote_key(inv.get('cote', '')),
+            "titre": inv.get('titre', ''),
+            "dates": inv.get('dates', ''),
+            "nb_notices": nb_notices,
+            "url": inv.get('url', '')
+        }])
+    
+    groups = SortedGroups(sorter.sorted())
     
     # Construire les fonctions
     fonctions = []
     thematiques = []
     
-    for cat_name, cat_info in CATEGORY_INFO.items():
-        series_data = by_category.get(cat_name, {})
+    for order, (cat_name, cat_info) in enumerate(CATEGORY_INFO.items()):
+        series_stats = sorted((serie, stats) for (cat, serie), stats in serie_stats.items()
+                              if cat == order)
         
         # Calculer les totaux pour cette fonction
-        total_notices = sum(
-            inv.get('nb_notices', 0) 
-            for series in series_data.values() 
-            for inv in series
-        )
-        total_inventaires = sum(len(series) for series in series_data.values())
+        cat_inventaires = sum(stats[0] for _, stats in series_stats)
+        cat_notices = sum(stats[1] for _, stats in series_stats)
         
         # Creer la fonction
         fonction = {
@@ -141,94 +307,124 @@ def build_visualization_data(inventaires_data):
             "Description": cat_info["description"],
             "url": cat_info["url"],
             "url_recherche": AD13_SEARCH_URL,
-            "nb_inventaires_en_ligne": total_inventaires,
-            "nb_notices_en_ligne": total_notices,
-            "Métrage réel": total_notices / 10,  # Estimation
-            "Nombre d'entrée": total_inventaires
+            "nb_inventaires_en_ligne": cat_inventaires,
+            "nb_notices_en_ligne": cat_notices,
+            "Métrage réel": cat_notices / 10,  # Estimation
+            "Nombre d'entrée": cat_inventaires
         }
         fonctions.append(fonction)
         
         # Creer les thematiques (series) avec les inventaires
-        for serie, invs in sorted(series_data.items()):
-            if not invs:
-                continue
-            
-            serie_notices = sum(inv.get('nb_notices', 0) for inv in invs)
-            
+        for serie, (nb_invs, serie_notices) in series_stats:
             # Nom de la serie
             serie_name = f"Serie {serie}" if len(serie) <= 2 else serie
+            inventaires = groups.group((order, serie))
+            sous_thematiques = None
+            if min_sous_thematiques is not None and nb_invs >= min_sous_thematiques:
+                model = TitleClusters.fit(samples[(order, serie)].titres, cluster_count(nb_invs))
+                sous_thematiques = []
+                inventaires = model.annotate(inventaires, sous_thematiques)
             
             thematique = {
                 "Thématique": serie_name,
                 "Fonction": cat_name,
-                "Description": f"Serie {serie} - {len(invs)} inventaires en ligne",
-                "nb_inventaires": len(invs),
+                "Description": f"Serie {serie} - {nb_invs} inventaires en ligne",
+                "nb_inventaires": nb_invs,
                 "nb_notices": serie_notices,
                 "Métrage réel": serie_notices / 10,
-                "Nombre d'entrée": len(invs),
-                "inventaires": [
-                    {
-                        "cote": inv.get('cote', ''),
-                        "titre": inv.get('titre', ''),
-                        "dates": inv.get('dates', ''),
-                        "nb_notices": inv.get('nb_notices', 0),
-                        "url": inv.get('url', '')
-                    }
-                    for inv in sorted(invs, key=lambda x: x.get('nb_notices', 0), reverse=True)
-                ]
+                "Nombre d'entrée": nb_invs,
+                "inventaires": inventaires if lazy else list(inventaires)
             }
+            if sous_thematiques is not None:
+                thematique["sous_thematiques"] = sous_thematiques
             thematiques.append(thematique)
     
-    # Ajouter les fonctions sans inventaires en ligne
-    for cat_name, cat_info in CATEGORY_INFO.items():
-        if cat_name not in by_category or not by_category[cat_name]:
-            # Fonction sans inventaires scrapes
-            if not any(f['fonction'] == cat_name for f in fonctions):
-                fonctions.append({
-                    "fonction": cat_name,
-                    "Description": cat_info["description"],
-                    "url": cat_info["url"],
-                    "url_recherche": AD13_SEARCH_URL,
-                    "nb_inventaires_en_ligne": 0,
-                    "nb_notices_en_ligne": 0,
-                    "Métrage réel": 100,
-                    "Nombre d'entrée": 0
-                })
-    
     # Construire le JSON final
     result = {
         "metadata": {
             "source": "https://www.archives13.fr",
-            "total_inventaires": len(inventaires_data['fonds']),
-            "total_notices": sum(inv.get('nb_notices', 0) for inv in inventaires_data['fonds'])
+            "total_inventaires": total_inventaires,
+            "total_notices": total_notices
         },
         "fonctions": fonctions,
         "thematiques": thematiques,
-        "producteurs": []  # On peut ajouter plus tard
+        "producteurs": []  # Ajoutes depuis le classeur puis repartis par thematique (main)
     }
     
     return result
 
 
-def main():
+def main(argv=None):
+    # producteur_shards importe ce module (slugify)
+    from producteur_shards import EXCEL_PATH, SHARDS_DIR, load_producteurs, orphan_summary, save_shards
+
+    parser = argparse.ArgumentParser(description="Construction de la visualisation complete")
+    parser.add_argument('--producteurs', type=Path, default=EXCEL_PATH,
+                        help="Producteurs : classeur (feuille Producteur) ou JSON "
+                             "(defaut: data/archives.xlsx)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics = RunMetrics.from_args('build_full_visualization', args)
+    
     print("=" * 60)
     print("Construction de la visualisation complete")
     print("=" * 60)
     
-    # Charger les inventaires
-    print("\nChargement des inventaires...")
-    inventaires = load_inventaires()
-    if not inventaires:
+    # Lire les inventaires en flux
+    print("\nLecture des inventaires...")
+    inventaires = iter_inventaires()
+    if inventaires is None:
         return
     
-    print(f"  {len(inventaires['fonds'])} inventaires charges")
-    
     # Construire les donnees
     print("\nConstruction des donnees de visualisation...")
-    viz_data = build_visualization_data(inventaires)
+    with metrics.stage('build_visualization_data'):
+        viz_data = build_visualization_data(inventaires, lazy=True)
     
+    nb_inventaires = viz_data['metadata']['total_inventaires']
+    print(f"  {nb_inventaires} inventaires lus")
     print(f"  {len(viz_data['fonctions'])} fonctions")
     print(f"  {len(viz_data['thematiques'])} series/thematiques")
+    metrics.count('inventaires', nb_inventaires)
+    metrics.count('fonctions', len(viz_data['fonctions']))
+    metrics.count('thematiques', len(viz_data['thematiques']))
+    
+    # Decouper les inventaires en pages, ecrites au fur et a mesure
+    nb_pages = 0
+    
+    def save_page(rel_path, page):
+        nonlocal nb_pages
+        write_page(rel_path, page)
+        nb_pages += 1
+    
+    with metrics.stage('paginate_thematiques'):
+        clear_pages()
+        paginate_thematiques(viz_data, write_page=save_page)
+    print(f"  {nb_pages} pages de {INVENTAIRES_PAGE_SIZE} inventaires ecrites dans {PAGES_DIR}")
+    metrics.count('pages', nb_pages)
+    
+    # Producteurs : un fichier par thematique, charge a la demande
+    if args.producteurs.exists():
+        with metrics.stage('shard_producteurs'):
+            viz_data['producteurs'] = load_producteurs(args.producteurs)
+            nb_producteurs = len(viz_data['producteurs'])
+            nb_shards = save_shards(viz_data, SHARDS_DIR)
+        nb_orphelins = len(viz_data['producteurs'])
+        print(f"  {nb_producteurs - nb_orphelins}/{nb_producteurs} producteurs rattaches, "
+              f"{nb_shards} fichiers par thematique")
+        if nb_orphelins:
+            print(f"  Attention: {nb_orphelins} producteurs sans thematique de la construction "
+                  f"(gardes dans archives.json) : {orphan_summary(viz_data)}")
+        metrics.count('producteurs', nb_producteurs)
+        metrics.count('producteurs_sans_thematique', nb_orphelins)
+    
+    # Fonds par serie, tries par cote (seconde lecture des inventaires)
+    with metrics.stage('shard_cotes'):
+        cotes = save_cote_shards(iter_inventaires(), COTES_DIR)
+    viz_data['metadata']['cotes'] = cotes
+    print(f"  {sum(s['total'] for s in cotes.values())} fonds tries par cote, "
+          f"{len(cotes)} fichiers par serie dans {COTES_DIR}")
+    metrics.count('series_cotes', len(cotes))
     
     # Stats par fonction
     print("\nRepartition:")
@@ -238,12 +434,16 @@ def main():
     
     # Sauvegarder
     print(f"\nSauvegarde dans {OUTPUT_PATH}...")
-    with open(OUTPUT_PATH, 'w', encoding='utf-8') as f:
-        json.dump(viz_data, f, ensure_ascii=False, indent=2)
+    with metrics.stage('write_json'):
+        manifest = publish_version(viz_data, OUTPUT_PATH)
+    print(f"  version {manifest['version']}, {len(manifest['deltas'])} delta(s) publie(s)")
+    metrics.set('version', manifest['version'])
+    with metrics.stage('write_snapshot'):
+        write_snapshot(viz_data)
     
+    metrics.finish()
     print("\nTermine!")
 
 
 if __name__ == "__main__":
     main()
-
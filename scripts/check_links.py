@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Verification des liens publies dans la visualisation.
+
+Rassemble les URL de docs/data/archives.json, des pages d'inventaires
+(docs/data/inventaires/) et de CATEGORY_INFO, puis les verifie en
+parallele : une requete HEAD (GET si le serveur refuse HEAD), avec une
+session et un pool de connexions par hote et un debit limite par hote
+(HostLimiter, comme le moissonnage multi-sites).
+
+Les resultats sont gardes dans un cache (.cache/liens.json) : un lien
+valide n'est reverifie qu'apres `--ttl` heures, un lien casse a chaque
+execution. Les entrees dont l'URL est cassee recoivent `lien_casse: true`
+(retire quand le lien refonctionne) et un rapport JSON est ecrit.
+
+Pour tester contre un serveur local, `--rewrite` remplace un prefixe
+d'URL : --rewrite https://www.archives13.fr=http://127.0.0.1:8766
+
+Usage:
+    python scripts/check_links.py --connections 10 --rate 50
+
+Auteur: Barbara Proenca
+"""
+
+import argparse
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
+from ad13_paths import PROJECT_ROOT
+from data_versions import publish_version
+from instrumentation import METRICS_DIR, NULL_METRICS, RunMetrics, add_metrics_arguments
+
+# Chemins
+DOCS_DIR = PROJECT_ROOT / "docs"
+ARCHIVES_JSON_PATH = DOCS_DIR / "data" / "archives.json"
+PAGES_DIR = DOCS_DIR / "data" / "inventaires"
+CACHE_PATH = PROJECT_ROOT / ".cache" / "liens.json"
+REPORT_PATH = METRICS_DIR / "liens.json"
+
+DEFAULT_CONNECTIONS = 10  # Requetes simultanees par hote
+DEFAULT_RATE = 50  # Requetes par seconde et par hote
+DEFAULT_TTL_HOURS = 24  # Duree de validite d'un lien valide dans le cache
+TIMEOUT = 15  # Secondes
+
+# Cles contenant une URL a verifier
+URL_KEYS = ('url', 'url_recherche')
+
+# Statuts pour lesquels HEAD est refuse ou mal gere : nouvelle tentative en GET
+HEAD_FALLBACK_STATUSES = {403, 405, 501}
+
+
+class LinkCache:
+    """Resultats des verifications precedentes, avec duree de validite."""
+
+    def __init__(self, path=CACHE_PATH, ttl_hours=DEFAULT_TTL_HOURS):
+        self.path = Path(path)
+        self.ttl = ttl_hours * 3600
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                try:
+                    self.entries = json.load(f)
+                except ValueError:
+                    self.entries = {}
+
+    def get(self, url, now=None):
+        """Resultat encore valide pour `url`, ou None (les liens casses ne sont pas gardes)."""
+        entry = self.entries.get(url)
+        now = now or time.time()
+        if entry is None or not entry['ok'] or now - entry['checked_at'] > self.ttl:
+            return None
+        return entry
+
+    def put(self, url, result):
+        self.entries[url] = result
+
+    def save(self):
+        # Entrees expirees retirees
+        now = time.time()
+        self.entries = {url: entry for url, entry in self.entries.items()
+                        if now - entry['checked_at'] <= self.ttl}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+
+
+def iter_url_entries(node):
+    """Dictionnaires du document contenant une URL http(s), avec la cle concernee."""
+    if isinstance(node, dict):
+        for key in URL_KEYS:
+            value = node.get(key)
+            if isinstance(value, str) and value.startswith(('http://', 'https://')):
+                yield node, key
+        for value in node.values():
+            yield from iter_url_entries(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from iter_url_entries(value)
+
+
+def load_documents(archives_path=ARCHIVES_JSON_PATH, pages_dir=PAGES_DIR):
+    """archives.json et les pages d'inventaires : {chemin: document}."""
+    documents = {}
+    if Path(archives_path).exists():
+        with open(archives_path, 'r', encoding='utf-8') as f:
+            documents[Path(archives_path)] = json.load(f)
+    if Path(pages_dir).exists():
+        for path in sorted(Path(pages_dir).rglob('*.json')):
+            with open(path, 'r', encoding='utf-8') as f:
+                documents[path] = json.load(f)
+    return documents
+
+
+def collect_links(documents):
+    """
+    URL a verifier : celles des documents et celles de CATEGORY_INFO.
+
+    Returns:
+        {url: nombre d'occurrences}
+    """
+    from build_full_visualization import CATEGORY_INFO
+
+    links = Counter()
+    for document in documents.values():
+        for node, key in iter_url_entries(document):
+            links[node[key]] += 1
+    for info in CATEGORY_INFO.values():
+        links[info['url']] += 0
+    return links
+
+
+def rewrite_url(url, rewrites):
+    """Applique le premier prefixe de `rewrites` ({ancien: nouveau}) qui correspond."""
+    for old, new in (rewrites or {}).items():
+        if url.startswith(old):
+            return new + url[len(old):]
+    return url
+
+
+def check_url(session, url, timeout=TIMEOUT):
+    """
+    Verifie une URL (HEAD, puis GET si HEAD est refuse).
+
+    Returns:
+        {'ok', 'status', 'method', 'error', 'elapsed_s', 'checked_at'}
+    """
+    import requests
+
+    start = time.perf_counter()
+    result = {'ok': False, 'status': None, 'method': 'HEAD', 'error': None}
+    try:
+        response = session.head(url, timeout=timeout, allow_redirects=True, verify=False)
+        if response.status_code in HEAD_FALLBACK_STATUSES:
+            result['method'] = 'GET'
+            response = session.get(url, timeout=timeout, allow_redirects=True, verify=False,
+                                   stream=True)
+            response.close()
+        result['status'] = response.status_code
+        result['ok'] = response.status_code < 400
+    except requests.RequestException as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['elapsed_s'] = round(time.perf_counter() - start, 3)
+    result['checked_at'] = time.time()
+    return result
+
+
+def check_links(urls, cache=None, connections=DEFAULT_CONNECTIONS, rate=DEFAULT_RATE,
+                timeout=TIMEOUT, rewrites=None, metrics=None):
+    """
+    Verifie des URL en parallele, avec une session, un pool de connexions
+    et un limiteur de debit par hote. Les resultats valides du cache ne
+    sont pas reverifies.
+
+    Returns:
+        {url: resultat (voir check_url), avec 'cached' a True pour le cache}
+    """
+    from scrape_ad13_inventaires import create_session
+    from scrape_ligeo_sites import HostLimiter
+
+    metrics = metrics or NULL_METRICS
+    results = {}
+    to_check = []
+    for url in urls:
+        cached = cache.get(url) if cache is not None else None
+        if cached is not None:
+            results[url] = {**cached, 'cached': True}
+        else:
+            to_check.append(url)
+    metrics.count('cached', len(results))
+
+    sessions = {}
+    limiters = {}
+
+    def check(url):
+        target = rewrite_url(url, rewrites)
+        host = urlparse(target).netloc
+        limiter = limiters[host]
+        limiter.acquire()
+        try:
+            return check_url(sessions[host], target, timeout)
+        finally:
+            limiter.release()
+
+    for url in to_check:
+        host = urlparse(rewrite_url(url, rewrites)).netloc
+        if host not in sessions:
+            sessions[host] = create_session(connections)
+            limiters[host] = HostLimiter(1 / rate if rate else 0, connections)
+
+    workers = max(1, connections * len(sessions))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(check, url): url for url in to_check}
+        for done, future in enumerate(as_completed(futures), 1):
+            url = futures[future]
+            result = {**future.result(), 'cached': False}
+            results[url] = result
+            metrics.add_time('check', result['elapsed_s'])
+            if cache is not None:
+                cache.put(url, {k: v for k, v in result.items() if k != 'cached'})
+            if done % 100 == 0 or done == len(futures):
+                print(f"  {done}/{len(futures)} liens verifies")
+    metrics.count('checked', len(to_check))
+
+    return results
+
+
+def annotate(documents, results):
+    """
+    Marque `lien_casse: true` sur les entrees dont l'URL est cassee et
+    retire la marque des autres.
+
+    Returns:
+        Ensemble des chemins des documents modifies
+    """
+    modified = set()
+    for path, document in documents.items():
+        for node, key in iter_url_entries(document):
+            if key != 'url':
+                continue
+            result = results.get(node['url'])
+            if result is None:
+                continue
+            broken = not result['ok']
+            if broken and not node.get('lien_casse'):
+                node['lien_casse'] = True
+                modified.add(path)
+            elif not broken and 'lien_casse' in node:
+                del node['lien_casse']
+                modified.add(path)
+    return modified
+
+
+def save_documents(documents, paths, archives_path=ARCHIVES_JSON_PATH):
+    """Reecrit les documents modifies (archives.json avec son manifeste et ses deltas)."""
+    for path in paths:
+        if path == Path(archives_path):
+            publish_version(documents[path], path)
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(documents[path], f, ensure_ascii=False, separators=(',', ':'))
+
+
+def build_report(links, results, elapsed_s):
+    """Rapport : totaux, repartition des statuts et liens casses."""
+    statuses = Counter(str(r['status'] or 'erreur') for r in results.values())
+    broken = [
+        {'url': url, 'occurrences': links[url], 'status': r['status'], 'error': r['error']}
+        for url, r in sorted(results.items()) if not r['ok']
+    ]
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'elapsed_s': round(elapsed_s, 3),
+        'links': len(results),
+        'checked': sum(1 for r in results.values() if not r['cached']),
+        'cached': sum(1 for r in results.values() if r['cached']),
+        'ok': sum(1 for r in results.values() if r['ok']),
+        'broken': len(broken),
+        'statuses': dict(statuses),
+        'broken_links': broken
+    }
+
+
+def parse_rewrites(values):
+    """['ancien=nouveau', ...] -> {ancien: nouveau}"""
+    rewrites = {}
+    for value in values or []:
+        old, sep, new = value.partition('=')
+        if not sep:
+            raise argparse.ArgumentTypeError(f"--rewrite attend ANCIEN=NOUVEAU: {value}")
+        rewrites[old] = new
+    return rewrites
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verification des liens de la visualisation")
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS,
+                        help="Requetes simultanees par hote")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help="Requetes par seconde et par hote (0: sans limite)")
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL_HOURS,
+                        help="Validite du cache pour un lien valide (heures, 0: sans cache)")
+    parser.add_argument('--cache', type=Path, default=CACHE_PATH, help="Fichier du cache")
+    parser.add_argument('--report', type=Path, default=REPORT_PATH, help="Fichier du rapport JSON")
+    parser.add_argument('--no-annotate', action='store_true',
+                        help="N'ecrit pas lien_casse dans les donnees")
+    parser.add_argument('--rewrite', action='append', default=[], metavar='ANCIEN=NOUVEAU',
+                        help="Remplace un prefixe d'URL (test contre un serveur local)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics = RunMetrics.from_args('check_links', args)
+
+    with metrics.stage('collect'):
+        documents = load_documents()
+        links = collect_links(documents)
+    print(f"{len(links)} liens distincts dans {len(documents)} fichier(s)")
+
+    cache = LinkCache(args.cache, args.ttl) if args.ttl > 0 else None
+    start = time.perf_counter()
+    with metrics.stage('check_links'):
+        results = check_links(links, cache, args.connections, args.rate,
+                              rewrites=parse_rewrites(args.rewrite), metrics=metrics)
+    elapsed = time.perf_counter() - start
+    if cache is not None:
+        cache.save()
+
+    report = build_report(links, results, elapsed)
+    args.report.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    metrics.count('broken', report['broken'])
+
+    print(f"\n{report['links']} liens ({report['checked']} verifies, {report['cached']} en cache) "
+          f"en {elapsed:.1f}s : {report['ok']} valides, {report['broken']} casses")
+    for link in report['broken_links'][:20]:
+        print(f"  {link['status'] or link['error']}  {link['url']}")
+    if report['broken'] > 20:
+        print(f"  ... ({report['broken'] - 20} autres)")
+    print(f"Rapport: {args.report}")
+
+    if not args.no_annotate:
+        with metrics.stage('annotate'):
+            modified = annotate(documents, results)
+            save_documents(documents, modified)
+        print(f"{len(modified)} fichier(s) de donnees mis a jour")
+
+    metrics.finish()
+
+
+if __name__ == "__main__":
+    main()
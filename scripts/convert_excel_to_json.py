@@ -6,71 +6,104 @@ Archives departementales des Bouches-du-Rhone (AD13)
 Auteur: Barbara Proenca
 """
 
-import pandas as pd
+import argparse
 import json
 import sys
 from pathlib import Path
 
+from ad13_paths import PROJECT_ROOT
+from data_versions import publish_version
+from instrumentation import NULL_METRICS, RunMetrics, add_metrics_arguments
+from producteur_shards import save_shards
+from treemap_snapshot import write_snapshot
 
-def convert_excel_to_json(excel_path: str, output_path: str) -> None:
+
+def convert_excel_to_json(excel_path: str, output_path: str, metrics=None, publish=False) -> None:
     """
     Convertit le fichier Excel des archives en JSON pour la visualisation.
     
     Args:
         excel_path: Chemin vers le fichier Excel source
         output_path: Chemin vers le fichier JSON de sortie
+        metrics: Mesures de l'execution (RunMetrics), optionnel
+        publish: Met aussi a jour le manifeste et les deltas (data_versions)
     """
-    print(f"Lecture du fichier Excel: {excel_path}")
+    # pandas n'est importe que pour la conversion (import couteux)
+    import pandas as pd
     
-    xl = pd.ExcelFile(excel_path)
-    
-    # Charger les feuilles
-    fonctions = pd.read_excel(xl, sheet_name='Fonction')
-    thematiques = pd.read_excel(xl, sheet_name='Thématique')
-    producteurs = pd.read_excel(xl, sheet_name='Producteur')
+    metrics = metrics or NULL_METRICS
+    print(f"Lecture du fichier Excel: {excel_path}")
     
-    # Nettoyer les valeurs NaN
-    fonctions = fonctions.fillna('')
-    thematiques = thematiques.fillna('')
-    producteurs = producteurs.fillna('')
+    with metrics.stage('read_excel'):
+        xl = pd.ExcelFile(excel_path)
+        
+        # Charger les feuilles
+        fonctions = pd.read_excel(xl, sheet_name='Fonction')
+        thematiques = pd.read_excel(xl, sheet_name='Thématique')
+        producteurs = pd.read_excel(xl, sheet_name='Producteur')
     
-    # Construire la structure de donnees
-    data = {
-        "fonctions": fonctions.to_dict(orient='records'),
-        "thematiques": thematiques.to_dict(orient='records'),
-        "producteurs": producteurs.to_dict(orient='records')
-    }
+    with metrics.stage('to_records'):
+        # Nettoyer les valeurs NaN
+        fonctions = fonctions.fillna('')
+        thematiques = thematiques.fillna('')
+        producteurs = producteurs.fillna('')
+        
+        # Construire la structure de donnees
+        data = {
+            "fonctions": fonctions.to_dict(orient='records'),
+            "thematiques": thematiques.to_dict(orient='records'),
+            "producteurs": producteurs.to_dict(orient='records')
+        }
     
     # Ecrire le fichier JSON
     output_file = Path(output_path)
     output_file.parent.mkdir(parents=True, exist_ok=True)
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    # Producteurs : un fichier par thematique, a cote du JSON
+    nb_producteurs = len(data['producteurs'])
+    with metrics.stage('shard_producteurs'):
+        nb_shards = save_shards(data, output_file.parent / "producteurs")
+    
+    with metrics.stage('write_json'):
+        if publish:
+            manifest = publish_version(data, output_file)
+            metrics.set('version', manifest['version'])
+            # index.html du site dont le JSON fait partie (docs/data/archives.json -> docs/)
+            write_snapshot(data, output_file.parent.parent / "index.html")
+        else:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+    
+    for key in ('fonctions', 'thematiques'):
+        metrics.count(key, len(data[key]))
+    metrics.count('producteurs', nb_producteurs)
     
     print(f"Fichier JSON genere: {output_path}")
     print(f"  - Fonctions: {len(data['fonctions'])}")
     print(f"  - Thematiques: {len(data['thematiques'])}")
-    print(f"  - Producteurs: {len(data['producteurs'])}")
+    print(f"  - Producteurs: {nb_producteurs} ({nb_shards} fichiers par thematique, "
+          f"{len(data['producteurs'])} sans thematique)")
 
 
-def main():
-    # Chemins par defaut
-    project_root = Path(__file__).parent.parent
-    excel_path = project_root / "data" / "archives.xlsx"
-    output_path = project_root / "docs" / "data" / "archives.json"
-    
-    # Permettre de passer des chemins en arguments
-    if len(sys.argv) >= 2:
-        excel_path = Path(sys.argv[1])
-    if len(sys.argv) >= 3:
-        output_path = Path(sys.argv[2])
+def main(argv=None):
+    # Chemins par defaut, ou passes en arguments
+    parser = argparse.ArgumentParser(description="Conversion du classeur Excel en JSON")
+    parser.add_argument('excel_path', nargs='?', type=Path,
+                        default=PROJECT_ROOT / "data" / "archives.xlsx")
+    parser.add_argument('output_path', nargs='?', type=Path,
+                        default=PROJECT_ROOT / "docs" / "data" / "archives.json")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    excel_path = args.excel_path
+    output_path = args.output_path
     
     if not excel_path.exists():
         print(f"Erreur: Fichier Excel introuvable: {excel_path}")
         sys.exit(1)
     
-    convert_excel_to_json(str(excel_path), str(output_path))
+    metrics = RunMetrics.from_args('convert_excel_to_json', args)
+    convert_excel_to_json(str(excel_path), str(output_path), metrics, publish=True)
+    metrics.finish()
 
 
 if __name__ == "__main__":
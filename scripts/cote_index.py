@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Cotes des fonds : cle de tri naturel et index trie.
+
+Une cote ("14 B", "2404 W", "6 U 2", "3 ETP", "E DEP") est decomposee en
+serie, numeros et suffixe :
+
+    "2404 W"   -> ("W", (2404,), "")
+    "6 U 2"    -> ("U", (6, 2), "")
+    "E DEP"    -> ("EDEP", (), "")
+    "7 Fi"     -> ("FI", (7,), "")
+
+La cle de tri (`cote_key`) est une chaine qui se compare dans cet ordre :
+serie, puis numeros compares comme des nombres ("9 W" avant "10 W"), puis
+suffixe. Chaque numero est ecrit precede de son nombre de chiffres
+(2404 -> "42404"), ce qui suffit a comparer les nombres comme des chaines :
+
+    "2404 W" -> "W/42404"      "6 U 2" -> "U/16.12"      "E DEP" -> "EDEP/"
+
+La cle est calculee a la construction et enregistree avec chaque fonds
+(champ `cle_cote`) : la page et les scripts comparent des chaines, sans
+analyser les cotes. Une cote et ses subdivisions ("2404 W", "2404 W 3")
+partagent le meme debut de cle, d'ou les recherches par prefixe.
+
+CoteIndex trie les fonds une fois par cle, puis repond par recherche
+dichotomique : cote exacte, prefixe ("W", "2404 W") et intervalle
+("1000 W" a "2000 W", subdivisions de la borne haute comprises).
+
+La construction ecrit aussi les fonds par serie, deja tries par cote, dans
+un fichier nomme par l'empreinte de son contenu :
+
+    docs/data/cotes/<serie>.<empreinte>.json
+        {"serie": "W", "fonds": [{"cle_cote": ..., "cote": ...}]}
+
+Usage:
+    python scripts/cote_index.py get "2404 W"
+    python scripts/cote_index.py prefix W
+    python scripts/cote_index.py range "1000 W" "2000 W"
+
+Auteur: Barbara Proenca
+"""
+
+import argparse
+import json
+import re
+import shutil
+import time
+import unicodedata
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+from data_versions import content_hash
+from json_stream import SORT_CHUNK_SIZE, ExternalSorter, iter_records, records
+
+# Chemins
+INVENTAIRES_PATH = PROJECT_ROOT / "data" / "inventaires_ad13.json"
+SHARDS_DIR = PROJECT_ROOT / "docs" / "data" / "cotes"
+
+# Dossier des fonds par serie, relatif a docs/ (URL chargee par la page)
+SHARDS_URL = "data/cotes"
+
+# Separateurs de la cle : tous inferieurs aux chiffres et aux lettres
+SERIE_SEP = '/'
+NUMBER_SEP = '.'
+SUFFIX_SEP = ' '
+
+# Majorant des cles commencant par un prefixe donne
+PREFIX_END = '\uffff'
+
+# Une serie compte au plus deux mots ("E DEP") et cinq lettres ("HDEP")
+MAX_SERIE_WORDS = 2
+MAX_SERIE_LENGTH = 5
+
+# Les numeros de plus de neuf chiffres ne sont pas des numeros de cote
+TOKEN_RE = re.compile(r'\d{1,9}|[A-Z]+')
+
+# Listes ("2000 W, 2001 W") et intervalles ("1 U 2 à 5") : premiere cote
+SPLIT_RE = re.compile(r',|;|\s+à\s+', re.I)
+
+# Fonds renvoyes par defaut par une recherche
+DEFAULT_LIMIT = 20
+
+
+def normalize_cote(cote):
+    """Cote en majuscules, sans accents ni espaces superflus."""
+    cote = unicodedata.normalize('NFKD', str(cote or '')).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(cote.upper().split())
+
+
+def parse_cote(cote):
+    """
+    Decompose une cote en (serie, numeros, suffixe).
+
+    Les numeros avant la serie precedent ceux qui la suivent ("6 U 2" ->
+    (6, 2)). Une cote qui ne suit pas la forme attendue ("Prefecture.")
+    n'a pas de serie : elle est rangee en tete, par son texte (suffixe).
+    """
+    text = normalize_cote(SPLIT_RE.split(str(cote or ''), maxsplit=1)[0])
+    tokens = TOKEN_RE.findall(text)
+
+    i = 0
+    numbers = []
+    while i < len(tokens) and tokens[i].isdigit():
+        numbers.append(int(tokens[i]))
+        i += 1
+    words = []
+    while i < len(tokens) and not tokens[i].isdigit():
+        words.append(tokens[i])
+        i += 1
+    serie = ''.join(words)
+    if len(words) > MAX_SERIE_WORDS or len(serie) > MAX_SERIE_LENGTH:
+        return '', (), text
+    while i < len(tokens) and tokens[i].isdigit():
+        numbers.append(int(tokens[i]))
+        i += 1
+    return serie, tuple(numbers), ' '.join(tokens[i:])
+
+
+def encode_number(number):
+    """Numero precede de son nombre de chiffres (2404 -> "42404")."""
+    digits = str(number)
+    return f"{len(digits)}{digits}"
+
+
+def cote_key(cote):
+    """Cle de tri naturel d'une cote ("2404 W" -> "W/42404")."""
+    serie, numbers, suffix = parse_cote(cote)
+    key = serie + SERIE_SEP + NUMBER_SEP.join(encode_number(n) for n in numbers)
+    return f"{key}{SUFFIX_SEP}{suffix}" if suffix else key
+
+
+def key_serie(key):
+    """Serie d'une cle de tri ('' pour une cote sans serie)."""
+    return key.split(SERIE_SEP, 1)[0]
+
+
+def fonds_entry(fonds, key=None):
+    """Fonds tel qu'enregistre dans les donnees publiees, avec sa cle de tri."""
+    cote = fonds.get('cote', '')
+    return {
+        "cle_cote": key if key is not None else cote_key(cote),
+        "cote": cote,
+        "titre": fonds.get('titre', ''),
+        "dates": fonds.get('dates', ''),
+        "nb_notices": fonds.get('nb_notices', 0),
+        "url": fonds.get('url', '')
+    }
+
+
+class CoteIndex:
+    """
+    Fonds tries par cle de cote ; recherches par dichotomie.
+
+    Les fonds sont tries une seule fois, a la construction de l'index (a
+    cote egale, dans l'ordre d'origine). La cle deja enregistree dans un
+    fonds (`cle_cote`) est reprise telle quelle.
+    """
+
+    def __init__(self, fonds=()):
+        pairs = sorted(
+            ((item.get('cle_cote') or cote_key(item.get('cote', '')), rank, item)
+             for rank, item in enumerate(fonds)),
+            key=lambda pair: pair[:2]
+        )
+        self.keys = [key for key, _, _ in pairs]
+        self.fonds = [item for _, _, item in pairs]
+
+    @classmethod
+    def from_path(cls, path=INVENTAIRES_PATH):
+        """Index des fonds d'un fichier d'inventaires (JSON ou NDJSON)."""
+        return cls(iter_records(path, 'fonds'))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.fonds)
+
+    def bounds(self, low, high):
+        """Positions [debut, fin) des cles comprises entre `low` et `high`."""
+        return bisect_left(self.keys, low), bisect_right(self.keys, high)
+
+    def get(self, cote):
+        """Fonds de cote `cote` (a l'ecriture pres : "2404w" vaut "2404 W")."""
+        key = cote_key(cote)
+        start, end = self.bounds(key, key)
+        return self.fonds[start:end]
+
+    def prefix(self, cote):
+        """
+        Fonds de la cote `cote` et de ses subdivisions : "2404 W" donne
+        "2404 W", "2404 W 1"... ; une serie seule ("W") donne toute la serie.
+        """
+        key = cote_key(cote)
+        start, end = self.bounds(key, key + PREFIX_END)
+        return self.fonds[start:end]
+
+    def range(self, start, end):
+        """
+        Fonds de cote comprise entre `start` et `end` ("1000 W" a "2000 W"),
+        bornes et subdivisions de `end` comprises.
+        """
+        low, high = self.bounds(cote_key(start), cote_key(end) + PREFIX_END)
+        return self.fonds[low:high]
+
+    def position(self, cote):
+        """Rang de la premiere cote superieure ou egale a `cote` (saut dans une liste)."""
+        return bisect_left(self.keys, cote_key(cote))
+
+
+def iter_cote_shards(fonds, sort_chunk_size=SORT_CHUNK_SIZE):
+    """
+    Fonds regroupes par serie et tries par cote : (serie, [fonds]) dans
+    l'ordre des cles. Le tri passe par un tri externe, comme la
+    construction des thematiques.
+    """
+    sorter = ExternalSorter(key=lambda item: item[0], chunk_size=sort_chunk_size)
+    for item in records(fonds):
+        entry = fonds_entry(item, item.get('cle_cote'))
+        sorter.add([entry['cle_cote'], entry])
+
+    serie, group = None, []
+    for key, entry in sorter.sorted():
+        current = key_serie(key)
+        if current != serie and group:
+            yield serie, group
+            group = []
+        serie = current
+        group.append(entry)
+    if group:
+        yield serie, group
+
+
+def shard_name(serie, empreinte):
+    """Nom du fichier d'une serie (les cotes sans serie vont dans autre.<empreinte>.json)."""
+    return f"{serie.lower() or 'autre'}.{empreinte}.json"
+
+
+def save_cote_shards(fonds, shards_dir=SHARDS_DIR):
+    """
+    Ecrit un fichier par serie, fonds tries par cote (ceux d'une
+    construction precedente sont supprimes).
+
+    Returns:
+        Dictionnaire {serie: {"total": ..., "url": ..., "empreinte": ...}}
+        des fichiers ecrits,
+        a enregistrer dans les metadonnees de archives.json
+    """
+    shards_dir = Path(shards_dir)
+    if shards_dir.exists():
+        shutil.rmtree(shards_dir)
+    shards_dir.mkdir(parents=True, exist_ok=True)
+
+    series = {}
+    for serie, group in iter_cote_shards(fonds):
+        shard = {"serie": serie, "fonds": group}
+        empreinte = content_hash(shard)
+        name = shard_name(serie, empreinte)
+        with open(shards_dir / name, 'w', encoding='utf-8') as f:
+            json.dump(shard, f, ensure_ascii=False, separators=(',', ':'))
+        series[serie] = {"total": len(group), "url": f"{SHARDS_URL}/{name}", "empreinte": empreinte}
+    return series
+
+
+def print_fonds(fonds, limit):
+    """Affichage texte des fonds trouves."""
+    print(f"{len(fonds)} fonds")
+    for item in fonds[:limit]:
+        print(f"  {item.get('cote', ''):14} {item.get('nb_notices', 0):6} notices  "
+              f"{item.get('dates', ''):14} {item.get('titre', '')[:50]}")
+    if len(fonds) > limit:
+        print(f"  ... (+{len(fonds) - limit})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recherche des fonds par cote")
+    parser.add_argument('--inventaires', type=Path, default=INVENTAIRES_PATH,
+                        help="Fichier d'inventaires (JSON ou NDJSON)")
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT,
+                        help=f"Fonds affiches (defaut: {DEFAULT_LIMIT})")
+    parser.add_argument('--json', action='store_true', help="Sortie JSON")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    get_parser = commands.add_parser('get', help="Cote exacte")
+    get_parser.add_argument('cote')
+    prefix_parser = commands.add_parser('prefix', help="Cote et ses subdivisions, ou serie entiere")
+    prefix_parser.add_argument('cote')
+    range_parser = commands.add_parser('range', help="Intervalle de cotes (bornes comprises)")
+    range_parser.add_argument('start')
+    range_parser.add_argument('end')
+    key_parser = commands.add_parser('key', help="Cle de tri d'une cote")
+    key_parser.add_argument('cote')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'key':
+        serie, numbers, suffix = parse_cote(args.cote)
+        print(f"{cote_key(args.cote)}  (serie {serie or '-'}, numeros {list(numbers)}, "
+              f"suffixe {suffix or '-'})")
+        return
+
+    if not args.inventaires.exists():
+        print(f"Erreur: {args.inventaires} non trouve")
+        return
+
+    start = time.perf_counter()
+    index = CoteIndex.from_path(args.inventaires)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if args.command == 'get':
+        fonds = index.get(args.cote)
+    elif args.command == 'prefix':
+        fonds = index.prefix(args.cote)
+    else:
+        fonds = index.range(args.start, args.end)
+    lookup_time = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps({'total': len(fonds), 'fonds': fonds[:args.limit]}, ensure_ascii=False, indent=2))
+        return
+    print(f"Index de {len(index)} fonds construit en {build_time:.2f}s, "
+          f"recherche en {lookup_time * 1000:.2f} ms\n")
+    print_fonds(fonds, args.limit)
+
+
+if __name__ == "__main__":
+    main()
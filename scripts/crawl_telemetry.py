@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Telemetrie des requetes du moissonnage.
+
+Pour chaque requete : resolution DNS, connexion (TCP + TLS), temps jusqu'au
+premier octet, temps total, taille, statut HTTP, nombre de tentatives et
+temps d'analyse du HTML. Les mesures sont agregees en histogrammes
+(p50/p95/p99) et en debits (pages/s, lignes/s), exportees en JSON et
+resumees sur une ligne apres chaque page.
+
+Auteur: Barbara Proenca
+"""
+
+import json
+import math
+import socket
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.util.connection import allowed_gai_family
+
+# Bornes (secondes) des classes des histogrammes de latence
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+LATENCY_FIELDS = ['dns_s', 'connect_s', 'ttfb_s', 'total_s', 'parse_s']
+
+# Mesures de connexion de la requete en cours, par thread
+_connection_timings = threading.local()
+
+
+def reset_connection_timings():
+    """Remet a zero les mesures de connexion avant une requete."""
+    _connection_timings.current = {'dns_s': 0.0, 'connect_s': 0.0}
+
+
+def get_connection_timings():
+    """Mesures de connexion de la derniere requete du thread (0 si connexion reutilisee)."""
+    return dict(getattr(_connection_timings, 'current', {'dns_s': 0.0, 'connect_s': 0.0}))
+
+
+class _TimedConnectionMixin:
+    """
+    Chronometre la resolution DNS et l'etablissement de la connexion.
+
+    Repose sur HTTPConnection._new_conn et _dns_host d'urllib3 2.x (version
+    fixee dans requirements.txt).
+    """
+
+    def _new_conn(self):
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, self.port, allowed_gai_family(), socket.SOCK_STREAM)
+        except socket.gaierror:
+            infos = []
+        timings = getattr(_connection_timings, 'current', None)
+        if timings is not None:
+            timings['dns_s'] = time.perf_counter() - start
+
+        if not infos:
+            # Erreur de resolution signalee par urllib3 (NameResolutionError)
+            return super()._new_conn()
+
+        # Adresses resolues essayees dans l'ordre, comme create_connection
+        # d'urllib3 (une adresse IPv6 injoignable n'empeche pas l'IPv4), sans
+        # resoudre le nom une seconde fois
+        error = None
+        try:
+            for *_, sockaddr in infos:
+                self._dns_host = sockaddr[0]
+                try:
+                    return super()._new_conn()
+                except ConnectTimeoutError as e:
+                    error = e
+            raise error
+        finally:
+            self._dns_host = host
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        timings = getattr(_connection_timings, 'current', None)
+        if timings is not None:
+            # Inclut le DNS, la connexion TCP et la negociation TLS
+            timings['connect_s'] = time.perf_counter() - start - timings.get('dns_s', 0.0)
+
+
+class TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """Adaptateur requests dont les connexions sont chronometrees."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+
+def create_timed_session(pool_maxsize=10):
+    """
+    Cree une session requests (connexions persistantes) chronometree, avec
+    au plus `pool_maxsize` connexions ouvertes par hote.
+    """
+    session = requests.Session()
+    adapter = TimedHTTPAdapter(pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def percentile(sorted_values, pct):
+    """Percentile par rang le plus proche d'une liste triee."""
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def histogram(values):
+    """Resume une serie de latences : percentiles et effectifs par classe."""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return {'count': 0}
+
+    buckets = {f"<={bound}": 0 for bound in LATENCY_BUCKETS}
+    buckets[f">{LATENCY_BUCKETS[-1]}"] = 0
+    for value in values:
+        for bound in LATENCY_BUCKETS:
+            if value <= bound:
+                buckets[f"<={bound}"] += 1
+                break
+        else:
+            buckets[f">{LATENCY_BUCKETS[-1]}"] += 1
+
+    return {
+        'count': len(values),
+        'min': round(values[0], 6),
+        'mean': round(sum(values) / len(values), 6),
+        'p50': round(percentile(values, 50), 6),
+        'p95': round(percentile(values, 95), 6),
+        'p99': round(percentile(values, 99), 6),
+        'max': round(values[-1], 6),
+        'buckets': buckets
+    }
+
+
+class CrawlTelemetry:
+    """Journal des requetes d'un moissonnage et agregats associes."""
+
+    def __init__(self):
+        self.requests = []
+        self.start = time.perf_counter()
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+    def record_request(self, key, url, status, nb_bytes, retries, total_s, ttfb_s=None,
+                       dns_s=0.0, connect_s=0.0, error=None):
+        """Enregistre une requete (apres ses eventuelles nouvelles tentatives)."""
+        record = {
+            'key': key,
+            'url': url,
+            'status': status,
+            'bytes': nb_bytes,
+            'retries': retries,
+            'dns_s': round(dns_s, 6),
+            'connect_s': round(connect_s, 6),
+            'ttfb_s': round(ttfb_s, 6) if ttfb_s is not None else None,
+            'total_s': round(total_s, 6),
+            'parse_s': None,
+            'rows': 0,
+            'error': error
+        }
+        with self._lock:
+            self.requests.append(record)
+            self._by_key[key] = record
+        return record
+
+    def record_parse(self, key, parse_s, rows):
+        """Associe le temps d'analyse et le nombre de lignes extraites a une requete."""
+        with self._lock:
+            record = self._by_key.get(key)
+            if record is not None:
+                record['parse_s'] = round(parse_s, 6)
+                record['rows'] = rows
+
+    def summary(self, key_prefix=None):
+        """
+        Agregats : histogrammes de latence, debits et repartition des statuts.
+        Avec `key_prefix`, seules les requetes dont la cle commence par ce
+        prefixe sont prises en compte (par exemple un site).
+        """
+        with self._lock:
+            records = list(self.requests)
+        if key_prefix is not None:
+            records = [r for r in records if str(r['key']).startswith(key_prefix)]
+
+        elapsed = time.perf_counter() - self.start
+        ok = [r for r in records if r['error'] is None]
+        statuses = {}
+        for record in records:
+            statuses[str(record['status'])] = statuses.get(str(record['status']), 0) + 1
+
+        total_bytes = sum(r['bytes'] for r in records)
+        total_rows = sum(r['rows'] for r in records)
+
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'requests': len(records),
+            'errors': len(records) - len(ok),
+            'retries': sum(r['retries'] for r in records),
+            'statuses': statuses,
+            'bytes': total_bytes,
+            'rows': total_rows,
+            'pages_per_s': round(len(ok) / elapsed, 3) if elapsed else None,
+            'rows_per_s': round(total_rows / elapsed, 3) if elapsed else None,
+            'bytes_per_s': round(total_bytes / elapsed, 1) if elapsed else None,
+            'latency': {field: histogram(r[field] for r in ok) for field in LATENCY_FIELDS}
+        }
+
+    def summary_line(self, key_prefix=None):
+        """Resume d'une ligne pour le suivi en direct."""
+        summary = self.summary(key_prefix)
+        total = summary['latency']['total_s']
+        latency = (f"total p50 {total['p50']:.2f}s p95 {total['p95']:.2f}s"
+                   if total['count'] else "total -")
+        return (f"  [{summary['requests']} req, {summary['errors']} err, {summary['retries']} retry] "
+                f"{summary['pages_per_s'] or 0:.2f} pages/s, {summary['rows_per_s'] or 0:.1f} lignes/s, "
+                f"{latency}, {summary['bytes'] / (1024 * 1024):.1f} Mo")
+
+    def save(self, path):
+        """Exporte le resume et le detail des requetes en JSON."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': self.summary(), 'requests': self.requests}, f,
+                      ensure_ascii=False, indent=2)
+        return path
@@ -7,13 +7,19 @@ Auteur: Barbara Proenca
 Note: Les metrages sont estimatifs et doivent etre ajustes avec les donnees reelles.
 """
 
-import pandas as pd
+import argparse
+import random
 from pathlib import Path
 
+from ad13_paths import PROJECT_ROOT
+
 # Base URL du site AD13
 AD13_BASE_URL = "https://www.archives13.fr"
 AD13_SEARCH_URL = "https://www.archives13.fr/archive/recherche/fonds/n:93"
 
+# Mode --scale : nombre moyen de producteurs par thematique generee
+PRODUCTEURS_PAR_THEMATIQUE = 20
+
 # Statistiques globales des instruments de recherche en ligne (mise a jour: 2024)
 STATS_IR = {
     "total_inventaires": 980,
@@ -659,10 +665,161 @@ producteurs_data = [
 ]
 
 
-def main():
+def write_workbook(output_path, sheets):
+    """
+    Ecrit un classeur Excel en flux, a memoire constante.
+    
+    Utilise le mode ecriture seule d'openpyxl : chaque ligne est serialisee
+    des qu'elle est ajoutee, les lignes peuvent donc provenir d'un generateur.
+    
+    Args:
+        output_path: Chemin du fichier .xlsx
+        sheets: Liste de tuples (nom de feuille, colonnes, lignes) ou les
+            lignes sont des dictionnaires (les cles absentes restent vides)
+    
+    Returns:
+        Dictionnaire {nom de feuille: nombre de lignes ecrites}
+    """
+    from openpyxl import Workbook
+    
+    wb = Workbook(write_only=True)
+    counts = {}
+    
+    for sheet_name, columns, rows in sheets:
+        ws = wb.create_sheet(sheet_name)
+        ws.append(columns)
+        count = 0
+        for row in rows:
+            ws.append([row.get(col) for col in columns])
+            count += 1
+        counts[sheet_name] = count
+    
+    wb.save(output_path)
+    return counts
+
+
+def generate_scaled_thematiques(nb_thematiques, rng):
+    """
+    Genere des thematiques rattachees aux fonctions de fonctions_data.
+    
+    Les fonctions sont tirees au prorata de leur metrage reel, les dates
+    restent dans les dates extremes de la fonction et les libelles reprennent
+    ceux des thematiques existantes de la fonction.
+    """
+    weights = [func['Métrage réel'] for func in fonctions_data]
+    templates = {}
+    for theme in thematiques_data:
+        templates.setdefault(theme['Fonction'], []).append(theme)
+    
+    thematiques = []
+    for i in range(nb_thematiques):
+        func = rng.choices(fonctions_data, weights=weights)[0]
+        func_templates = templates.get(func['fonction'])
+        if func_templates:
+            template = rng.choice(func_templates)
+            label = template['thematique']
+            description = template['Description']
+        else:
+            label = f"Fonds {func['fonction'].lower()}"
+            description = func['Description']
+        
+        date_min = rng.randint(func['date_extreme_min'], func['date_extreme_max'])
+        date_max = rng.randint(date_min, func['date_extreme_max'])
+        thematiques.append({
+            "thematique": f"{label} ({i + 1})",
+            "Description": description,
+            "date_extreme_min": date_min,
+            "date_extreme_max": date_max,
+            "date_extreme_thematique": f"{date_min}/{date_max}",
+            "Métrage réel": round(rng.uniform(1, 500), 1),
+            "Nombre d'entrée": 0,
+            "Fonction": func['fonction']
+        })
+    
+    return thematiques
+
+
+def generate_scaled_producteurs(nb_producteurs, thematiques, rng):
+    """
+    Genere les producteurs un par un (generateur, memoire constante).
+    
+    Le producteur i est rattache a la thematique i modulo le nombre de
+    thematiques, et ses dates restent dans celles de sa thematique.
+    """
+    for i in range(nb_producteurs):
+        theme = thematiques[i % len(thematiques)]
+        template = producteurs_data[i % len(producteurs_data)]
+        date_min = rng.randint(theme['date_extreme_min'], theme['date_extreme_max'])
+        date_max = rng.randint(date_min, theme['date_extreme_max'])
+        yield {
+            "producteur": f"{template['producteur']} {i + 1}",
+            "Description": template['Description'],
+            "date_extreme_min": date_min,
+            "date_extreme_max": date_max,
+            "date_extreme_producteur": f"{date_min}/{date_max}",
+            "Métrage réel": round(rng.uniform(0.1, 50), 1),
+            "Nombre d'entrée": rng.randint(1, 10),
+            "Thematique": theme['thematique']
+        }
+
+
+def create_scaled_workbook(output_path, nb_producteurs, seed=13):
+    """
+    Cree un classeur de test de charge avec `nb_producteurs` producteurs.
+    
+    Les fonctions sont celles de fonctions_data ; les thematiques (une pour
+    PRODUCTEURS_PAR_THEMATIQUE producteurs) et les producteurs sont generes.
+    """
+    rng = random.Random(seed)
+    nb_thematiques = max(1, nb_producteurs // PRODUCTEURS_PAR_THEMATIQUE)
+    thematiques = generate_scaled_thematiques(nb_thematiques, rng)
+    
+    # Repartition des producteurs (i modulo nb_thematiques)
+    for index, theme in enumerate(thematiques):
+        nb = nb_producteurs // nb_thematiques + (1 if index < nb_producteurs % nb_thematiques else 0)
+        theme["Nombre d'entrée"] = nb
+        theme["Nombre de producteurs"] = nb
+    
+    fonctions = [dict(func, url_recherche=func.get('url_recherche', AD13_SEARCH_URL))
+                 for func in fonctions_data]
+    
+    return write_workbook(output_path, [
+        ('Fonction', list(dict.fromkeys(k for func in fonctions for k in func)), fonctions),
+        ('Thématique',
+         ["Thématique", "Description", "date_extreme_min", "date_extreme_max",
+          "date_extreme_thematique", "Métrage réel", "Nombre d'entrée",
+          "Nombre de producteurs", "Fonction"],
+         (dict(theme, **{"Thématique": theme["thematique"]}) for theme in thematiques)),
+        ('Producteur',
+         ["producteur", "Description", "date_extreme_min", "date_extreme_max",
+          "date_extreme_producteur", "Métrage réel", "Nombre d'entrée", "Thematique"],
+         generate_scaled_producteurs(nb_producteurs, thematiques, rng)),
+    ])
+
+
+def main(argv=None):
     """Cree le fichier Excel avec les donnees des AD13."""
-    project_root = Path(__file__).parent.parent
-    output_path = project_root / "data" / "archives.xlsx"
+    parser = argparse.ArgumentParser(description="Creation du classeur des AD13")
+    parser.add_argument('--scale', type=int, default=None,
+                        help="Genere un classeur de test avec N producteurs")
+    parser.add_argument('--output', type=Path, default=None,
+                        help="Chemin du fichier Excel")
+    parser.add_argument('--seed', type=int, default=13,
+                        help="Graine du generateur aleatoire (mode --scale)")
+    args = parser.parse_args(argv)
+    
+    if args.scale is not None:
+        output_path = args.output or PROJECT_ROOT / "data" / f"archives_scale_{args.scale}.xlsx"
+        counts = create_scaled_workbook(output_path, args.scale, seed=args.seed)
+        print(f"Fichier Excel de test cree: {output_path}")
+        for sheet_name, count in counts.items():
+            print(f"  - {sheet_name}: {count}")
+        return
+    
+    output_path = args.output or PROJECT_ROOT / "data" / "archives.xlsx"
+    
+    # pandas n'est necessaire que pour le classeur de reference
+    import pandas as pd
     
     # Ajouter l'URL de recherche a toutes les fonctions qui n'en ont pas
     for func in fonctions_data:
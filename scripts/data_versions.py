@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Versions publiees du JSON de la visualisation.
+
+A chaque publication de docs/data/archives.json, le fichier deja present
+(la version precedente) est compare au nouveau : la difference est ecrite
+sous forme de JSON Patch (RFC 6902) dans docs/data/deltas/, et
+docs/data/manifest.json indique la version courante et les deltas
+disponibles. Un visiteur dont le cache est a une version recente telecharge
+uniquement les deltas manquants (voir DataLoader.js).
+
+Auteur: Barbara Proenca
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+
+# Nombre de deltas conserves dans le manifeste
+MAX_DELTAS = 10
+
+MANIFEST_NAME = "manifest.json"
+DELTAS_DIRNAME = "deltas"
+
+
+def content_hash(data):
+    """Empreinte (sha256 tronque) de la forme canonique du JSON."""
+    canonical = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def _pointer(path, token):
+    """Ajoute un element a un JSON Pointer (RFC 6901)."""
+    return f"{path}/{str(token).replace('~', '~0').replace('/', '~1')}"
+
+
+def json_diff(old, new, path=''):
+    """
+    Calcule un JSON Patch (operations add / remove / replace) qui transforme
+    `old` en `new`.
+
+    Les listes sont comparees apres retrait du prefixe et du suffixe communs :
+    l'ajout ou la suppression d'un inventaire au milieu d'une liste ne produit
+    qu'une operation, et non le remplacement de tous les elements suivants.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({'op': 'remove', 'path': _pointer(path, key)})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({'op': 'add', 'path': _pointer(path, key), 'value': value})
+            else:
+                ops.extend(json_diff(old[key], value, _pointer(path, key)))
+        return ops
+
+    if isinstance(old, list) and isinstance(new, list):
+        start = 0
+        while start < len(old) and start < len(new) and old[start] == new[start]:
+            start += 1
+        end_old, end_new = len(old), len(new)
+        while end_old > start and end_new > start and old[end_old - 1] == new[end_new - 1]:
+            end_old -= 1
+            end_new -= 1
+
+        ops = []
+        common = min(end_old, end_new) - start
+        for i in range(start, start + common):
+            ops.extend(json_diff(old[i], new[i], _pointer(path, i)))
+        # Suppressions depuis la fin pour garder les indices valides
+        for i in range(end_old - 1, start + common - 1, -1):
+            ops.append({'op': 'remove', 'path': _pointer(path, i)})
+        for i in range(start + common, end_new):
+            ops.append({'op': 'add', 'path': _pointer(path, i), 'value': new[i]})
+        return ops
+
+    if old == new and type(old) is type(new):
+        return []
+    return [{'op': 'replace', 'path': path, 'value': new}]
+
+
+def apply_patch(doc, ops):
+    """Applique un JSON Patch genere par json_diff (verification a la publication)."""
+    doc = json.loads(json.dumps(doc))
+
+    for op in ops:
+        if op['path'] == '':
+            doc = op['value']
+            continue
+
+        tokens = [t.replace('~1', '/').replace('~0', '~') for t in op['path'].split('/')[1:]]
+        parent = doc
+        for token in tokens[:-1]:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        last = tokens[-1]
+
+        if isinstance(parent, list):
+            index = len(parent) if last == '-' else int(last)
+            if op['op'] == 'add':
+                parent.insert(index, op['value'])
+            elif op['op'] == 'remove':
+                del parent[index]
+            else:
+                parent[index] = op['value']
+        else:
+            if op['op'] == 'remove':
+                del parent[last]
+            else:
+                parent[last] = op['value']
+
+    return doc
+
+
+def load_manifest(data_dir):
+    """Charge le manifeste d'un dossier de donnees (None s'il n'existe pas)."""
+    manifest_path = Path(data_dir) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def publish_version(data, output_path, max_deltas=MAX_DELTAS):
+    """
+    Ecrit `data` dans `output_path` et met a jour le manifeste et les deltas
+    du meme dossier. Le fichier deja present sert de version precedente.
+
+    Returns:
+        Le manifeste ecrit
+    """
+    output_path = Path(output_path)
+    data_dir = output_path.parent
+    deltas_dir = data_dir / DELTAS_DIRNAME
+
+    previous = None
+    if output_path.exists():
+        with open(output_path, 'r', encoding='utf-8') as f:
+            try:
+                previous = json.load(f)
+            except ValueError:
+                previous = None
+
+    manifest = load_manifest(data_dir) or {'deltas': []}
+    deltas = manifest.get('deltas', [])
+    version = content_hash(data)
+
+    if previous is not None:
+        previous_version = content_hash(previous)
+        if previous_version != version:
+            ops = json_diff(previous, data)
+            if apply_patch(previous, ops) != data:
+                raise ValueError("Le delta calcule ne reproduit pas la nouvelle version")
+
+            delta_name = f"{previous_version}-{version}.json"
+            deltas_dir.mkdir(parents=True, exist_ok=True)
+            with open(deltas_dir / delta_name, 'w', encoding='utf-8') as f:
+                json.dump(ops, f, ensure_ascii=False, separators=(',', ':'))
+
+            deltas = [d for d in deltas if d['to'] != version] + [{
+                'from': previous_version,
+                'to': version,
+                'url': f"data/{DELTAS_DIRNAME}/{delta_name}",
+                'ops': len(ops),
+                'size': (deltas_dir / delta_name).stat().st_size
+            }]
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+    # Seuls les derniers deltas sont conserves
+    deltas = deltas[-max_deltas:]
+    if deltas_dir.exists():
+        kept = {Path(d['url']).name for d in deltas}
+        for path in deltas_dir.glob('*.json'):
+            if path.name not in kept:
+                path.unlink()
+
+    manifest = {
+        'version': version,
+        'url': f"data/{output_path.name}",
+        'size': output_path.stat().st_size,
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'deltas': deltas
+    }
+    with open(data_dir / MANIFEST_NAME, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    return manifest
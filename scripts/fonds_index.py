@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Index des fonds en memoire : requetes par facettes sans parcourir les fonds.
+
+FondsIndex parcourt les fonds une seule fois et construit, pour chaque
+valeur de facette, l'ensemble des fonds concernes sous forme de bitmap
+(entier Python dont le bit i correspond au i-eme fonds) :
+
+    categorie   categorie du fonds (ARCHIVES ANCIENNES...)
+    serie       serie de la cote (extract_serie : "14 B" -> "B")
+    siecle      siecles couverts par les dates ("1634 - 1763" -> 17, 18)
+    notices     tranche du nombre de notices (0, 1-9, 10-99, 100-999, 1000+)
+
+et une liste triee d'identifiants par mot des titres (recherche texte).
+
+Une requete est l'intersection (ET) des facettes demandees, chaque facette
+acceptant plusieurs valeurs (OU). Les comptes par facette excluent le filtre
+de la facette elle-meme : ils indiquent ce que donnerait le choix d'une
+autre valeur. Sur un million de fonds, une requete et ses comptes prennent
+quelques millisecondes.
+
+Usage:
+    python scripts/fonds_index.py query --categorie "ARCHIVES ANCIENNES" --siecle 17 --texte port
+    python scripts/fonds_index.py serve --port 8001
+
+Auteur: Barbara Proenca
+"""
+
+import argparse
+import json
+import re
+import time
+import unicodedata
+from array import array
+from collections import defaultdict
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from ad13_paths import PROJECT_ROOT
+from build_full_visualization import DEFAULT_CATEGORY, extract_serie
+from json_stream import iter_records, records
+
+# Chemins
+INVENTAIRES_PATH = PROJECT_ROOT / "data" / "inventaires_ad13.json"
+
+FACETS = ('categorie', 'serie', 'siecle', 'notices')
+
+# Tranches du nombre de notices : (minimum, libelle)
+NOTICE_BUCKETS = [(1000, '1000+'), (100, '100-999'), (10, '10-99'), (1, '1-9'), (0, '0')]
+
+# Valeur des fonds sans date exploitable
+UNKNOWN = 'inconnu'
+
+YEAR_RE = re.compile(r'(?<!\d)(\d{3,4})(?!\d)')
+WORD_RE = re.compile(r'[a-z0-9]+')
+MAX_YEAR = 2100
+MIN_WORD_LENGTH = 2
+
+# Bitmaps de mots gardes en memoire entre deux requetes
+WORD_CACHE_SIZE = 256
+
+# Fonds renvoyes par defaut par une recherche
+DEFAULT_LIMIT = 20
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def popcount(bitmap):
+        return bin(bitmap).count('1')
+
+
+def notice_bucket(nb_notices):
+    """Tranche du nombre de notices."""
+    for minimum, label in NOTICE_BUCKETS:
+        if nb_notices >= minimum:
+            return label
+    return NOTICE_BUCKETS[-1][1]
+
+
+def centuries(dates):
+    """Siecles couverts par un intervalle de dates ("1634 - 1763" -> ['17', '18'])."""
+    years = [int(y) for y in YEAR_RE.findall(dates or '') if int(y) <= MAX_YEAR]
+    if not years:
+        return [UNKNOWN]
+    first, last = (min(years) - 1) // 100 + 1, (max(years) - 1) // 100 + 1
+    return [str(century) for century in range(first, last + 1)]
+
+
+def normalize_text(text):
+    """Minuscules sans accents."""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    return text.lower()
+
+
+def tokenize(text):
+    """Mots distincts d'un texte, normalises."""
+    return {word for word in WORD_RE.findall(normalize_text(text)) if len(word) >= MIN_WORD_LENGTH}
+
+
+def facet_values(fonds):
+    """Valeurs de chaque facette pour un fonds (une facette peut en avoir plusieurs)."""
+    return {
+        'categorie': [fonds.get('categorie') or DEFAULT_CATEGORY],
+        'serie': [extract_serie(fonds.get('cote', ''))],
+        'siecle': centuries(fonds.get('dates', '')),
+        'notices': [notice_bucket(fonds.get('nb_notices', 0))],
+    }
+
+
+def ids_to_bitmap(ids, size):
+    """Bitmap d'une liste d'identifiants."""
+    data = bytearray((size + 7) // 8)
+    for i in ids:
+        data[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(data, 'little')
+
+
+def bitmap_ids(bitmap, offset=0, limit=None):
+    """Identifiants des bits a 1, dans l'ordre croissant."""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+    skipped = found = 0
+    for byte_index, byte in enumerate(data):
+        if not byte:
+            continue
+        for bit in range(8):
+            if byte >> bit & 1:
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                if limit is not None and found >= limit:
+                    return
+                found += 1
+                yield byte_index * 8 + bit
+
+
+class FondsIndex:
+    """
+    Index des fonds par facettes et par mots des titres.
+
+    Usage:
+        index = FondsIndex(iter_records(path, 'fonds'))
+        bitmap = index.query({'categorie': ['ARCHIVES ANCIENNES'], 'siecle': ['17']}, texte='port')
+        index.count(bitmap), index.facet_counts({'siecle': ['17']})
+    """
+
+    def __init__(self, fonds=(), keep_fonds=True):
+        self.size = 0
+        self.keep_fonds = keep_fonds
+        self.fonds = []
+        self._postings = {facet: defaultdict(lambda: array('I')) for facet in FACETS}
+        self._words = defaultdict(lambda: array('I'))
+        self._bitmaps = None
+        self._word_bitmaps = {}
+        for item in records(fonds):
+            self.add(item)
+
+    @classmethod
+    def from_path(cls, path=INVENTAIRES_PATH, keep_fonds=True):
+        """Index d'un fichier d'inventaires (JSON ou NDJSON), lu en flux."""
+        return cls(iter_records(path, 'fonds'), keep_fonds=keep_fonds)
+
+    def add(self, fonds):
+        """Ajoute un fonds ; retourne son identifiant."""
+        fonds_id = self.size
+        self.size += 1
+        if self.keep_fonds:
+            self.fonds.append(fonds)
+        for facet, values in facet_values(fonds).items():
+            for value in values:
+                self._postings[facet][value].append(fonds_id)
+        for word in tokenize(fonds.get('titre', '')):
+            self._words[word].append(fonds_id)
+        self._bitmaps = None
+        self._word_bitmaps = {}
+        return fonds_id
+
+    @property
+    def bitmaps(self):
+        """{facette: {valeur: bitmap}}, calcule au premier usage apres un ajout."""
+        if self._bitmaps is None:
+            self._bitmaps = {
+                facet: {value: ids_to_bitmap(ids, self.size) for value, ids in postings.items()}
+                for facet, postings in self._postings.items()
+            }
+        return self._bitmaps
+
+    @property
+    def all(self):
+        """Bitmap de tous les fonds."""
+        return (1 << self.size) - 1
+
+    def values(self, facet):
+        """Valeurs connues d'une facette."""
+        return sorted(self._postings[facet])
+
+    def facet_bitmap(self, facet, values):
+        """Fonds ayant l'une des valeurs de la facette (OU)."""
+        if facet not in self._postings:
+            raise ValueError(f"Facette inconnue: {facet} (facettes: {', '.join(FACETS)})")
+        if isinstance(values, str):
+            values = [values]
+        bitmaps = self.bitmaps[facet]
+        result = 0
+        for value in values:
+            result |= bitmaps.get(str(value), 0)
+        return result
+
+    def text_bitmap(self, texte):
+        """Fonds dont le titre contient tous les mots de `texte` (ET)."""
+        result = self.all
+        # Cache partage entre les threads du serveur : le bitmap est garde
+        # dans une variable locale, le cache peut etre vide entre-temps
+        cache = self._word_bitmaps
+        for word in tokenize(texte):
+            bitmap = cache.get(word)
+            if bitmap is None:
+                ids = self._words.get(word)
+                bitmap = ids_to_bitmap(ids, self.size) if ids else 0
+                if len(cache) >= WORD_CACHE_SIZE:
+                    cache.clear()
+                cache[word] = bitmap
+            result &= bitmap
+            if not result:
+                break
+        return result
+
+    def query(self, filters=None, texte=None, exclude=None):
+        """
+        Bitmap des fonds correspondant a tous les filtres.
+
+        Args:
+            filters: {facette: valeur ou liste de valeurs}
+            texte: Mots recherches dans les titres
+            exclude: Facette dont le filtre est ignore (comptes par facette)
+        """
+        result = self.text_bitmap(texte) if texte else self.all
+        for facet, values in (filters or {}).items():
+            if facet == exclude or not values:
+                continue
+            result &= self.facet_bitmap(facet, values)
+            if not result:
+                break
+        return result
+
+    def count(self, bitmap):
+        """Nombre de fonds d'un bitmap."""
+        return popcount(bitmap)
+
+    def facet_counts(self, filters=None, texte=None, facets=FACETS):
+        """
+        Comptes par valeur de chaque facette pour la requete. Le filtre d'une
+        facette n'est pas applique a ses propres comptes.
+
+        Returns:
+            {facette: {valeur: nombre de fonds}}, valeurs sans fonds omises
+        """
+        filters = filters or {}
+        counts = {}
+        base = self.query(filters, texte)
+        for facet in facets:
+            scope = self.query(filters, texte, exclude=facet) if filters.get(facet) else base
+            facet_counts = {}
+            for value, bitmap in self.bitmaps[facet].items():
+                count = popcount(bitmap & scope)
+                if count:
+                    facet_counts[value] = count
+            counts[facet] = dict(sorted(facet_counts.items(), key=lambda x: (-x[1], x[0])))
+        return counts
+
+    def ids(self, bitmap, offset=0, limit=None):
+        """Identifiants des fonds d'un bitmap, dans l'ordre d'ajout."""
+        return list(bitmap_ids(bitmap, offset, limit))
+
+    def search(self, filters=None, texte=None, offset=0, limit=DEFAULT_LIMIT):
+        """Requete complete : total, comptes par facette et page de fonds."""
+        bitmap = self.query(filters, texte)
+        ids = self.ids(bitmap, offset, limit)
+        return {
+            'total': self.count(bitmap),
+            'facettes': self.facet_counts(filters, texte),
+            'fonds': [self.fonds[i] for i in ids] if self.keep_fonds else ids
+        }
+
+
+def parse_filters(params):
+    """Filtres d'une requete ({facette: [valeurs]}) a partir de parametres multi-valeurs."""
+    return {facet: params[facet] for facet in FACETS if params.get(facet)}
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /query?categorie=...&siecle=17&siecle=18&texte=port&offset=0&limit=20
+    -> {"total", "facettes", "fonds", "ms"} ; plusieurs valeurs d'une facette
+    sont combinees en OU.
+    """
+
+    def __init__(self, *args, index=None, **kwargs):
+        self.index = index
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/query':
+            self.send_json(404, {'erreur': f"Chemin inconnu: {url.path} (utiliser /query)"})
+            return
+        params = parse_qs(url.query)
+        try:
+            offset = int(params.get('offset', ['0'])[0])
+            limit = int(params.get('limit', [str(DEFAULT_LIMIT)])[0])
+        except ValueError:
+            self.send_json(400, {'erreur': "offset et limit doivent etre des entiers"})
+            return
+        start = time.perf_counter()
+        result = self.index.search(parse_filters(params), ' '.join(params.get('texte', [])),
+                                   offset=offset, limit=limit)
+        result['ms'] = round((time.perf_counter() - start) * 1000, 2)
+        self.send_json(200, result)
+
+
+def start_server(index, host, port):
+    """Serveur de requetes (le serveur est retourne, a arreter avec shutdown())."""
+    handler = partial(QueryRequestHandler, index=index)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def print_result(result):
+    """Affichage texte d'une recherche."""
+    print(f"{result['total']} fonds")
+    for facet, counts in result['facettes'].items():
+        shown = ', '.join(f"{value} ({count})" for value, count in list(counts.items())[:10])
+        more = f", ... (+{len(counts) - 10})" if len(counts) > 10 else ''
+        print(f"  {facet:10} {shown}{more}")
+    if result['fonds']:
+        print()
+    for fonds in result['fonds']:
+        print(f"  {fonds.get('cote', ''):14} {fonds.get('nb_notices', 0):6} notices  "
+              f"{fonds.get('dates', ''):14} {fonds.get('titre', '')[:50]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Requetes par facettes sur les inventaires")
+    parser.add_argument('--inventaires', type=Path, default=INVENTAIRES_PATH,
+                        help="Fichier d'inventaires (JSON ou NDJSON)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    query_parser = commands.add_parser('query', help="Recherche avec comptes par facette")
+    for facet in FACETS:
+        query_parser.add_argument(f'--{facet}', action='append', default=[],
+                                  help=f"Valeur de la facette {facet} (repetable, OU)")
+    query_parser.add_argument('--texte', default=None, help="Mots du titre (ET)")
+    query_parser.add_argument('--offset', type=int, default=0)
+    query_parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT)
+    query_parser.add_argument('--json', action='store_true', help="Sortie JSON")
+
+    serve_parser = commands.add_parser('serve', help="Serveur de requetes JSON (/query)")
+    serve_parser.add_argument('--host', default='127.0.0.1', help="Adresse du serveur (defaut: 127.0.0.1)")
+    serve_parser.add_argument('--port', type=int, default=8001, help="Port du serveur (defaut: 8001)")
+
+    args = parser.parse_args(argv)
+
+    if not args.inventaires.exists():
+        print(f"Erreur: {args.inventaires} non trouve")
+        return
+
+    start = time.perf_counter()
+    index = FondsIndex.from_path(args.inventaires)
+    index.bitmaps  # Bitmaps calcules avant la premiere requete
+    build_time = time.perf_counter() - start
+
+    if args.command == 'query':
+        filters = parse_filters(vars(args))
+        start = time.perf_counter()
+        result = index.search(filters, args.texte, offset=args.offset, limit=args.limit)
+        query_time = time.perf_counter() - start
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+            return
+        print(f"Index de {index.size} fonds construit en {build_time:.2f}s, "
+              f"requete en {query_time * 1000:.1f} ms\n")
+        print_result(result)
+
+    elif args.command == 'serve':
+        server = start_server(index, args.host, args.port)
+        print(f"Index de {index.size} fonds construit en {build_time:.2f}s")
+        print(f"Requetes sur http://{args.host}:{server.server_address[1]}/query")
+        print("Ctrl+C pour arreter")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\nArret du serveur")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Historique des extractions des inventaires, en colonnes.
+
+Chaque extraction est ajoutee (jamais reecrite) dans data/historique/ :
+
+    dictionnaires/<colonne>.ndjson   chaines distinctes deja vues, une par ligne
+                                     (ajout seul, partagees par toutes les extractions)
+    <date>/meta.json                 date d'extraction, nombre de lignes, colonnes
+    <date>/<colonne>.bin             valeurs de la colonne (entiers 64 bits,
+                                     codes du dictionnaire pour les chaines),
+                                     compressees avec zlib
+
+Les titres, cotes et URL ne sont donc stockes qu'une fois : une extraction
+ne coute que quelques Ko, et une requete ne lit que les colonnes dont elle a
+besoin (la serie par categorie ne lit ni les titres ni les URL).
+
+Requetes :
+    changes_since(date)   fonds ajoutes, supprimes et dont les notices ont
+                          augmente depuis la derniere extraction anterieure
+                          (fonds reconnus par identifiant et cote, ou par
+                          URL sans identifiant : voir fonds_key)
+    category_series()     nombre de fonds et de notices par categorie et
+                          par extraction
+
+Usage:
+    python scripts/history_store.py import data/inventaires_ad13.json
+    python scripts/history_store.py changes --since 2025-01-01
+    python scripts/history_store.py series
+
+Auteur: Barbara Proenca
+"""
+
+import argparse
+import json
+import sys
+import zlib
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+
+# Chemins
+HISTORY_DIR = PROJECT_ROOT / "data" / "historique"
+INVENTAIRES_PATH = PROJECT_ROOT / "data" / "inventaires_ad13.json"
+
+DICTIONARIES_DIRNAME = "dictionnaires"
+META_NAME = "meta.json"
+
+# Colonnes enregistrees : chaines (encodees par dictionnaire) ou entiers
+COLUMNS = {
+    'fonds_id': 'dict',
+    'cote': 'dict',
+    'titre': 'dict',
+    'dates': 'dict',
+    'categorie': 'dict',
+    'url': 'dict',
+    'nb_notices': 'int64',
+}
+
+
+def encode_ints(values):
+    """Entiers -> octets compresses (int64 petit-boutiste)."""
+    data = array('q', values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return zlib.compress(data.tobytes(), 6)
+
+
+def decode_ints(content):
+    """Octets compresses -> entiers."""
+    data = array('q')
+    data.frombytes(zlib.decompress(content))
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data
+
+
+def fonds_key(fonds_id, cote, url, empty=''):
+    """
+    Cle d'un fonds d'une extraction a l'autre : (identifiant, cote), ou
+    (vide, URL) si l'identifiant est vide. L'identifiant seul ne suffit pas :
+    le site en donne parfois un meme a deux fonds de cotes differentes.
+    Fonctionne aussi sur les codes du dictionnaire (`empty` : code de '').
+    """
+    return (fonds_id, cote) if fonds_id != empty else (empty, url)
+
+
+def duplicate_keys(fonds_list):
+    """
+    Fonds d'une extraction qui partagent leur identifiant, ou leur cle
+    complete (fonds_key) : {'identifiants': n, 'cles': n}.
+    """
+    ids = Counter(str(fonds.get('fonds_id') or '') for fonds in fonds_list)
+    keys = Counter(fonds_key(str(fonds.get('fonds_id') or ''), str(fonds.get('cote') or ''),
+                             str(fonds.get('url') or ''))
+                   for fonds in fonds_list)
+    return {
+        'identifiants': sum(n for fonds_id, n in ids.items() if fonds_id and n > 1),
+        'cles': sum(n for n in keys.values() if n > 1)
+    }
+
+
+def partition_name(date_extraction):
+    """2025-12-05T18:58:30.935816 -> 2025-12-05T185830 (nom de dossier portable)."""
+    date, _, time = date_extraction.partition('T')
+    return f"{date}T{time.replace(':', '')[:6]}" if time else date
+
+
+class HistoryStore:
+    """Historique en colonnes des extractions (voir l'en-tete du module)."""
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = Path(root)
+        self._dictionaries = {}
+        self._indexes = {}
+
+    # --- Dictionnaires -------------------------------------------------
+
+    def _dictionary_path(self, column):
+        return self.root / DICTIONARIES_DIRNAME / f"{column}.ndjson"
+
+    def dictionary(self, column):
+        """Chaines du dictionnaire d'une colonne (chargees une fois)."""
+        if column not in self._dictionaries:
+            values = []
+            path = self._dictionary_path(column)
+            if path.exists():
+                with open(path, 'r', encoding='utf-8') as f:
+                    values = [json.loads(line) for line in f if line.strip()]
+            self._dictionaries[column] = values
+            self._indexes[column] = {value: code for code, value in enumerate(values)}
+        return self._dictionaries[column]
+
+    def _encode_strings(self, column, values):
+        """Codes des chaines ; les nouvelles chaines sont ajoutees au dictionnaire."""
+        self.dictionary(column)
+        index = self._indexes[column]
+        known = self._dictionaries[column]
+        new_values = []
+        codes = []
+        for value in values:
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(known)
+                known.append(value)
+                new_values.append(value)
+            codes.append(code)
+
+        if new_values:
+            path = self._dictionary_path(column)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                for value in new_values:
+                    f.write(json.dumps(value, ensure_ascii=False))
+                    f.write('\n')
+        return codes
+
+    # --- Ecriture ------------------------------------------------------
+
+    def append(self, fonds_list, date_extraction):
+        """
+        Ajoute une extraction.
+
+        Returns:
+            Le nom de la partition, ou None si cette extraction est deja enregistree
+        """
+        name = partition_name(date_extraction)
+        partition = self.root / name
+        if partition.exists():
+            return None
+
+        columns = {}
+        for column, kind in COLUMNS.items():
+            if kind == 'int64':
+                values = [int(fonds.get(column) or 0) for fonds in fonds_list]
+                columns[column] = encode_ints(values)
+            else:
+                values = [str(fonds.get(column) or '') for fonds in fonds_list]
+                columns[column] = encode_ints(self._encode_strings(column, values))
+
+        # Partition ecrite a cote puis renommee : jamais visible a moitie ecrite
+        tmp = self.root / f".{name}.tmp"
+        tmp.mkdir(parents=True, exist_ok=True)
+        for column, content in columns.items():
+            (tmp / f"{column}.bin").write_bytes(content)
+        with open(tmp / META_NAME, 'w', encoding='utf-8') as f:
+            json.dump({
+                'date_extraction': date_extraction,
+                'rows': len(fonds_list),
+                'columns': COLUMNS
+            }, f, ensure_ascii=False, indent=2)
+        tmp.rename(partition)
+        return name
+
+    # --- Lecture -------------------------------------------------------
+
+    def extractions(self):
+        """Extractions enregistrees : liste de (date_extraction, partition), par date."""
+        result = []
+        if not self.root.exists():
+            return result
+        for meta_path in self.root.glob(f"*/{META_NAME}"):
+            if meta_path.parent.name.startswith('.'):
+                continue
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                result.append((json.load(f)['date_extraction'], meta_path.parent.name))
+        return sorted(result)
+
+    def read_column(self, partition, column, decode=True):
+        """
+        Valeurs d'une colonne d'une extraction. Avec decode=False, les codes
+        du dictionnaire sont retournes au lieu des chaines.
+        """
+        values = decode_ints((self.root / partition / f"{column}.bin").read_bytes())
+        if COLUMNS[column] == 'int64' or not decode:
+            return list(values)
+        dictionary = self.dictionary(column)
+        return [dictionary[code] for code in values]
+
+    def read(self, partition, columns=None):
+        """Colonnes demandees (toutes par defaut) d'une extraction : {colonne: valeurs}."""
+        return {column: self.read_column(partition, column) for column in columns or COLUMNS}
+
+    def partition_before(self, date):
+        """Derniere extraction strictement anterieure a `date` (ISO), ou None."""
+        before = [partition for extracted, partition in self.extractions() if extracted < date]
+        return before[-1] if before else None
+
+    def partition_until(self, date=None):
+        """Derniere extraction anterieure ou egale a `date` (la plus recente par defaut)."""
+        extractions = self.extractions()
+        if date is not None:
+            extractions = [e for e in extractions if e[0][:len(date)] <= date]
+        return extractions[-1][1] if extractions else None
+
+    # --- Requetes ------------------------------------------------------
+
+    def changes_since(self, since, until=None):
+        """
+        Fonds ajoutes, supprimes et dont le nombre de notices a augmente
+        entre la derniere extraction anterieure a `since` et la derniere
+        extraction jusqu'a `until` (la plus recente par defaut).
+
+        Les fonds sont apparies par fonds_key ; les fonds de meme cle sont
+        apparies dans l'ordre de l'extraction, les fonds en plus d'un cote
+        sont ajoutes ou supprimes.
+
+        Returns:
+            {'depuis', 'jusqua', 'ajoutes', 'supprimes', 'augmentes'} ; les
+            fonds sont des dictionnaires fonds_id, cote, titre, categorie,
+            nb_notices (et nb_notices_avant pour les fonds augmentes)
+        """
+        base = self.partition_before(since)
+        target = self.partition_until(until)
+        if target is None:
+            return {'depuis': base, 'jusqua': None, 'ajoutes': [], 'supprimes': [], 'augmentes': []}
+
+        # Comparaison sur les codes : seules quatre colonnes sont lues
+        self.dictionary('fonds_id')
+        empty_id = self._indexes['fonds_id'].get('')
+
+        def notices_by_key(partition):
+            """{cle: [(ligne, notices), ...]} d'une extraction."""
+            rows = defaultdict(list)
+            if partition is None:
+                return rows
+            columns = [self.read_column(partition, column, decode=False)
+                       for column in ('fonds_id', 'cote', 'url')]
+            notices = self.read_column(partition, 'nb_notices')
+            for row, (fonds_id, cote, url) in enumerate(zip(*columns)):
+                rows[fonds_key(fonds_id, cote, url, empty_id)].append((row, notices[row]))
+            return rows
+
+        before = notices_by_key(base)
+        after = notices_by_key(target)
+
+        def describe(partition, rows, extra=None):
+            """Fonds des lignes `rows`, avec les colonnes descriptives."""
+            if not rows:
+                return []
+            data = self.read(partition, ['fonds_id', 'cote', 'titre', 'categorie', 'nb_notices'])
+            result = []
+            for i, row in enumerate(rows):
+                fonds = {column: values[row] for column, values in data.items()}
+                if extra:
+                    fonds.update(extra[i])
+                result.append(fonds)
+            return result
+
+        added, removed, grown = [], [], []
+        for key in after.keys() | before.keys():
+            rows_after, rows_before = after.get(key, []), before.get(key, [])
+            for (row, n), (_, previous) in zip(rows_after, rows_before):
+                if n > previous:
+                    grown.append((row, previous))
+            added += [row for row, _ in rows_after[len(rows_before):]]
+            removed += [row for row, _ in rows_before[len(rows_after):]]
+        added.sort()
+        removed.sort()
+        grown.sort()
+
+        return {
+            'depuis': base,
+            'jusqua': target,
+            'ajoutes': describe(target, added),
+            'supprimes': describe(base, removed),
+            'augmentes': describe(target, [row for row, _ in grown],
+                                  [{'nb_notices_avant': previous} for _, previous in grown])
+        }
+
+    def category_series(self):
+        """
+        Nombre de fonds et de notices par categorie a chaque extraction
+        (lit uniquement les colonnes categorie et nb_notices).
+
+        Returns:
+            {categorie: [(date_extraction, nb_fonds, nb_notices), ...]}
+        """
+        series = defaultdict(list)
+        for date_extraction, partition in self.extractions():
+            categories = self.read_column(partition, 'categorie')
+            notices = self.read_column(partition, 'nb_notices')
+            totals = defaultdict(lambda: [0, 0])
+            for categorie, n in zip(categories, notices):
+                totals[categorie][0] += 1
+                totals[categorie][1] += n
+            for categorie, (nb_fonds, nb_notices) in totals.items():
+                series[categorie].append((date_extraction, nb_fonds, nb_notices))
+        return dict(series)
+
+    def size(self):
+        """Taille totale de l'historique sur le disque (octets)."""
+        return sum(path.stat().st_size for path in self.root.rglob('*') if path.is_file())
+
+
+def append_extraction(fonds_list, date_extraction, root=HISTORY_DIR):
+    """Ajoute une extraction a l'historique (appele par le moissonnage)."""
+    return HistoryStore(root).append(fonds_list, date_extraction)
+
+
+def main(argv=None):
+    from json_stream import JsonArrayReader
+
+    parser = argparse.ArgumentParser(description="Historique des extractions des inventaires")
+    parser.add_argument('--root', type=Path, default=HISTORY_DIR,
+                        help="Dossier de l'historique (defaut: data/historique)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help="Ajoute un fichier d'inventaires a l'historique")
+    import_parser.add_argument('paths', nargs='*', type=Path, default=[INVENTAIRES_PATH])
+
+    changes_parser = commands.add_parser('changes', help="Fonds ajoutes, supprimes, augmentes")
+    changes_parser.add_argument('--since', required=True, help="Date de debut (AAAA-MM-JJ)")
+    changes_parser.add_argument('--until', default=None, help="Date de fin (defaut: derniere extraction)")
+    changes_parser.add_argument('--json', action='store_true', help="Sortie JSON")
+
+    series_parser = commands.add_parser('series', help="Evolution par categorie")
+    series_parser.add_argument('--json', action='store_true', help="Sortie JSON")
+
+    commands.add_parser('list', help="Extractions enregistrees")
+
+    args = parser.parse_args(argv)
+    store = HistoryStore(args.root)
+
+    if args.command == 'import':
+        for path in args.paths:
+            reader = JsonArrayReader(path, 'fonds')
+            fonds_list = list(reader)
+            date_extraction = reader.header.get('metadata', {}).get('date_extraction')
+            if not date_extraction:
+                print(f"Erreur: {path} sans metadata.date_extraction")
+                continue
+            name = store.append(fonds_list, date_extraction)
+            if name:
+                print(f"{path}: {len(fonds_list)} fonds ajoutes ({name})")
+                duplicates = duplicate_keys(fonds_list)
+                if duplicates['identifiants'] or duplicates['cles']:
+                    print(f"  Attention: {duplicates['identifiants']} fonds partagent leur identifiant, "
+                          f"{duplicates['cles']} leur cle (identifiant et cote, ou URL) : "
+                          f"ces derniers sont apparies dans l'ordre d'extraction")
+            else:
+                print(f"{path}: extraction du {date_extraction} deja enregistree")
+        print(f"Historique: {store.size() / 1024:.1f} Ko")
+
+    elif args.command == 'list':
+        for date_extraction, partition in store.extractions():
+            print(f"  {partition}  {date_extraction}")
+
+    elif args.command == 'changes':
+        changes = store.changes_since(args.since, args.until)
+        if args.json:
+            print(json.dumps(changes, ensure_ascii=False, indent=2))
+            return
+        print(f"Depuis {changes['depuis'] or 'le debut'} jusqu'a {changes['jusqua'] or '-'}")
+        for key, label in (('ajoutes', 'Ajoutes'), ('supprimes', 'Supprimes'), ('augmentes', 'Augmentes')):
+            print(f"\n{label}: {len(changes[key])}")
+            for fonds in changes[key]:
+                previous = (f"{fonds['nb_notices_avant']} -> "
+                            if 'nb_notices_avant' in fonds else '')
+                print(f"  {fonds['cote']:14} {previous}{fonds['nb_notices']:6} notices  {fonds['titre'][:50]}")
+
+    elif args.command == 'series':
+        series = store.category_series()
+        if args.json:
+            print(json.dumps(series, ensure_ascii=False, indent=2))
+            return
+        for categorie, points in sorted(series.items()):
+            print(f"\n{categorie}")
+            for date_extraction, nb_fonds, nb_notices in points:
+                print(f"  {date_extraction[:19]}  {nb_fonds:5} fonds  {nb_notices:8} notices")
+
+
+if __name__ == "__main__":
+    main()
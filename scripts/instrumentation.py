@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Instrumentation commune des scripts : chronometres par etape, compteurs,
+pic memoire et profilage optionnel.
+
+Chaque script cree un RunMetrics, encadre ses etapes avec `metrics.stage()`
+et appelle `metrics.finish()` en fin d'execution, ce qui ecrit un fichier
+JSON de mesures (par defaut metrics/<script>.json).
+
+Avec --profile, le pic memoire par etape (tracemalloc) et un profil cProfile
+(<script>.prof, lisible avec `python -m pstats`) sont aussi enregistres.
+
+Auteur: Barbara Proenca
+"""
+
+import json
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+
+# Chemins
+METRICS_DIR = PROJECT_ROOT / "metrics"
+
+
+def add_metrics_arguments(parser):
+    """Ajoute les options --profile et --metrics a un ArgumentParser."""
+    parser.add_argument('--profile', action='store_true',
+                        help="Mesure le pic memoire par etape et enregistre un profil cProfile")
+    parser.add_argument('--metrics', type=Path, default=None,
+                        help="Fichier JSON des mesures (defaut: metrics/<script>.json)")
+
+
+def max_rss_mb():
+    """Retourne le pic de memoire residente du processus (Mo), si disponible."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss est en octets sous macOS, en kilo-octets sous Linux
+    if sys.platform == 'darwin':
+        return round(rss / (1024 * 1024), 3)
+    return round(rss / 1024, 3)
+
+
+class RunMetrics:
+    """
+    Mesures d'une execution de script. Utilisable depuis plusieurs threads :
+    chaque thread a sa propre pile d'etapes imbriquees.
+    """
+
+    def __init__(self, script, profile=False, output_path=None):
+        self.script = script
+        self.profile = profile
+        self.output_path = Path(output_path) if output_path else METRICS_DIR / f"{script}.json"
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.values = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiler = None
+
+        if profile:
+            import cProfile
+            import tracemalloc
+            tracemalloc.start()
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    @classmethod
+    def from_args(cls, script, args):
+        """Cree les mesures a partir des options de add_metrics_arguments."""
+        return cls(script, profile=args.profile, output_path=args.metrics)
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Chronometre une etape. Une etape appelee plusieurs fois (par exemple
+        une etape par page) est agregee : nombre d'appels, temps total et max.
+        """
+        stack = self._stack()
+        tracing = self._tracing()
+        if tracing:
+            import tracemalloc
+            # Le pic courant appartient a l'etape englobante avant remise a zero
+            if stack:
+                stack[-1][1] = max(stack[-1][1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+        entry = [name, 0]
+        stack.append(entry)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+
+            self.add_time(name, elapsed)
+
+            if tracing:
+                import tracemalloc
+                peak = max(entry[1], tracemalloc.get_traced_memory()[1])
+                with self._lock:
+                    stats = self.stages[name]
+                    stats['peak_mb'] = max(stats.get('peak_mb', 0), round(peak / (1024 * 1024), 3))
+                if stack:
+                    stack[-1][1] = max(stack[-1][1], peak)
+
+    def add_time(self, name, seconds):
+        """
+        Ajoute a une etape une duree mesuree ailleurs (par exemple dans un
+        processus de travail, hors de portee de stage()).
+        """
+        with self._lock:
+            stats = self.stages.setdefault(name, {'calls': 0, 'total_s': 0.0, 'max_s': 0.0})
+            stats['calls'] += 1
+            stats['total_s'] += seconds
+            stats['max_s'] = max(stats['max_s'], seconds)
+
+    def count(self, name, n=1):
+        """Incremente un compteur."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name, value):
+        """Enregistre une valeur libre (doit etre serialisable en JSON)."""
+        self.values[name] = value
+
+    def to_dict(self):
+        """Retourne les mesures sous forme serialisable."""
+        stages = {
+            name: {**stats, 'total_s': round(stats['total_s'], 6), 'max_s': round(stats['max_s'], 6)}
+            for name, stats in self.stages.items()
+        }
+        result = {
+            'script': self.script,
+            'started_at': self.started_at.isoformat(),
+            'wall_s': round(time.perf_counter() - self.start, 6),
+            'max_rss_mb': max_rss_mb(),
+            'python': platform.python_version(),
+            'stages': stages,
+            'counters': self.counters,
+            'values': self.values
+        }
+        if self._tracing():
+            import tracemalloc
+            result['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 3)
+        return result
+
+    def finish(self):
+        """Arrete le profilage, ecrit le JSON des mesures et affiche un resume."""
+        if self._profiler:
+            self._profiler.disable()
+
+        data = self.to_dict()
+
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        if self._profiler:
+            profile_path = self.output_path.with_suffix('.prof')
+            self._profiler.dump_stats(profile_path)
+            data['profile'] = str(profile_path)
+            self._profiler = None
+
+        if self._tracing():
+            import tracemalloc
+            tracemalloc.stop()
+
+        with open(self.output_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+        print(f"\nMesures ({data['wall_s']:.2f}s au total):")
+        for name, stats in data['stages'].items():
+            peak = f", pic {stats['peak_mb']} Mo" if 'peak_mb' in stats else ''
+            print(f"  {name:28} {stats['total_s']:8.3f}s ({stats['calls']} appel(s){peak})")
+        print(f"Mesures sauvegardees dans: {self.output_path}")
+        if 'profile' in data:
+            print(f"Profil cProfile: {data['profile']}")
+
+        return data
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _tracing(self):
+        if not self.profile:
+            return False
+        import tracemalloc
+        return tracemalloc.is_tracing()
+
+
+class NullMetrics:
+    """Mesures inactives, utilisees quand une fonction est appelee sans RunMetrics."""
+
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def add_time(self, name, seconds):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+
+NULL_METRICS = NullMetrics()
@@ -6,19 +6,27 @@ Met a jour le JSON de la visualisation avec le nombre d'inventaires en ligne par
 Auteur: Barbara Proenca
 """
 
+import argparse
+import heapq
 import json
-from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+from data_versions import publish_version
+from instrumentation import RunMetrics, add_metrics_arguments
+from json_stream import iter_records, records
+from treemap_snapshot import write_snapshot
 
 # Chemins
-PROJECT_ROOT = Path(__file__).parent.parent
 INVENTAIRES_PATH = PROJECT_ROOT / "data" / "inventaires_ad13.json"
 ARCHIVES_JSON_PATH = PROJECT_ROOT / "docs" / "data" / "archives.json"
 
+# Fonds principaux (par nombre de notices) conserves par categorie
+TOP_FONDS = 5
 
-def load_inventaires():
-    """Charge les inventaires scrapes."""
-    with open(INVENTAIRES_PATH, 'r', encoding='utf-8') as f:
-        return json.load(f)
+
+def iter_inventaires(path=INVENTAIRES_PATH):
+    """Parcourt les inventaires scrapes un par un (JSON ou NDJSON)."""
+    return iter_records(path, 'fonds')
 
 
 def load_archives():
@@ -27,11 +35,18 @@ def load_archives():
         return json.load(f)
 
 
-def compute_stats_by_category(inventaires_data):
-    """Calcule les statistiques par categorie."""
+def compute_stats_by_category(inventaires_data, top=TOP_FONDS):
+    """
+    Calcule les statistiques par categorie, fonds par fonds.
+    
+    `inventaires_data` est le dictionnaire charge ou un iterateur de fonds
+    (iter_inventaires). Seuls les `top` fonds ayant le plus de notices sont
+    conserves par categorie (tas borne), tries par notices decroissantes.
+    """
     stats = {}
+    heaps = {}
     
-    for fonds in inventaires_data['fonds']:
+    for rank, fonds in enumerate(records(inventaires_data)):
         cat = fonds.get('categorie', 'AUTRE')
         if cat not in stats:
             stats[cat] = {
@@ -39,15 +54,26 @@ def compute_stats_by_category(inventaires_data):
                 'nb_notices': 0,
                 'fonds': []
             }
+            heaps[cat] = []
+        nb_notices = fonds.get('nb_notices', 0)
         stats[cat]['nb_inventaires'] += 1
-        stats[cat]['nb_notices'] += fonds.get('nb_notices', 0)
-        stats[cat]['fonds'].append({
+        stats[cat]['nb_notices'] += nb_notices
+        
+        # A notices egales, le premier fonds lu l'emporte
+        entry = (nb_notices, -rank, {
             'cote': fonds.get('cote', ''),
             'titre': fonds.get('titre', ''),
             'dates': fonds.get('dates', ''),
-            'nb_notices': fonds.get('nb_notices', 0),
+            'nb_notices': nb_notices,
             'url': fonds.get('url', '')
         })
+        if len(heaps[cat]) < top:
+            heapq.heappush(heaps[cat], entry)
+        elif entry[:2] > heaps[cat][0][:2]:
+            heapq.heapreplace(heaps[cat], entry)
+    
+    for cat, heap in heaps.items():
+        stats[cat]['fonds'] = [entry[2] for entry in sorted(heap, key=lambda e: e[:2], reverse=True)]
     
     return stats
 
@@ -78,7 +104,7 @@ def update_archives_with_inventaires(archives_data, inv_stats):
             func['nb_inventaires_en_ligne'] = stats['nb_inventaires']
             func['nb_notices_en_ligne'] = stats['nb_notices']
             # Ajouter les 5 fonds principaux (par nombre de notices)
-            top_fonds = sorted(stats['fonds'], key=lambda x: x['nb_notices'], reverse=True)[:5]
+            top_fonds = sorted(stats['fonds'], key=lambda x: x['nb_notices'], reverse=True)[:TOP_FONDS]
             func['inventaires_principaux'] = top_fonds
         else:
             func['nb_inventaires_en_ligne'] = 0
@@ -102,12 +128,16 @@ def update_archives_with_inventaires(archives_data, inv_stats):
 
 
 def save_archives(archives_data):
-    """Sauvegarde les donnees mises a jour."""
-    with open(ARCHIVES_JSON_PATH, 'w', encoding='utf-8') as f:
-        json.dump(archives_data, f, ensure_ascii=False, indent=2)
+    """Sauvegarde les donnees mises a jour (avec le manifeste et les deltas)."""
+    return publish_version(archives_data, ARCHIVES_JSON_PATH)
 
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Integration des inventaires dans la visualisation")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics = RunMetrics.from_args('integrate_inventaires', args)
+    
     print("Integration des inventaires dans la visualisation")
     print("=" * 50)
     
@@ -117,30 +147,38 @@ def main():
         print("Executez d'abord: python scripts/scrape_ad13_inventaires.py")
         return
     
-    # Charger les donnees
-    print("Chargement des inventaires...")
-    inventaires = load_inventaires()
-    print(f"  {len(inventaires['fonds'])} inventaires charges")
-    
-    print("Chargement des donnees de visualisation...")
-    archives = load_archives()
-    print(f"  {len(archives['fonctions'])} fonctions")
-    
-    # Calculer les stats
+    # Calculer les stats en lisant les inventaires en flux
     print("Calcul des statistiques par categorie...")
-    inv_stats = compute_stats_by_category(inventaires)
+    with metrics.stage('compute_stats_by_category'):
+        inv_stats = compute_stats_by_category(iter_inventaires())
+    nb_inventaires = sum(stats['nb_inventaires'] for stats in inv_stats.values())
+    print(f"  {nb_inventaires} inventaires lus")
+    metrics.count('inventaires', nb_inventaires)
+    metrics.count('categories', len(inv_stats))
     for cat, stats in sorted(inv_stats.items()):
         print(f"  {cat}: {stats['nb_inventaires']} inventaires, {stats['nb_notices']} notices")
     
+    # Le JSON de la visualisation reste petit (inventaires pagines) : charge en entier
+    print("Chargement des donnees de visualisation...")
+    with metrics.stage('load_archives'):
+        archives = load_archives()
+    print(f"  {len(archives['fonctions'])} fonctions")
+    
     # Mettre a jour
     print("Mise a jour des donnees...")
-    updated_archives = update_archives_with_inventaires(archives, inv_stats)
+    with metrics.stage('update_archives_with_inventaires'):
+        updated_archives = update_archives_with_inventaires(archives, inv_stats)
     
     # Sauvegarder
     print("Sauvegarde...")
-    save_archives(updated_archives)
+    with metrics.stage('save_archives'):
+        manifest = save_archives(updated_archives)
+    metrics.set('version', manifest['version'])
+    with metrics.stage('write_snapshot'):
+        write_snapshot(updated_archives)
     
     print(f"\nFichier mis a jour: {ARCHIVES_JSON_PATH}")
+    metrics.finish()
     print("Integration terminee!")
 
 
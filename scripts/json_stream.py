@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Lecture et ecriture de JSON en flux, a memoire constante.
+
+Les fichiers d'inventaires ont la forme {"metadata": {...}, "fonds": [...]} :
+JsonArrayReader parcourt les elements du tableau un par un (le fichier est
+lu par blocs, seul l'element courant est decode) ; les autres cles de
+premier niveau sont conservees dans `header`. Les fichiers .ndjson (un
+objet JSON par ligne) sont lus ligne a ligne.
+
+JsonArrayWriter ecrit le meme format element par element, et
+ExternalSorter trie un flux d'elements plus grand que la memoire (tri par
+blocs ecrits sur disque, puis fusion).
+
+Uniquement la bibliotheque standard.
+
+Auteur: Barbara Proenca
+"""
+
+import heapq
+import json
+import os
+import tempfile
+from itertools import islice
+from pathlib import Path
+
+# Taille des blocs lus sur le disque
+READ_SIZE = 1 << 16
+
+# Elements gardes en memoire par ExternalSorter avant ecriture d'un bloc trie
+SORT_CHUNK_SIZE = 50_000
+
+WHITESPACE = ' \t\r\n'
+
+
+class JsonArrayReader:
+    """
+    Parcourt les elements du tableau `key` d'un objet JSON de premier niveau.
+
+    Usage:
+        reader = JsonArrayReader(path, 'fonds')
+        for fonds in reader:
+            ...
+        reader.header  # {'metadata': {...}} : autres cles de premier niveau
+    """
+
+    def __init__(self, path, key):
+        self.path = Path(path)
+        self.key = key
+        self.header = {}
+
+    def __iter__(self):
+        self.header = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            yield from _Scanner(f).object_items(self.key, self.header)
+
+
+class _Scanner:
+    """Analyse incrementale d'un texte JSON lu par blocs."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        """Lit un bloc supplementaire ; retourne False a la fin du fichier."""
+        if self.eof:
+            return False
+        chunk = self.f.read(READ_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Premier caractere significatif (None en fin de fichier)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return None
+
+    def expect(self, chars):
+        char = self.peek()
+        if char is None or char not in chars:
+            raise ValueError(f"JSON invalide: {chars!r} attendu, {char!r} trouve")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """
+        Decode la valeur suivante. Une valeur n'est acceptee que si elle est
+        suivie d'au moins un caractere (un nombre coupe en fin de bloc serait
+        sinon decode tronque), sauf en fin de fichier.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self.fill():
+                # Fin de fichier : derniere tentative sur le tampon complet
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                self.pos = end
+                return value
+
+    def object_items(self, key, header):
+        """Elements du tableau `key` ; les autres membres vont dans `header`."""
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        while True:
+            name = self.value()
+            self.expect(':')
+            if name == key and self.peek() == '[':
+                self.pos += 1
+                if self.peek() == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        yield self.value()
+                        if self.expect(',]') == ']':
+                            break
+            else:
+                header[name] = self.value()
+            if self.expect(',}') == '}':
+                return
+
+
+def iter_ndjson(path):
+    """Objets d'un fichier NDJSON (lignes vides ignorees)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def records(data, key='fonds'):
+    """Elements d'un dictionnaire deja charge ({key: [...]}) ou d'un iterable d'elements."""
+    return data[key] if isinstance(data, dict) else data
+
+
+def iter_records(path, key='fonds'):
+    """Elements d'un fichier .ndjson, ou du tableau `key` d'un fichier JSON."""
+    path = Path(path)
+    if path.suffix == '.ndjson':
+        return iter_ndjson(path)
+    return iter(JsonArrayReader(path, key))
+
+
+class JsonArrayWriter:
+    """
+    Ecrit {<header...>, "<key>": [<elements>], <trailer...>} element par
+    element. `trailer` (par exemple des totaux connus seulement a la fin)
+    peut etre complete pendant l'ecriture.
+
+    Usage:
+        with JsonArrayWriter(path, 'fonds', {'metadata': {...}}) as writer:
+            for fonds in fonds_list:
+                writer.write(fonds)
+    """
+
+    def __init__(self, path, key, header=None, trailer=None, indent=2):
+        self.path = Path(path)
+        self.key = key
+        self.header = header or {}
+        self.trailer = trailer if trailer is not None else {}
+        self.indent = indent
+        self.count = 0
+        self.f = None
+
+    def _dump(self, value, level):
+        text = json.dumps(value, ensure_ascii=False, indent=self.indent)
+        if self.indent:
+            text = text.replace('\n', '\n' + ' ' * (self.indent * level))
+        return text
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.f = open(self.path, 'w', encoding='utf-8')
+        pad = ' ' * (self.indent or 0)
+        self.f.write('{')
+        for name, value in self.header.items():
+            self.f.write(f"\n{pad}{json.dumps(name)}: {self._dump(value, 1)},")
+        self.f.write(f"\n{pad}{json.dumps(self.key)}: [")
+        return self
+
+    def write(self, item):
+        pad = ' ' * (2 * (self.indent or 0))
+        self.f.write(f"{',' if self.count else ''}\n{pad}{self._dump(item, 2)}")
+        self.count += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        pad = ' ' * (self.indent or 0)
+        try:
+            if exc_type is None:
+                self.f.write(f"\n{pad}]" if self.count else ']')
+                for name, value in self.trailer.items():
+                    self.f.write(f",\n{pad}{json.dumps(name)}: {self._dump(value, 1)}")
+                self.f.write('\n}\n')
+        finally:
+            self.f.close()
+        return False
+
+
+class ExternalSorter:
+    """
+    Tri d'un flux d'elements JSON a memoire bornee : au-dela de
+    `chunk_size` elements, le bloc en memoire est trie et ecrit dans un
+    fichier temporaire (NDJSON) ; `sorted()` fusionne ensuite les blocs.
+    Le tri est stable, comme sorted().
+    """
+
+    def __init__(self, key, reverse=False, chunk_size=SORT_CHUNK_SIZE, tmp_dir=None):
+        self.key = key
+        self.reverse = reverse
+        self.chunk_size = chunk_size
+        self.tmp_dir = tmp_dir
+        self.buffer = []
+        self.runs = []
+        self.count = 0
+
+    def add(self, item):
+        self.buffer.append(item)
+        self.count += 1
+        if len(self.buffer) >= self.chunk_size:
+            self._spill()
+
+    def __len__(self):
+        return self.count
+
+    def _spill(self):
+        self.buffer.sort(key=self.key, reverse=self.reverse)
+        fd, path = tempfile.mkstemp(suffix='.ndjson', dir=self.tmp_dir)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for item in self.buffer:
+                f.write(json.dumps(item, ensure_ascii=False))
+                f.write('\n')
+        self.runs.append(path)
+        self.buffer = []
+
+    def sorted(self):
+        """Elements tries (iterateur) ; les fichiers temporaires sont ensuite supprimes."""
+        if not self.runs:
+            yield from sorted(self.buffer, key=self.key, reverse=self.reverse)
+            return
+        if self.buffer:
+            self._spill()
+        try:
+            yield from heapq.merge(*(iter_ndjson(path) for path in self.runs),
+                                   key=self.key, reverse=self.reverse)
+        finally:
+            self.close()
+
+    def close(self):
+        """Supprime les fichiers temporaires."""
+        for path in self.runs:
+            Path(path).unlink(missing_ok=True)
+        self.runs = []
+        self.buffer = []
+
+
+def chunks(iterable, size):
+    """Decoupe un iterable en listes de `size` elements."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Registre des portails d'archives bases sur Ligeo Archives.
+
+Les portails Ligeo partagent la meme structure de recherche de fonds
+(resultats pagines dans table#resultats, liens /archive/fonds/<prefixe>_<n>) :
+seuls l'adresse, le chemin de recherche et le prefixe des identifiants de
+fonds changent. Chaque site declare aussi sa politesse (delai entre deux
+requetes, connexions simultanees) et, si besoin, des categories propres a
+certaines series.
+
+Les AD13 sont integrees ; d'autres portails sont declares dans un fichier
+JSON (liste d'objets ou objet cle -> site) avec les memes champs.
+
+Auteur: Barbara Proenca
+"""
+
+import json
+from pathlib import Path
+from urllib.parse import urlparse
+
+from ad13_paths import PROJECT_ROOT
+
+SITES_PATH = PROJECT_ROOT / "data" / "sites.json"
+
+# Valeurs par defaut d'un site (politesse prudente)
+DEFAULT_SITE = {
+    'search_path': "/archive/resultats/fonds/fonds/n:93",
+    'delay': 1.0,            # Secondes entre deux requetes vers l'hote
+    'max_connections': 1,    # Requetes simultanees vers l'hote
+    'max_pages': 50,         # Securite
+    'categories': {}         # Serie -> categorie, prioritaire sur categorize_fonds
+}
+
+SITES = {
+    'ad13': {
+        'nom': "Archives departementales des Bouches-du-Rhone",
+        'base_url': "https://www.archives13.fr",
+        'fonds_prefix': "FRAD013",
+    },
+}
+
+REQUIRED_FIELDS = ('nom', 'base_url', 'fonds_prefix')
+
+
+def normalize_site(key, site):
+    """Complete un site avec les valeurs par defaut et verifie ses champs."""
+    missing = [field for field in REQUIRED_FIELDS if not site.get(field)]
+    if missing:
+        raise ValueError(f"Site {key}: champ(s) manquant(s) {', '.join(missing)}")
+
+    site = {**DEFAULT_SITE, **site, 'key': key}
+    site['base_url'] = site['base_url'].rstrip('/')
+    site['host'] = urlparse(site['base_url']).netloc
+    if not site['host']:
+        raise ValueError(f"Site {key}: adresse invalide {site['base_url']}")
+    site['search_url'] = f"{site['base_url']}{site['search_path']}"
+    if site['delay'] < 0 or site['max_connections'] < 1:
+        raise ValueError(f"Site {key}: delai ou nombre de connexions invalide")
+    return site
+
+
+def load_sites(path=None):
+    """
+    Registre complet : sites integres et sites du fichier `path` (par
+    defaut data/sites.json s'il existe). Un site du fichier remplace le
+    site integre de meme cle.
+    """
+    sites = dict(SITES)
+    path = Path(path) if path else SITES_PATH
+    if path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            declared = json.load(f)
+        if isinstance(declared, list):
+            declared = {site['key']: {k: v for k, v in site.items() if k != 'key'}
+                        for site in declared}
+        for key, site in declared.items():
+            sites[key] = {**sites.get(key, {}), **site}
+    return {key: normalize_site(key, site) for key, site in sites.items()}
+
+
+def get_sites(keys=None, path=None):
+    """Sites selectionnes (tous si `keys` est vide), dans l'ordre demande."""
+    registry = load_sites(path)
+    if not keys:
+        return list(registry.values())
+    unknown = [key for key in keys if key not in registry]
+    if unknown:
+        raise ValueError(f"Site(s) inconnu(s): {', '.join(unknown)} "
+                         f"(disponibles: {', '.join(registry)})")
+    return [registry[key] for key in dict.fromkeys(keys)]
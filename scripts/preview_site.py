@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Serveur de previsualisation du site, proche d'un hebergement de production.
+
+Contrairement a `python -m http.server`, il reproduit ce qui determine le
+cout reel des transferts :
+
+- compression : un fichier `X.br` ou `X.gz` a cote de `X` est servi a la
+  place de `X` si le navigateur l'accepte (Accept-Encoding), avec
+  Content-Encoding et Vary ; --compress les cree (.br si le module brotli
+  est installe) ;
+- cache : ETag fort (empreinte du contenu envoye, donc differente par
+  encodage), reponses 304 a If-None-Match, Cache-Control selon le type de
+  fichier ou le fichier _headers produit par publish_site.py ;
+- plages d'octets (Range, If-Range), reponses 206 et 416 ;
+- journal de chaque requete : statut, encodage, octets envoyes et latence,
+  eventuellement enregistre en NDJSON (--log) pour comparer deux versions.
+
+Usage:
+    python scripts/preview_site.py --compress
+    python scripts/preview_site.py --root site --port 8002 --log metrics/preview.ndjson
+
+Auteur: Barbara Proenca
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Chemins
+DOCS_DIR = PROJECT_ROOT / "docs"
+
+HEADERS_NAME = "_headers"
+
+# Encodages par ordre de preference : (nom HTTP, extension du fichier compresse)
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+# Types compresses par --compress
+COMPRESSIBLE_SUFFIXES = {'.html', '.js', '.json', '.css', '.svg', '.txt'}
+# En dessous, la compression ne fait rien gagner
+MIN_COMPRESS_SIZE = 1024
+
+# Cache-Control par defaut (sans _headers)
+REVALIDATE = "no-cache"
+IMMUTABLE = "public, max-age=31536000, immutable"
+DEFAULT_CACHE = "public, max-age=600"  # Valeur de GitHub Pages
+REVALIDATED_FILES = {'index.html', 'data/manifest.json'}
+# Nom empreinte de publish_site.py : App.<10 caracteres hexadecimaux>.js
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{10}\.\w+$')
+
+COPY_CHUNK_SIZE = 1 << 16
+
+
+def compress_siblings(root, min_size=MIN_COMPRESS_SIZE):
+    """
+    Cree ou met a jour les fichiers .gz (et .br si brotli est installe) a
+    cote des fichiers compressibles de `root`.
+
+    Returns:
+        Nombre de fichiers compresses ecrits
+    """
+    written = 0
+    for path in sorted(Path(root).rglob('*')):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        stat = path.stat()
+        if stat.st_size < min_size:
+            continue
+        content = None
+        for encoding, suffix in ENCODINGS:
+            if encoding == 'br' and brotli is None:
+                continue
+            target = path.with_name(path.name + suffix)
+            if target.exists() and target.stat().st_mtime >= stat.st_mtime:
+                continue
+            content = content if content is not None else path.read_bytes()
+            if encoding == 'br':
+                target.write_bytes(brotli.compress(content, quality=11))
+            else:
+                target.write_bytes(gzip.compress(content, compresslevel=9, mtime=0))
+            written += 1
+    return written
+
+
+def load_header_rules(root):
+    """Cache-Control par chemin exact, lu dans le fichier _headers s'il existe."""
+    rules = {}
+    headers_path = Path(root) / HEADERS_NAME
+    if not headers_path.exists():
+        return rules
+    current = None
+    for line in headers_path.read_text(encoding='utf-8').splitlines():
+        if line.startswith('/'):
+            current = line.strip()
+        elif current and line.strip().lower().startswith('cache-control:'):
+            rules[current] = line.split(':', 1)[1].strip()
+    return rules
+
+
+def cache_control(rel_path, rules):
+    """Cache-Control d'un fichier (chemin relatif a la racine du site)."""
+    if f"/{rel_path}" in rules:
+        return rules[f"/{rel_path}"]
+    if rel_path in REVALIDATED_FILES or rel_path.endswith('.html'):
+        return REVALIDATE
+    if HASHED_NAME_RE.search(rel_path):
+        return IMMUTABLE
+    return DEFAULT_CACHE
+
+
+def parse_accept_encoding(header):
+    """Encodages acceptes (q > 0) d'un en-tete Accept-Encoding."""
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        match = re.search(r'q\s*=\s*([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        accepted[name] = quality
+    wildcard = accepted.get('*', 0)
+    return {name for name, _ in ENCODINGS if accepted.get(name, wildcard) > 0}
+
+
+def parse_range(header, size):
+    """
+    Plage d'un en-tete Range ("bytes=0-99", "bytes=100-", "bytes=-100").
+
+    Returns:
+        (debut, fin incluse), None si l'en-tete est absent ou ignore
+        (plusieurs plages, autre unite), ou 'invalide' si la plage ne peut
+        pas etre satisfaite
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    spec = header[len('bytes='):].strip()
+    if ',' in spec:
+        return None
+    start, _, end = spec.partition('-')
+    try:
+        if not start:
+            length = int(end)
+            if length <= 0:
+                return 'invalide'
+            return (max(0, size - length), size - 1)
+        first = int(start)
+        last = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if first >= size or last < first:
+        return 'invalide'
+    return (first, min(last, size - 1))
+
+
+class ETagCache:
+    """Empreintes des fichiers, recalculees quand leur date ou leur taille change."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._etags = {}
+
+    def get(self, path, stat):
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._etags.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(partial(f.read, COPY_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        etag = f'"{digest.hexdigest()[:20]}"'
+        with self._lock:
+            self._etags[path] = (key, etag)
+        return etag
+
+
+class RequestLog:
+    """Journal des requetes : affichage, totaux par type et NDJSON facultatif."""
+
+    def __init__(self, path=None, quiet=False):
+        self.path = Path(path) if path else None
+        self.quiet = quiet
+        self._lock = threading.Lock()
+        self.totals = defaultdict(lambda: {'requetes': 0, 'octets': 0, 'octets_source': 0})
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def record(self, entry):
+        with self._lock:
+            kind = Path(entry['chemin']).suffix or '/'
+            totals = self.totals[kind]
+            totals['requetes'] += 1
+            totals['octets'] += entry['octets']
+            totals['octets_source'] += entry.get('taille_source', 0)
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        if not self.quiet:
+            print(f"{entry['methode']:4} {entry['statut']} {entry['chemin'][:60]:60} "
+                  f"{entry['encodage'] or '-':5} {entry['octets']:>9} o {entry['ms']:7.2f} ms")
+
+    def summary(self):
+        """Totaux par extension."""
+        lines = []
+        for kind, totals in sorted(self.totals.items()):
+            ratio = (f" ({totals['octets'] / totals['octets_source']:.0%} de la taille source)"
+                     if totals['octets_source'] else '')
+            lines.append(f"  {kind:6} {totals['requetes']:5} requete(s) {totals['octets']:>11} o{ratio}")
+        return '\n'.join(lines)
+
+
+class PreviewRequestHandler(SimpleHTTPRequestHandler):
+    """Sert un dossier avec compression negociee, ETag, Cache-Control et plages."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def __init__(self, *args, etags=None, log=None, header_rules=None, **kwargs):
+        self.etags = etags
+        self.log = log
+        self.header_rules = header_rules or {}
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.serve(send_body=True)
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
+
+    def resolve(self):
+        """(fichier, chemin relatif) demande, ou (None, None)."""
+        path = Path(self.translate_path(self.path))
+        if path.is_dir():
+            path = path / 'index.html'
+        if not path.is_file():
+            return None, None
+        return path, path.relative_to(Path(self.directory).resolve()).as_posix()
+
+    def select_encoding(self, path):
+        """Fichier a envoyer et encodage, selon Accept-Encoding et les fichiers compresses."""
+        if path.suffix not in COMPRESSIBLE_SUFFIXES:
+            return path, None
+        accepted = parse_accept_encoding(self.headers.get('Accept-Encoding'))
+        source_mtime = path.stat().st_mtime
+        for encoding, suffix in ENCODINGS:
+            sibling = path.with_name(path.name + suffix)
+            # Un fichier compresse plus ancien que la source est ignore
+            if encoding in accepted and sibling.is_file() and sibling.stat().st_mtime >= source_mtime:
+                return sibling, encoding
+        return path, None
+
+    def serve(self, send_body):
+        start = time.perf_counter()
+        sent = 0
+        encoding = None
+        source_size = 0
+        status = HTTPStatus.OK
+        try:
+            path, rel_path = self.resolve()
+            if path is None:
+                status = HTTPStatus.NOT_FOUND
+                self.send_error(status, "Fichier introuvable")
+                return
+            source_size = path.stat().st_size
+            body_path, encoding = self.select_encoding(path)
+            stat = body_path.stat()
+            etag = self.etags.get(body_path, stat)
+
+            headers = {
+                'Content-Type': self.guess_type(str(path)),
+                'ETag': etag,
+                'Cache-Control': cache_control(rel_path, self.header_rules),
+                'Accept-Ranges': 'bytes',
+                'Last-Modified': self.date_time_string(int(stat.st_mtime)),
+            }
+            if path.suffix in COMPRESSIBLE_SUFFIXES:
+                headers['Vary'] = 'Accept-Encoding'
+            if encoding:
+                headers['Content-Encoding'] = encoding
+
+            if etag in [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]:
+                status = HTTPStatus.NOT_MODIFIED
+                self.send_response(status)
+                for name, value in headers.items():
+                    if name not in ('Content-Type', 'Accept-Ranges'):
+                        self.send_header(name, value)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            size = stat.st_size
+            byte_range = parse_range(self.headers.get('Range'), size)
+            if_range = self.headers.get('If-Range')
+            if byte_range is not None and if_range and if_range != etag:
+                byte_range = None
+            if byte_range == 'invalide':
+                status = HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE
+                self.send_response(status)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            first, last = byte_range or (0, size - 1)
+            length = max(0, last - first + 1)
+            status = HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if byte_range:
+                self.send_header('Content-Range', f"bytes {first}-{last}/{size}")
+            self.send_header('Content-Length', str(length))
+            self.end_headers()
+
+            if send_body:
+                with open(body_path, 'rb') as f:
+                    f.seek(first)
+                    remaining = length
+                    while remaining > 0:
+                        chunk = f.read(min(COPY_CHUNK_SIZE, remaining))
+                        if not chunk:
+                            break
+                        self.wfile.write(chunk)
+                        sent += len(chunk)
+                        remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            if self.log is not None:
+                self.log.record({
+                    'methode': self.command,
+                    'chemin': self.path.split('?', 1)[0],
+                    'statut': int(status),
+                    'encodage': encoding,
+                    'octets': sent,
+                    'taille_source': source_size if sent else 0,
+                    'ms': round((time.perf_counter() - start) * 1000, 2),
+                    'date': time.strftime('%Y-%m-%dT%H:%M:%S')
+                })
+
+
+def start_server(root, host, port, log=None):
+    """Serveur de previsualisation (a lancer avec serve_forever())."""
+    handler = partial(PreviewRequestHandler, directory=str(Path(root).resolve()),
+                      etags=ETagCache(), log=log, header_rules=load_header_rules(root))
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serveur de previsualisation du site")
+    parser.add_argument('--root', type=Path, default=DOCS_DIR,
+                        help="Dossier servi (defaut: docs/ ; site/ pour la version publiee)")
+    parser.add_argument('--host', default='127.0.0.1', help="Adresse du serveur (defaut: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8002, help="Port du serveur (defaut: 8002)")
+    parser.add_argument('--compress', action='store_true',
+                        help="Cree les fichiers .gz (et .br avec brotli) avant de servir")
+    parser.add_argument('--log', type=Path, default=None,
+                        help="Journal NDJSON des requetes (ex.: metrics/preview.ndjson)")
+    parser.add_argument('--quiet', action='store_true', help="N'affiche pas chaque requete")
+    args = parser.parse_args(argv)
+
+    if not args.root.is_dir():
+        print(f"Erreur: dossier {args.root} introuvable")
+        return
+
+    if args.compress:
+        written = compress_siblings(args.root)
+        encodings = 'gzip et brotli' if brotli else 'gzip (brotli non installe)'
+        print(f"{written} fichier(s) compresse(s) ecrit(s) ({encodings})")
+
+    log = RequestLog(args.log, quiet=args.quiet)
+    server = start_server(args.root, args.host, args.port, log)
+    print(f"{args.root} servi sur http://{args.host}:{server.server_address[1]}/")
+    print("Ctrl+C pour arreter")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nArret du serveur")
+        if log.totals:
+            print(log.summary())
+
+
+if __name__ == "__main__":
+    main()
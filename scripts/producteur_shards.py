@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Producteurs de la visualisation, publies par thematique.
+
+Les producteurs (feuille "Producteur" du classeur) sont rattaches a leur
+thematique par un index calcule a la construction (colonne Thematique, et
+Fonction si elle est renseignee) : par le nom exact, sinon par la serie
+("Serie B - Cours et juridictions" rejoint la thematique "Serie B" que la
+construction cree pour la serie B). Chaque thematique recoit un fichier
+separe, charge a la demande par le treemap et l'arbre, et nomme par
+l'empreinte de son contenu (son URL change avec lui) :
+
+    docs/data/producteurs/<fonction>-<thematique>.<empreinte>.json
+        {"thematique": "<fonction>/<thematique>", "producteurs": [{"id": ..., ...}]}
+
+et archives.json ne garde que la reference du fichier :
+
+    thematique["producteurs"] = {"total": 12, "url": "data/producteurs/<...>.json",
+                                 "empreinte": "<empreinte>"}
+
+L'identifiant `id` d'un producteur est sa position dans la feuille. Les
+producteurs sans thematique connue restent dans la liste `producteurs` de
+archives.json.
+
+Auteur: Barbara Proenca
+"""
+
+import json
+import re
+import shutil
+from collections import Counter
+from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+from build_full_visualization import extract_serie, slugify
+from data_versions import content_hash
+from json_stream import records
+
+# Chemins
+EXCEL_PATH = PROJECT_ROOT / "data" / "archives.xlsx"
+SHARDS_DIR = PROJECT_ROOT / "docs" / "data" / "producteurs"
+
+# Dossier des fichiers de producteurs, relatif a docs/ (URL chargee par la page)
+SHARDS_URL = "data/producteurs"
+
+SHEET_NAME = "Producteur"
+
+# Nom de thematique designant une serie : "Serie B", "Serie B - Cours et juridictions", "ETP"
+SERIE_NAME_RE = re.compile(r'^(?:s[eé]rie\s+)?([a-z]{1,5})(?:\s+-\s+.*)?$', re.I | re.S)
+
+
+def theme_name(item):
+    """Nom de la thematique d'une thematique ou d'un producteur."""
+    return item.get('Thématique') or item.get('Thematique') or item.get('thematique') or ''
+
+
+def theme_fonction(item):
+    """Fonction d'une thematique ou d'un producteur ('' si absente)."""
+    return item.get('Fonction') or item.get('fonction') or ''
+
+
+def theme_serie(name):
+    """
+    Serie designee par un nom de thematique, comme la construction nomme
+    ses thematiques (extract_serie) ; None si le nom n'est pas une serie.
+    """
+    match = SERIE_NAME_RE.match(str(name or '').strip())
+    return extract_serie(match.group(1)) if match else None
+
+
+def read_producteurs_sheet(excel_path=EXCEL_PATH, sheet_name=SHEET_NAME):
+    """
+    Producteurs de la feuille "Producteur", ligne par ligne (mode lecture
+    seule d'openpyxl, memoire constante). Les cellules vides valent ''.
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        if sheet_name not in wb.sheetnames:
+            return
+        rows = wb[sheet_name].iter_rows(values_only=True)
+        columns = next(rows, None)
+        if not columns:
+            return
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            yield {col: ('' if value is None else value)
+                   for col, value in zip(columns, row) if col is not None}
+    finally:
+        wb.close()
+
+
+def load_producteurs(path=EXCEL_PATH):
+    """Producteurs d'un classeur (.xlsx) ou d'un fichier JSON (liste ou {"producteurs": [...]})."""
+    path = Path(path)
+    if path.suffix == '.json':
+        with open(path, 'r', encoding='utf-8') as f:
+            return list(records(json.load(f), 'producteurs'))
+    return list(read_producteurs_sheet(path))
+
+
+def index_producteurs(thematiques, producteurs):
+    """
+    Rattache chaque producteur a sa thematique : par le nom exact, sinon par
+    la serie (theme_serie), avec la fonction si elle est renseignee.
+
+    Returns:
+        ({position de la thematique: [identifiants des producteurs]},
+         [identifiants des producteurs sans thematique])
+    """
+    by_key = {}
+    by_name = {}
+    by_serie_key = {}
+    by_serie = {}
+    for position, theme in enumerate(thematiques):
+        name, fonction = theme_name(theme), theme_fonction(theme)
+        by_key.setdefault((fonction, name), position)
+        by_name.setdefault(name, position)
+        serie = theme_serie(name)
+        if serie:
+            by_serie_key.setdefault((fonction, serie), position)
+            by_serie.setdefault(serie, position)
+
+    index = {}
+    orphans = []
+    for producteur_id, producteur in enumerate(producteurs):
+        name, fonction = theme_name(producteur), theme_fonction(producteur)
+        position = by_key.get((fonction, name)) if fonction else by_name.get(name)
+        serie = theme_serie(name) if position is None else None
+        if serie:
+            position = by_serie_key.get((fonction, serie)) if fonction else by_serie.get(serie)
+        if position is None:
+            orphans.append(producteur_id)
+        else:
+            index.setdefault(position, []).append(producteur_id)
+    return index, orphans
+
+
+def shard_producteurs(data, write_shard=None):
+    """
+    Remplace les producteurs de `data` par un fichier par thematique.
+
+    Args:
+        write_shard: Fonction (chemin relatif, contenu) appelee pour chaque
+            fichier ; par defaut les fichiers sont rassembles dans le resultat
+
+    Returns:
+        Dictionnaire {chemin relatif: contenu} des fichiers (vide avec `write_shard`)
+    """
+    shards = {}
+    write_shard = write_shard or shards.__setitem__
+    thematiques = data.get('thematiques', [])
+    producteurs = data.get('producteurs') or []
+
+    index, orphans = index_producteurs(thematiques, producteurs)
+    used = set()
+    for position, theme in enumerate(thematiques):
+        ids = index.get(position)
+        if not ids:
+            theme.pop('producteurs', None)
+            continue
+        fonction, name = theme_fonction(theme), theme_name(theme)
+        slug = slugify(f"{fonction}-{name}") or str(position)
+        if slug in used:
+            slug = f"{slug}-{position}"
+        used.add(slug)
+        shard = {
+            "thematique": f"{fonction}/{name}",
+            "producteurs": [dict(producteurs[i], id=i) for i in ids]
+        }
+        empreinte = content_hash(shard)
+        write_shard(f"{slug}.{empreinte}.json", shard)
+        theme['producteurs'] = {
+            "total": len(ids),
+            "url": f"{SHARDS_URL}/{slug}.{empreinte}.json",
+            "empreinte": empreinte
+        }
+
+    data['producteurs'] = [dict(producteurs[i], id=i) for i in orphans]
+    return shards
+
+
+def orphan_summary(data, limit=10):
+    """
+    Thematiques inconnues des producteurs restes sans thematique, par nombre
+    de producteurs : "Administration generale (4), ...".
+    """
+    counts = Counter(theme_name(producteur) or '(vide)' for producteur in data.get('producteurs') or [])
+    shown = ', '.join(f"{name} ({count})" for name, count in counts.most_common(limit))
+    more = f", ... (+{len(counts) - limit})" if len(counts) > limit else ''
+    return shown + more
+
+
+def write_shard(rel_path, shard, shards_dir=SHARDS_DIR):
+    """Ecrit le fichier des producteurs d'une thematique."""
+    path = shards_dir / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(shard, f, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+def save_shards(data, shards_dir=SHARDS_DIR):
+    """
+    Ecrit les fichiers de producteurs de `data` (ceux d'une construction
+    precedente sont supprimes).
+
+    Returns:
+        Nombre de fichiers ecrits
+    """
+    shards_dir = Path(shards_dir)
+    if shards_dir.exists():
+        shutil.rmtree(shards_dir)
+    count = 0
+
+    def save(rel_path, shard):
+        nonlocal count
+        write_shard(rel_path, shard, shards_dir)
+        count += 1
+
+    shard_producteurs(data, write_shard=save)
+    return count
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Publication du site avec des noms de fichiers empreintes.
+
+Copie docs/ dans un dossier de publication (par defaut site/) en renommant
+les modules JS et le JSON de la visualisation avec l'empreinte de leur
+contenu (js/App.js -> js/App.<empreinte>.js). Les references dans
+index.html, les imports entre modules et l'URL par defaut de DataLoader
+sont reecrits en consequence, ainsi que l'URL du JSON dans
+data/manifest.json. Les pages d'inventaires, producteurs et fonds par
+serie (data/inventaires/, data/producteurs/, data/cotes/) sont deja
+nommes par la construction avec l'empreinte de leur contenu et copies
+tels quels. Tous ces fichiers peuvent etre servis avec un cache permanent
+(immutable), seuls index.html et data/manifest.json sont revalides.
+
+Les anciennes versions restent publiees pendant un delai de grace (une
+page ouverte avant la publication peut encore charger ses modules), puis
+sont supprimees. Le suivi est tenu dans asset-manifest.json.
+
+Usage:
+    python scripts/publish_site.py --output site --grace-days 7
+
+Auteur: Barbara Proenca
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import shutil
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+from instrumentation import RunMetrics, add_metrics_arguments
+
+# Chemins
+DOCS_DIR = PROJECT_ROOT / "docs"
+SITE_DIR = PROJECT_ROOT / "site"
+
+ASSET_MANIFEST_NAME = "asset-manifest.json"
+HEADERS_NAME = "_headers"
+
+# Fichiers renommes avec leur empreinte (relatifs a docs/)
+HASHED_DATA = ["data/archives.json"]
+HASHED_JS_GLOB = "js/*.js"
+
+# Dossiers des fichiers nommes par la construction avec leur empreinte
+CONTENT_ADDRESSED_DIRS = ["data/inventaires", "data/producteurs", "data/cotes"]
+
+DATA_MANIFEST = "data/manifest.json"
+
+HASH_LENGTH = 10
+DEFAULT_GRACE_DAYS = 7
+
+# import ... from './X.js', import('./X.js') et new URL('./X.js', ...) (workers)
+JS_IMPORT_RE = re.compile(
+    r"""(\bfrom\s*|\bimport\s*\(\s*|\bimport\s+|\bnew\s+URL\s*\(\s*)(['"])\./([\w.-]+\.js)\2""")
+
+
+def content_hash(content):
+    """Empreinte (sha256 tronque) d'un contenu binaire."""
+    return hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_path(rel_path, digest):
+    """data/archives.json -> data/archives.<empreinte>.json"""
+    path = Path(rel_path)
+    return path.with_name(f"{path.stem}.{digest}{path.suffix}").as_posix()
+
+
+def js_dependencies(text):
+    """Modules importes (noms de fichiers du meme dossier) par un module JS."""
+    return {match.group(3) for match in JS_IMPORT_RE.finditer(text)}
+
+
+def rewrite_js(text, mapping):
+    """Reecrit les imports relatifs et les chemins de donnees d'un module JS."""
+    def replace_import(match):
+        target = mapping.get(f"js/{match.group(3)}")
+        if target is None:
+            return match.group(0)
+        return f"{match.group(1)}{match.group(2)}./{Path(target).name}{match.group(2)}"
+
+    text = JS_IMPORT_RE.sub(replace_import, text)
+    for source in HASHED_DATA:
+        if source in mapping:
+            text = re.sub(rf"""(['"]){re.escape(source)}\1""",
+                          lambda m: f"{m.group(1)}{mapping[source]}{m.group(1)}", text)
+    return text
+
+
+def rewrite_html(text, mapping):
+    """Reecrit les attributs src/href de index.html pointant vers des fichiers empreintes."""
+    for source, target in mapping.items():
+        text = re.sub(rf"""((?:src|href)=)(['"]){re.escape(source)}\2""",
+                      lambda m: f"{m.group(1)}{m.group(2)}{target}{m.group(2)}", text)
+    return text
+
+
+def rewrite_manifest(text, mapping):
+    """Reecrit l'URL du JSON de la visualisation dans data/manifest.json."""
+    manifest = json.loads(text)
+    manifest['url'] = mapping.get(manifest.get('url'), manifest.get('url'))
+    return json.dumps(manifest, ensure_ascii=False, indent=2)
+
+
+def content_addressed_files(docs_dir):
+    """Fichiers (relatifs a docs/) deja nommes par l'empreinte de leur contenu."""
+    files = []
+    for rel_dir in CONTENT_ADDRESSED_DIRS:
+        files += sorted(path.relative_to(docs_dir).as_posix()
+                        for path in (docs_dir / rel_dir).rglob('*.json') if path.is_file())
+    return files
+
+
+def build_assets(docs_dir):
+    """
+    Calcule le contenu et le nom empreinte de chaque fichier renomme.
+
+    Un module est empreinte apres reecriture de ses imports : modifier
+    VirtualList.js change aussi l'empreinte de App.js qui l'importe.
+
+    Returns:
+        (mapping chemin source -> chemin empreinte, contenus par chemin empreinte)
+    """
+    mapping = {}
+    contents = {}
+
+    for rel in HASHED_DATA:
+        source = docs_dir / rel
+        if source.exists():
+            content = source.read_bytes()
+            mapping[rel] = hashed_path(rel, content_hash(content))
+            contents[mapping[rel]] = content
+
+    modules = {path.relative_to(docs_dir).as_posix(): path.read_text(encoding='utf-8')
+               for path in sorted(docs_dir.glob(HASHED_JS_GLOB))}
+
+    visiting = set()
+
+    def visit(rel):
+        if rel in mapping:
+            return
+        if rel in visiting:
+            raise ValueError(f"Import circulaire impliquant {rel}")
+        visiting.add(rel)
+        for dep in js_dependencies(modules[rel]):
+            if f"js/{dep}" in modules:
+                visit(f"js/{dep}")
+        visiting.discard(rel)
+
+        content = rewrite_js(modules[rel], mapping).encode('utf-8')
+        mapping[rel] = hashed_path(rel, content_hash(content))
+        contents[mapping[rel]] = content
+
+    for rel in modules:
+        visit(rel)
+
+    return mapping, contents
+
+
+def write_headers(site_dir, mapping):
+    """En-tetes de cache (format _headers de Netlify / Cloudflare Pages)."""
+    immutable = "  Cache-Control: public, max-age=31536000, immutable"
+    lines = ["/index.html", "  Cache-Control: no-cache", "",
+             f"/{DATA_MANIFEST}", "  Cache-Control: no-cache", ""]
+    for target in sorted(mapping.values()):
+        lines += [f"/{target}", immutable, ""]
+    for rel_dir in CONTENT_ADDRESSED_DIRS:
+        lines += [f"/{rel_dir}/*", immutable, ""]
+    (site_dir / HEADERS_NAME).write_text("\n".join(lines), encoding='utf-8')
+
+
+def publish_site(docs_dir=DOCS_DIR, site_dir=SITE_DIR, grace_days=DEFAULT_GRACE_DAYS, now=None):
+    """
+    Publie docs/ dans `site_dir`.
+
+    Returns:
+        Le manifeste des fichiers empreintes (asset-manifest.json)
+    """
+    docs_dir, site_dir = Path(docs_dir), Path(site_dir)
+    now = now or datetime.now()
+    site_dir.mkdir(parents=True, exist_ok=True)
+
+    previous = {}
+    manifest_path = site_dir / ASSET_MANIFEST_NAME
+    if manifest_path.exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+
+    mapping, contents = build_assets(docs_dir)
+    shards = content_addressed_files(docs_dir)
+    for rel in shards:
+        contents[rel] = (docs_dir / rel).read_bytes()
+
+    # Fichiers empreintes : ecrits une seule fois, jamais modifies
+    for target, content in contents.items():
+        path = site_dir / target
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+
+    # Dates de derniere publication, pour le delai de grace
+    last_published = dict(previous.get('files', {}))
+    for target in contents:
+        last_published[target] = now.isoformat(timespec='seconds')
+    expired = {target for target, date in last_published.items()
+               if now - datetime.fromisoformat(date) > timedelta(days=grace_days)}
+    for target in expired:
+        (site_dir / target).unlink(missing_ok=True)
+        del last_published[target]
+
+    # Autres fichiers copies tels quels, index.html et le manifeste reecrits
+    published = set(last_published) | {ASSET_MANIFEST_NAME, HEADERS_NAME}
+    for source in sorted(docs_dir.rglob('*')):
+        rel = source.relative_to(docs_dir).as_posix()
+        if not source.is_file() or rel in mapping or rel in contents:
+            continue
+        target = site_dir / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if rel == 'index.html':
+            target.write_text(rewrite_html(source.read_text(encoding='utf-8'), mapping),
+                              encoding='utf-8')
+        elif rel == DATA_MANIFEST:
+            target.write_text(rewrite_manifest(source.read_text(encoding='utf-8'), mapping),
+                              encoding='utf-8')
+        else:
+            shutil.copyfile(source, target)
+        published.add(rel)
+
+    # Nettoyage des fichiers qui ne sont plus publies (.git et autres fichiers caches exclus)
+    for path in sorted(site_dir.rglob('*'), reverse=True):
+        rel = path.relative_to(site_dir)
+        if rel.parts[0].startswith('.'):
+            continue
+        if path.is_file() and rel.as_posix() not in published:
+            path.unlink()
+        elif path.is_dir() and not any(path.iterdir()):
+            path.rmdir()
+
+    write_headers(site_dir, mapping)
+
+    asset_manifest = {
+        'generated_at': now.isoformat(timespec='seconds'),
+        'grace_days': grace_days,
+        'assets': mapping,
+        'data': shards,
+        'files': dict(sorted(last_published.items()))
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(asset_manifest, f, ensure_ascii=False, indent=2)
+
+    return asset_manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publication du site avec des fichiers empreintes")
+    parser.add_argument('--source', type=Path, default=DOCS_DIR,
+                        help="Dossier du site a publier (defaut: docs/)")
+    parser.add_argument('--output', type=Path, default=SITE_DIR,
+                        help="Dossier de publication (defaut: site/)")
+    parser.add_argument('--grace-days', type=float, default=DEFAULT_GRACE_DAYS,
+                        help="Duree de conservation des anciennes versions (jours)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics = RunMetrics.from_args('publish_site', args)
+
+    print(f"Publication de {args.source} dans {args.output}...")
+    with metrics.stage('publish_site'):
+        asset_manifest = publish_site(args.source, args.output, args.grace_days)
+
+    current = set(asset_manifest['assets'].values()) | set(asset_manifest['data'])
+    kept = [f for f in asset_manifest['files'] if f not in current]
+    metrics.count('assets', len(current))
+    metrics.count('kept', len(kept))
+
+    for source, target in asset_manifest['assets'].items():
+        print(f"  {source:28} -> {target}")
+    print(f"  {len(asset_manifest['data'])} fichiers de donnees deja empreintes "
+          f"({', '.join(CONTENT_ADDRESSED_DIRS)})")
+    print(f"  {len(kept)} ancienne(s) version(s) conservee(s) ({args.grace_days:g} jours de grace)")
+
+    metrics.finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,24 +7,36 @@ Auteur: Barbara Proenca
 Source: https://www.archives13.fr/archive/recherche/fonds/n:93
 """
 
-import requests
-from bs4 import BeautifulSoup
-import json
+import argparse
+import os
+import queue
+import threading
 import time
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime
-import urllib3
 
-# Desactiver les avertissements SSL (le site AD13 a parfois des problemes de certificat)
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from ad13_paths import PROJECT_ROOT
+from instrumentation import METRICS_DIR, NULL_METRICS, RunMetrics, add_metrics_arguments
+from history_store import HISTORY_DIR, append_extraction
+from json_stream import JsonArrayWriter
+
+# requests, bs4 et urllib3 sont importes dans les fonctions qui les utilisent,
+# pour que l'import du module (categorize_fonds...) reste instantane.
 
 # Configuration
 BASE_URL = "https://www.archives13.fr"
 SEARCH_URL = f"{BASE_URL}/archive/resultats/fonds/fonds/n:93"
 ITEMS_PER_PAGE = 100  # Maximum autorise par le site
-OUTPUT_DIR = Path(__file__).parent.parent / "data"
+OUTPUT_DIR = PROJECT_ROOT / "data"
 DELAY_BETWEEN_REQUESTS = 1  # Secondes entre chaque requete (respect du serveur)
+MAX_RETRIES = 3  # Nouvelles tentatives sur erreur reseau ou 5xx
+RETRY_BACKOFF = 2  # Secondes, doublees a chaque tentative
+TELEMETRY_PATH = METRICS_DIR / "crawl_telemetry.json"
+MAX_PAGES = 50  # Securite
+FETCH_QUEUE_SIZE = 4  # Pages telechargees en avance sur l'analyse (contre-pression)
 
 # Headers pour simuler un navigateur
 HEADERS = {
@@ -34,22 +46,87 @@ HEADERS = {
 }
 
 
-def get_page(page_num: int) -> str:
-    """Recupere le contenu HTML d'une page de resultats."""
-    url = f"{SEARCH_URL}/page:{page_num}/pagination:{ITEMS_PER_PAGE}?Rech_mode=and&type=fonds"
-    print(f"  Telechargement page {page_num}...")
-    
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=30, verify=False)
-        response.raise_for_status()
+_session = None
+
+
+def create_session(pool_maxsize=10):
+    """Cree une session HTTP (connexions persistantes et chronometrees)."""
+    import urllib3
+    from crawl_telemetry import create_timed_session
+    
+    # Desactiver les avertissements SSL (le site AD13 a parfois des problemes de certificat)
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    session = create_timed_session(pool_maxsize)
+    session.headers.update(HEADERS)
+    return session
+
+
+def get_session():
+    """Session HTTP partagee du site AD13."""
+    global _session
+    if _session is None:
+        _session = create_session()
+    return _session
+
+
+def get_page(page_num: int, metrics=None, telemetry=None, search_url=SEARCH_URL,
+             session=None, key=None) -> str:
+    """
+    Recupere le contenu HTML d'une page de resultats.
+    
+    Les erreurs reseau et les reponses 5xx sont retentees MAX_RETRIES fois.
+    Si `telemetry` est fourni, la requete y est enregistree sous la cle
+    `key` (par defaut `page_num`) : latences, taille, statut, tentatives.
+    `search_url` et `session` permettent d'interroger un autre portail.
+    """
+    import requests
+    from crawl_telemetry import get_connection_timings, reset_connection_timings
+    
+    metrics = metrics or NULL_METRICS
+    session = session or get_session()
+    key = page_num if key is None else key
+    url = f"{search_url}/page:{page_num}/pagination:{ITEMS_PER_PAGE}?Rech_mode=and&type=fonds"
+    print(f"  Telechargement page {key}...")
+    
+    for attempt in range(MAX_RETRIES + 1):
+        reset_connection_timings()
+        start = time.perf_counter()
+        response = None
+        try:
+            with metrics.stage('fetch'):
+                response = session.get(url, timeout=30, verify=False)
+                response.raise_for_status()
+        except requests.RequestException as e:
+            total = time.perf_counter() - start
+            status = response.status_code if response is not None else None
+            retryable = status is None or status >= 500
+            if retryable and attempt < MAX_RETRIES:
+                metrics.count('fetch_retries')
+                time.sleep(RETRY_BACKOFF * 2 ** attempt)
+                continue
+            
+            metrics.count('fetch_errors')
+            if telemetry is not None:
+                telemetry.record_request(
+                    key, url, status, len(response.content) if response is not None else 0,
+                    attempt, total, error=str(e), **get_connection_timings())
+            print(f"  Erreur lors du telechargement de la page {key}: {e}")
+            return None
+        
+        total = time.perf_counter() - start
+        metrics.count('pages_fetched')
+        metrics.count('bytes_fetched', len(response.content))
+        if telemetry is not None:
+            telemetry.record_request(
+                key, url, response.status_code, len(response.content), attempt, total,
+                ttfb_s=response.elapsed.total_seconds(), **get_connection_timings())
         return response.text
-    except requests.RequestException as e:
-        print(f"  Erreur lors du telechargement de la page {page_num}: {e}")
-        return None
 
 
 def parse_fonds_list(html: str) -> list:
     """Parse la liste des fonds depuis le HTML."""
+    from bs4 import BeautifulSoup
+    
     soup = BeautifulSoup(html, 'html.parser')
     fonds_list = []
     
@@ -126,8 +203,12 @@ def parse_fonds_from_text(text: str) -> list:
     return fonds_list
 
 
-def extract_fonds_from_soup(soup: BeautifulSoup) -> list:
-    """Extrait les fonds depuis le BeautifulSoup en utilisant la table de resultats."""
+def extract_fonds_from_soup(soup: 'BeautifulSoup', base_url=BASE_URL, fonds_prefix='FRAD013') -> list:
+    """
+    Extrait les fonds depuis le BeautifulSoup en utilisant la table de resultats.
+    `base_url` et `fonds_prefix` (identifiant des fonds dans les liens,
+    FRAD013 pour les AD13) dependent du portail.
+    """
     fonds_list = []
     
     # Chercher la table des resultats
@@ -151,13 +232,13 @@ def extract_fonds_from_soup(soup: BeautifulSoup) -> list:
         nb_notices = int(nb_notices_text) if nb_notices_text.isdigit() else 0
         
         # Troisieme cellule: Lien
-        link = cells[2].find('a', href=re.compile(r'/archive/fonds/FRAD013'))
+        link = cells[2].find('a', href=re.compile(rf'/archive/fonds/{re.escape(fonds_prefix)}'))
         fonds_url = ''
         fonds_id = ''
         if link:
             href = link.get('href', '')
-            fonds_url = f"{BASE_URL}{href}"
-            fonds_id_match = re.search(r'FRAD013_(\d+)', href)
+            fonds_url = f"{base_url}{href}"
+            fonds_id_match = re.search(rf'{re.escape(fonds_prefix)}_(\d+)', href)
             if fonds_id_match:
                 fonds_id = fonds_id_match.group(1)
         
@@ -266,72 +347,187 @@ def categorize_fonds(fonds: dict) -> str:
     return "ARCHIVES MODERNES ET CONTEMPORAINES"
 
 
-def scrape_all_fonds() -> list:
-    """Scrape tous les fonds depuis le moteur de recherche."""
+def parse_results_page(html: str, base_url=BASE_URL, fonds_prefix='FRAD013') -> dict:
+    """
+    Analyse une page de resultats (execute dans un processus de travail).
+    
+    Ne renvoie que des donnees compactes : les fonds extraits, la presence
+    d'une page suivante et le temps d'analyse.
+    """
+    from bs4 import BeautifulSoup
+    
+    start = time.perf_counter()
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Extraire les fonds de cette page
+    fonds = extract_fonds_from_soup(soup, base_url, fonds_prefix)
+    text_fallback = False
+    
+    if not fonds:
+        # Essayer avec le parsing de texte
+        text = soup.get_text()
+        fonds = parse_fonds_from_text(text)
+        text_fallback = True
+    
+    return {
+        'fonds': fonds,
+        'has_next': soup.find('a', string='>') is not None,
+        'text_fallback': text_fallback,
+        'parse_s': time.perf_counter() - start
+    }
+
+
+def fetch_pages(pages_queue, stop, metrics, telemetry):
+    """
+    Etape de telechargement (thread) : place (numero, html) dans la file
+    bornee, qui bloque quand l'analyse prend du retard. Termine par None.
+    """
+    try:
+        for page in range(1, MAX_PAGES + 1):
+            if stop.is_set():
+                break
+            html = get_page(page, metrics, telemetry)
+            if not html:
+                break
+            pages_queue.put((page, html))
+            with metrics.stage('delay'):
+                time.sleep(DELAY_BETWEEN_REQUESTS)
+    finally:
+        pages_queue.put(None)
+
+
+def scrape_all_fonds(metrics=None, telemetry=None, parse_workers=None) -> list:
+    """
+    Scrape tous les fonds depuis le moteur de recherche.
+    
+    Le telechargement (limite par le reseau) tourne dans un thread et
+    alimente une file bornee ; l'analyse HTML (limitee par le CPU) est
+    repartie sur un pool de processus. Les pages sont traitees dans l'ordre
+    et l'extraction s'arrete a la derniere page ou a la premiere page vide.
+    
+    Args:
+        metrics: Mesures de l'execution (RunMetrics), optionnel
+        telemetry: Telemetrie des requetes (CrawlTelemetry), optionnel
+        parse_workers: Nombre de processus d'analyse (defaut: nombre de
+            coeurs ; 0 pour analyser dans le processus principal)
+    """
+    metrics = metrics or NULL_METRICS
+    if parse_workers is None:
+        parse_workers = os.cpu_count() or 1
     all_fonds = []
-    page = 1
-    max_pages = 50  # Securite
     
     print("Demarrage de l'extraction des inventaires AD13...")
     print(f"URL de base: {SEARCH_URL}")
+    print(f"Analyse: {parse_workers or 'aucun'} processus de travail")
     print()
     
-    while page <= max_pages:
-        html = get_page(page)
-        if not html:
-            break
-        
-        soup = BeautifulSoup(html, 'html.parser')
+    pages_queue = queue.Queue(maxsize=FETCH_QUEUE_SIZE)
+    stop = threading.Event()
+    fetcher = threading.Thread(target=fetch_pages, args=(pages_queue, stop, metrics, telemetry),
+                               daemon=True)
+    pool = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers else None
+    pending = deque()
+    
+    def handle(page, result):
+        """Integre le resultat d'une page, retourne False pour arreter."""
+        metrics.add_time('parse', result['parse_s'])
+        if result['text_fallback']:
+            metrics.count('text_fallbacks')
+        fonds = result['fonds']
         
-        # Extraire les fonds de cette page
-        fonds = extract_fonds_from_soup(soup)
-        
-        if not fonds:
-            # Essayer avec le parsing de texte
-            text = soup.get_text()
-            fonds = parse_fonds_from_text(text)
+        if telemetry is not None:
+            telemetry.record_parse(page, result['parse_s'], len(fonds))
+            print(telemetry.summary_line())
         
         if not fonds:
             print(f"  Aucun fonds trouve sur la page {page}, arret.")
-            break
+            return False
         
         print(f"  Page {page}: {len(fonds)} fonds extraits")
+        metrics.count('fonds_extracted', len(fonds))
         all_fonds.extend(fonds)
         
         # Verifier s'il y a une page suivante
-        next_link = soup.find('a', string='>')
-        if not next_link:
+        if not result['has_next']:
             print("  Derniere page atteinte.")
-            break
+            return False
+        return True
+    
+    def drain(limit):
+        """
+        Traite dans l'ordre les pages dont l'analyse est terminee, en
+        attendant tant que plus de `limit` analyses sont en cours.
+        """
+        while pending and not stop.is_set() and (len(pending) > limit or pending[0][1].done()):
+            page, future = pending.popleft()
+            if not handle(page, future.result()):
+                stop.set()
+    
+    fetcher.start()
+    try:
+        while True:
+            item = pages_queue.get()
+            if item is None:
+                break
+            if stop.is_set():
+                # Pages telechargees au-dela de la derniere : ignorees
+                continue
+            
+            page, html = item
+            if pool is None:
+                if not handle(page, parse_results_page(html)):
+                    stop.set()
+                continue
+            
+            pending.append((page, pool.submit(parse_results_page, html)))
+            # Limiter le nombre d'analyses en cours
+            drain(limit=parse_workers * 2)
         
-        page += 1
-        time.sleep(DELAY_BETWEEN_REQUESTS)
+        drain(limit=0)
+    finally:
+        stop.set()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        # Debloquer le thread de telechargement s'il attend de la place dans la file
+        while fetcher.is_alive():
+            try:
+                pages_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
     
     return all_fonds
 
 
-def save_results(fonds_list: list):
+def save_results(fonds_list: list, metrics=None):
     """Sauvegarde les resultats en JSON et resume."""
+    metrics = metrics or NULL_METRICS
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     
     # Ajouter la categorie a chaque fonds
-    for fonds in fonds_list:
-        fonds['categorie'] = categorize_fonds(fonds)
+    with metrics.stage('categorize'):
+        for fonds in fonds_list:
+            fonds['categorie'] = categorize_fonds(fonds)
     
-    # Sauvegarder en JSON
+    # Sauvegarder en JSON, fonds par fonds
     json_path = OUTPUT_DIR / "inventaires_ad13.json"
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump({
-            'metadata': {
-                'source': 'https://www.archives13.fr/archive/recherche/fonds/n:93',
-                'date_extraction': datetime.now().isoformat(),
-                'total_fonds': len(fonds_list)
-            },
-            'fonds': fonds_list
-        }, f, ensure_ascii=False, indent=2)
+    with metrics.stage('write_json'):
+        metadata = {
+            'source': 'https://www.archives13.fr/archive/recherche/fonds/n:93',
+            'date_extraction': datetime.now().isoformat(),
+            'total_fonds': len(fonds_list)
+        }
+        with JsonArrayWriter(json_path, 'fonds', {'metadata': metadata}) as writer:
+            for fonds in fonds_list:
+                writer.write(fonds)
     
     print(f"\nResultats sauvegardes dans: {json_path}")
     
+    # Ajouter l'extraction a l'historique (le JSON ne garde que la derniere)
+    with metrics.stage('append_history'):
+        partition = append_extraction(fonds_list, metadata['date_extraction'])
+    if partition:
+        print(f"Extraction ajoutee a l'historique: {HISTORY_DIR / partition}")
+    
     # Statistiques par categorie
     stats = {}
     for fonds in fonds_list:
@@ -349,25 +545,44 @@ def save_results(fonds_list: list):
     return json_path
 
 
-def main():
+def main(argv=None):
     """Point d'entree principal."""
+    from crawl_telemetry import CrawlTelemetry
+    
+    parser = argparse.ArgumentParser(description="Extraction des inventaires AD13")
+    parser.add_argument('--telemetry', type=Path, default=TELEMETRY_PATH,
+                        help="Fichier JSON de la telemetrie des requetes")
+    parser.add_argument('--parse-workers', type=int, default=None,
+                        help="Processus d'analyse HTML (defaut: nombre de coeurs, 0: aucun)")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics = RunMetrics.from_args('scrape_ad13_inventaires', args)
+    telemetry = CrawlTelemetry()
+    
     print("=" * 60)
     print("Extraction des inventaires AD13")
     print("=" * 60)
     print()
     
     # Scraper les fonds
-    fonds_list = scrape_all_fonds()
+    with metrics.stage('scrape'):
+        fonds_list = scrape_all_fonds(metrics, telemetry, args.parse_workers)
+    
+    telemetry.save(args.telemetry)
+    metrics.set('crawl', {key: value for key, value in telemetry.summary().items() if key != 'latency'})
+    print(f"Telemetrie des requetes: {args.telemetry}")
     
     if not fonds_list:
         print("Aucun fonds extrait. Verifiez la connexion et la structure du site.")
+        metrics.finish()
         return
     
     print(f"\nTotal: {len(fonds_list)} fonds extraits")
     
     # Sauvegarder
-    save_results(fonds_list)
+    save_results(fonds_list, metrics)
     
+    metrics.finish()
     print("\nExtraction terminee!")
 
 
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Extraction des inventaires de plusieurs portails Ligeo Archives.
+
+Les sites du registre (voir ligeo_sites.py) sont moissonnes en parallele
+par un pool de threads commun. La politesse est appliquee par hote : chaque
+hote a sa propre session (et son pool de connexions), un delai minimal
+entre deux requetes et un nombre maximal de requetes simultanees. Un site
+lent ne retarde donc pas les autres : la duree totale est proche de celle
+du site le plus long, et non de la somme des sites.
+
+Les pages d'un meme site sont demandees dans l'ordre, jusqu'a
+`max_connections` pages en avance ; les pages recuperees au-dela de la
+derniere sont ignorees. L'analyse HTML est repartie sur un pool de
+processus, comme dans scrape_ad13_inventaires.py.
+
+Les fonds sont enregistres dans un fichier unique, chacun etiquete avec la
+cle de son site.
+
+Usage:
+    python scripts/scrape_ligeo_sites.py --sites ad13 ad06 --sites-file data/sites.json
+
+Auteur: Barbara Proenca
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+from instrumentation import METRICS_DIR, NULL_METRICS, RunMetrics, add_metrics_arguments
+from ligeo_sites import get_sites
+from scrape_ad13_inventaires import categorize_fonds, create_session, get_page, parse_results_page
+
+OUTPUT_PATH = PROJECT_ROOT / "data" / "inventaires_sites.json"
+TELEMETRY_PATH = METRICS_DIR / "crawl_telemetry_sites.json"
+
+
+class HostLimiter:
+    """
+    Politesse envers un hote : delai minimal entre le debut de deux
+    requetes et nombre maximal de requetes simultanees.
+    """
+
+    def __init__(self, delay, max_connections):
+        self.delay = delay
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    def acquire(self):
+        """Attend un creneau ; retourne le temps d'attente (secondes)."""
+        start = time.perf_counter()
+        self.slots.acquire()
+        with self._lock:
+            now = time.perf_counter()
+            slot = max(now, self._next_start)
+            self._next_start = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+        return time.perf_counter() - start
+
+    def release(self):
+        self.slots.release()
+
+
+class SiteCrawl:
+    """Etat du moissonnage d'un site : pages demandees, resultats, fin."""
+
+    def __init__(self, site):
+        self.site = site
+        self.next_page = 1
+        self.in_flight = 0
+        self.last_page = None
+        self.results = {}
+
+    @property
+    def done(self):
+        return self.last_page is not None or self.next_page > self.site['max_pages']
+
+    def finish(self, page):
+        """La page `page` est la derniere (ou la premiere en echec)."""
+        if self.last_page is None or page < self.last_page:
+            self.last_page = page
+
+    def fonds(self):
+        """Fonds des pages consecutives depuis la premiere, dans l'ordre."""
+        fonds = []
+        page = 1
+        while page in self.results and (self.last_page is None or page <= self.last_page):
+            result = self.results[page]
+            if result is None:
+                break
+            fonds.extend(result['fonds'])
+            page += 1
+        return fonds
+
+
+def crawl_page(site, page, session, limiter, pool, metrics, telemetry):
+    """Telecharge et analyse une page d'un site (execute dans un thread du pool)."""
+    with metrics.stage('delay'):
+        limiter.acquire()
+    try:
+        html = get_page(page, metrics, telemetry, search_url=site['search_url'],
+                        session=session, key=f"{site['key']}:{page}")
+    finally:
+        limiter.release()
+    if not html:
+        return None
+
+    args = (html, site['base_url'], site['fonds_prefix'])
+    return pool.submit(parse_results_page, *args).result() if pool else parse_results_page(*args)
+
+
+def scrape_sites(sites, metrics=None, telemetry=None, workers=None, parse_workers=None) -> dict:
+    """
+    Moissonne plusieurs sites en parallele.
+
+    Args:
+        sites: Sites du registre (ligeo_sites.get_sites)
+        metrics: Mesures de l'execution (RunMetrics), optionnel
+        telemetry: Telemetrie des requetes (CrawlTelemetry), optionnel ;
+            les cles des requetes sont de la forme "<site>:<page>"
+        workers: Threads de telechargement (defaut: somme des connexions
+            autorisees par site)
+        parse_workers: Processus d'analyse (defaut: nombre de coeurs ; 0
+            pour analyser dans les threads de telechargement)
+
+    Returns:
+        Dictionnaire cle du site -> liste des fonds extraits
+    """
+    metrics = metrics or NULL_METRICS
+    if parse_workers is None:
+        parse_workers = os.cpu_count() or 1
+    workers = workers or sum(site['max_connections'] for site in sites)
+
+    crawls = {site['key']: SiteCrawl(site) for site in sites}
+    # Une session et un limiteur par hote (plusieurs sites peuvent partager un hote)
+    sessions = {}
+    limiters = {}
+    for site in sites:
+        if site['host'] not in sessions:
+            sessions[site['host']] = create_session(site['max_connections'])
+            limiters[site['host']] = HostLimiter(site['delay'], site['max_connections'])
+
+    print(f"Sites: {', '.join(crawls)} ({workers} threads, "
+          f"analyse: {parse_workers or 'aucun'} processus)")
+
+    pool = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers else None
+    executor = ThreadPoolExecutor(max_workers=workers)
+    in_flight = {}
+
+    def schedule(crawl):
+        site = crawl.site
+        while not crawl.done and crawl.in_flight < site['max_connections']:
+            page = crawl.next_page
+            future = executor.submit(crawl_page, site, page, sessions[site['host']],
+                                     limiters[site['host']], pool, metrics, telemetry)
+            in_flight[future] = (crawl, page)
+            crawl.next_page += 1
+            crawl.in_flight += 1
+
+    try:
+        for crawl in crawls.values():
+            schedule(crawl)
+
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                crawl, page = in_flight.pop(future)
+                crawl.in_flight -= 1
+                key = crawl.site['key']
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"  [{key}] Erreur sur la page {page}: {e}")
+                    result = None
+                crawl.results[page] = result
+
+                if result is None:
+                    crawl.finish(page)
+                elif crawl.last_page is None or page <= crawl.last_page:
+                    metrics.add_time('parse', result['parse_s'])
+                    if result['text_fallback']:
+                        metrics.count('text_fallbacks')
+                    if telemetry is not None:
+                        telemetry.record_parse(f"{key}:{page}", result['parse_s'], len(result['fonds']))
+                        print(f"  [{key}]" + telemetry.summary_line(f"{key}:"))
+                    if not result['fonds']:
+                        print(f"  [{key}] Aucun fonds trouve sur la page {page}, arret.")
+                        crawl.finish(page)
+                    else:
+                        print(f"  [{key}] Page {page}: {len(result['fonds'])} fonds extraits")
+                        metrics.count('fonds_extracted', len(result['fonds']))
+                        if not result['has_next']:
+                            print(f"  [{key}] Derniere page atteinte.")
+                            crawl.finish(page)
+                schedule(crawl)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    return {key: crawl.fonds() for key, crawl in crawls.items()}
+
+
+def categorize_site_fonds(fonds, site):
+    """Categorie d'un fonds : categories propres au site, sinon categorize_fonds."""
+    if site['categories']:
+        serie_match = re.search(r'(\d+\s+)?([A-Z]+)', fonds.get('cote', '').upper())
+        serie = serie_match.group(2) if serie_match else ''
+        if serie in site['categories']:
+            return site['categories'][serie]
+    return categorize_fonds(fonds)
+
+
+def save_results(fonds_by_site, sites, output_path=OUTPUT_PATH, metrics=None):
+    """Sauvegarde les fonds de tous les sites, etiquetes par site, en JSON."""
+    metrics = metrics or NULL_METRICS
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    all_fonds = []
+    with metrics.stage('categorize'):
+        for site in sites:
+            for fonds in fonds_by_site.get(site['key'], []):
+                fonds['site'] = site['key']
+                fonds['categorie'] = categorize_site_fonds(fonds, site)
+                all_fonds.append(fonds)
+
+    with metrics.stage('write_json'):
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'metadata': {
+                    'date_extraction': datetime.now().isoformat(),
+                    'total_fonds': len(all_fonds),
+                    'sites': {
+                        site['key']: {
+                            'nom': site['nom'],
+                            'source': site['search_url'],
+                            'total_fonds': len(fonds_by_site.get(site['key'], []))
+                        }
+                        for site in sites
+                    }
+                },
+                'fonds': all_fonds
+            }, f, ensure_ascii=False, indent=2)
+
+    print(f"\nResultats sauvegardes dans: {output_path}")
+    print("\nFonds par site:")
+    print("-" * 60)
+    for site in sites:
+        fonds = fonds_by_site.get(site['key'], [])
+        notices = sum(f.get('nb_notices', 0) for f in fonds)
+        print(f"  {site['key']} ({site['nom']}): {len(fonds)} fonds, {notices} notices")
+
+    return output_path
+
+
+def main(argv=None):
+    """Point d'entree principal."""
+    from crawl_telemetry import CrawlTelemetry
+
+    parser = argparse.ArgumentParser(description="Extraction des inventaires de portails Ligeo Archives")
+    parser.add_argument('--sites', nargs='*', default=None,
+                        help="Cles des sites a moissonner (defaut: tous les sites du registre)")
+    parser.add_argument('--sites-file', type=Path, default=None,
+                        help="Fichier JSON des sites supplementaires (defaut: data/sites.json)")
+    parser.add_argument('--output', type=Path, default=OUTPUT_PATH,
+                        help="Fichier JSON de sortie")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Threads de telechargement (defaut: somme des connexions par site)")
+    parser.add_argument('--parse-workers', type=int, default=None,
+                        help="Processus d'analyse HTML (defaut: nombre de coeurs, 0: aucun)")
+    parser.add_argument('--telemetry', type=Path, default=TELEMETRY_PATH,
+                        help="Fichier JSON de la telemetrie des requetes")
+    add_metrics_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics = RunMetrics.from_args('scrape_ligeo_sites', args)
+    telemetry = CrawlTelemetry()
+
+    sites = get_sites(args.sites, args.sites_file)
+
+    print("=" * 60)
+    print("Extraction des inventaires des portails Ligeo")
+    print("=" * 60)
+    for site in sites:
+        print(f"  {site['key']}: {site['search_url']} "
+              f"(delai {site['delay']:g}s, {site['max_connections']} connexion(s))")
+    print()
+
+    with metrics.stage('scrape'):
+        fonds_by_site = scrape_sites(sites, metrics, telemetry, args.workers, args.parse_workers)
+
+    telemetry.save(args.telemetry)
+    metrics.set('crawl', {
+        site['key']: {key: value for key, value in telemetry.summary(f"{site['key']}:").items()
+                      if key != 'latency'}
+        for site in sites
+    })
+    print(f"Telemetrie des requetes: {args.telemetry}")
+
+    if not any(fonds_by_site.values()):
+        print("Aucun fonds extrait. Verifiez la connexion et la structure des sites.")
+        metrics.finish()
+        return
+
+    save_results(fonds_by_site, sites, args.output, metrics)
+
+    metrics.finish()
+    print("\nExtraction terminee!")
+
+
+if __name__ == "__main__":
+    main()
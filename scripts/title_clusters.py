@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""
+Sous-thematiques des grandes series, par regroupement des titres des fonds.
+
+Les series qui comptent beaucoup d'inventaires (W, J...) forment une seule
+thematique plate. A la construction, les titres de ces series sont
+regroupes en sous-thematiques nommees par leurs mots principaux :
+
+1. chaque titre devient un vecteur TF-IDF creux (dictionnaire {mot: poids},
+   norme 1) : mots sans accents, hors mots vides, presents dans au moins
+   deux titres et dans au plus la moitie d'entre eux ;
+2. les vecteurs sont regroupes par k-means spherique en mini-lots (Sculley,
+   2010) : a chaque iteration, un lot tire au hasard est affecte aux centres
+   les plus proches, puis chaque centre se deplace vers la moyenne de son lot
+   avec un pas 1/(titres deja vus). Les centres ne gardent que leurs
+   MAX_CENTROID_TERMS mots les plus lourds, et l'affectation passe par un
+   index inverse mot -> centres : un titre de dix mots coute quelques
+   dizaines d'operations, quel que soit le vocabulaire ;
+3. chaque groupe est nomme par ses deux mots les plus lourds (forme
+   accentuee la plus frequente) ; les titres sans mot connu vont dans
+   "Autres".
+
+Le modele est appris sur un echantillon de taille bornee des titres de la
+serie (TitleSample, echantillonnage par reservoir pendant la lecture des
+inventaires), puis chaque inventaire est affecte au moment de l'ecriture
+des pages : la memoire reste bornee quel que soit le nombre de fonds, et
+100 000 titres sont traites en quelques secondes. Le tirage est fixe
+(SEED) : deux constructions des memes donnees donnent les memes groupes.
+
+Usage:
+    python scripts/title_clusters.py              # groupes des grandes series
+    python scripts/title_clusters.py --serie W
+
+Auteur: Barbara Proenca
+"""
+
+import argparse
+import math
+import random
+import re
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+from json_stream import iter_records
+
+# Chemins
+INVENTAIRES_PATH = PROJECT_ROOT / "data" / "inventaires_ad13.json"
+
+# Series decoupees en sous-thematiques (nombre d'inventaires minimal)
+MIN_INVENTAIRES = 100
+
+# Nombre de groupes : racine de (inventaires / INVENTAIRES_PAR_GROUPE), borne
+INVENTAIRES_PAR_GROUPE = 12
+MIN_CLUSTERS = 2
+MAX_CLUSTERS = 12
+
+# Titres retenus par serie pour l'apprentissage
+SAMPLE_SIZE = 5000
+
+# k-means en mini-lots
+BATCH_SIZE = 256
+ITERATIONS = 100
+MAX_CENTROID_TERMS = 64
+SEED = 13
+
+# Vocabulaire : mots presents dans au moins MIN_DF titres, au plus MAX_DF des titres
+MIN_DF = 2
+MAX_DF = 0.5
+MIN_WORD_LENGTH = 3
+
+# Mots du nom d'un groupe
+NAME_TERMS = 2
+
+OTHERS_NAME = "Autres"
+
+WORD_RE = re.compile(r"[^\W\d_]+")
+
+# Mots vides du francais (sans accents) et mots trop generaux des titres d'inventaires
+STOP_WORDS = frozenset("""
+    les des une aux par pour sur dans avec sans sous entre vers chez puis
+    leur leurs son ses sa mon mes ton tes nos vos notre votre
+    qui que quoi dont est sont ete etre avoir fait
+    cet cette ces ceux celle celles lui elle elles eux nous vous ils
+    plus moins tres tout tous toute toutes autre autres meme
+    non pas ainsi aussi mais donc car
+    fonds archives archive dossiers dossier documents document pieces
+    divers diverses versement versements service services direction
+    departement departemental departementale departementaux
+    bouches rhone
+""".split())
+
+
+def fold(word):
+    """Mot en minuscules, sans accents."""
+    return unicodedata.normalize('NFKD', word).encode('ascii', 'ignore').decode('ascii').lower()
+
+
+def words(titre):
+    """Mots d'un titre : (forme sans accents en minuscules, forme d'origine)."""
+    for word in WORD_RE.findall(str(titre or '')):
+        folded = fold(word)
+        if len(folded) >= MIN_WORD_LENGTH and folded not in STOP_WORDS:
+            yield folded, word
+
+
+def cluster_count(nb_inventaires):
+    """Nombre de groupes d'une serie de `nb_inventaires` inventaires."""
+    k = round(math.sqrt(nb_inventaires / INVENTAIRES_PAR_GROUPE))
+    return max(MIN_CLUSTERS, min(MAX_CLUSTERS, k))
+
+
+def normalize(vector):
+    """Vecteur creux de norme 1 (vide s'il est nul)."""
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if not norm:
+        return {}
+    return {term: w / norm for term, w in vector.items()}
+
+
+def truncate(vector, size=MAX_CENTROID_TERMS):
+    """Les `size` composantes les plus lourdes d'un vecteur, renormalisees."""
+    if len(vector) > size:
+        vector = dict(sorted(vector.items(), key=lambda item: item[1], reverse=True)[:size])
+    return normalize(vector)
+
+
+def centroid_index(centroids):
+    """Index inverse {mot: [(centre, poids)]} des centres."""
+    index = defaultdict(list)
+    for c, centroid in enumerate(centroids):
+        for term, w in centroid.items():
+            index[term].append((c, w))
+    return index
+
+
+def nearest(vector, index, k):
+    """Centre le plus proche (cosinus) ; None si aucun mot n'est partage."""
+    scores = [0.0] * k
+    for term, w in vector.items():
+        for c, cw in index.get(term, ()):
+            scores[c] += w * cw
+    best = max(range(k), key=scores.__getitem__)
+    return best if scores[best] > 0 else None
+
+
+def tfidf(counts, idf):
+    """Vecteur TF-IDF norme d'un comptage de mots (mots hors vocabulaire ignores)."""
+    return normalize({term: (1 + math.log(tf)) * idf[term]
+                      for term, tf in counts.items() if term in idf})
+
+
+def kmeans_plus_plus(vectors, k, rng):
+    """Centres initiaux (k-means++ sur la distance cosinus)."""
+    centroids = [dict(rng.choice(vectors))]
+    distances = [1.0] * len(vectors)
+    while len(centroids) < k:
+        last = centroids[-1]
+        for i, vector in enumerate(vectors):
+            similarity = sum(w * last.get(term, 0.0) for term, w in vector.items())
+            distances[i] = min(distances[i], 1.0 - similarity)
+        total = sum(distances)
+        if total <= 0:
+            break
+        target = rng.random() * total
+        for i, distance in enumerate(distances):
+            target -= distance
+            if target <= 0:
+                break
+        centroids.append(dict(vectors[i]))
+    return centroids
+
+
+def mini_batch_kmeans(vectors, k, batch_size=BATCH_SIZE, iterations=ITERATIONS, seed=SEED):
+    """
+    k-means spherique en mini-lots sur des vecteurs creux non vides.
+
+    Returns:
+        Liste des centres (vecteurs creux de norme 1, au plus k)
+    """
+    rng = random.Random(seed)
+    if not vectors:
+        return []
+    centroids = kmeans_plus_plus(vectors, min(k, len(vectors)), rng)
+    k = len(centroids)
+    seen = [0] * k
+
+    for _ in range(iterations):
+        index = centroid_index(centroids)
+        batch = rng.sample(vectors, min(batch_size, len(vectors)))
+        sums = [defaultdict(float) for _ in range(k)]
+        sizes = [0] * k
+        for vector in batch:
+            c = nearest(vector, index, k)
+            if c is None:
+                continue
+            sizes[c] += 1
+            for term, w in vector.items():
+                sums[c][term] += w
+        # Chaque centre avance vers la moyenne de son lot, pas 1/(titres vus)
+        for c in range(k):
+            if not sizes[c]:
+                continue
+            seen[c] += sizes[c]
+            rate = sizes[c] / seen[c]
+            moved = {term: w * (1 - rate) for term, w in centroids[c].items()}
+            for term, w in sums[c].items():
+                moved[term] = moved.get(term, 0.0) + rate * w / sizes[c]
+            centroids[c] = truncate(moved)
+    return centroids
+
+
+class TitleSample:
+    """Echantillon uniforme de taille bornee d'un flux de titres (reservoir)."""
+
+    def __init__(self, size=SAMPLE_SIZE, seed=SEED):
+        self.size = size
+        self.rng = random.Random(seed)
+        self.count = 0
+        self.titres = []
+
+    def add(self, titre):
+        self.count += 1
+        if len(self.titres) < self.size:
+            self.titres.append(titre)
+        else:
+            j = self.rng.randrange(self.count)
+            if j < self.size:
+                self.titres[j] = titre
+
+
+class TitleClusters:
+    """
+    Groupes de titres appris sur un echantillon : vocabulaire (idf), centres
+    et noms. `predict` affecte un titre quelconque a un groupe.
+    """
+
+    def __init__(self, idf, centroids, names):
+        self.idf = idf
+        self.centroids = centroids
+        self.names = names
+        self.index = centroid_index(centroids)
+
+    @classmethod
+    def fit(cls, titres, k, seed=SEED):
+        """Apprend `k` groupes (au plus) sur les titres `titres`."""
+        documents = [Counter(folded for folded, _ in words(titre)) for titre in titres]
+        df = Counter(term for doc in documents for term in doc)
+        max_df = max(MIN_DF, MAX_DF * len(documents))
+        n = len(documents)
+        idf = {term: math.log((1 + n) / (1 + count)) + 1
+               for term, count in df.items() if MIN_DF <= count <= max_df}
+
+        vectors = [v for v in (tfidf(doc, idf) for doc in documents) if v]
+        model = cls(idf, mini_batch_kmeans(vectors, k, seed=seed), [])
+        model.names = model.name_clusters(titres)
+        return model
+
+    def vector(self, titre):
+        """Vecteur TF-IDF norme d'un titre."""
+        return tfidf(Counter(folded for folded, _ in words(titre)), self.idf)
+
+    def predict(self, titre):
+        """Groupe d'un titre ; None s'il ne partage aucun mot avec les groupes."""
+        if not self.centroids:
+            return None
+        return nearest(self.vector(titre), self.index, len(self.centroids))
+
+    def name_clusters(self, titres):
+        """Noms des groupes : mots les plus lourds, forme accentuee la plus frequente."""
+        forms = defaultdict(Counter)
+        for titre in titres:
+            for folded, word in words(titre):
+                forms[folded][word] += 1
+
+        names = []
+        for centroid in self.centroids:
+            terms = sorted(centroid, key=centroid.get, reverse=True)
+            size = NAME_TERMS
+            name = None
+            # Un mot de plus si le nom est deja pris
+            while name is None or (name in names and size <= len(terms)):
+                shown = [forms[term].most_common(1)[0][0] for term in terms[:size]]
+                name = ', '.join(shown) if shown else OTHERS_NAME
+                name = name[:1].upper() + name[1:]
+                size += 1
+            names.append(name)
+        return names
+
+    def annotate(self, inventaires, groupes):
+        """
+        Ajoute a chaque inventaire son groupe (`sous_thematique`, identifiant
+        d'un element de `groupes`) au fil de la lecture. Une fois le flux
+        epuise, `groupes` recoit les groupes non vides, tries par notices
+        decroissantes, avec leurs totaux.
+        """
+        stats = [{"id": c, "nom": name, "nb_inventaires": 0, "nb_notices": 0}
+                 for c, name in enumerate(self.names)]
+        others = {"id": len(self.names), "nom": OTHERS_NAME, "nb_inventaires": 0, "nb_notices": 0}
+        for inv in inventaires:
+            c = self.predict(inv.get('titre', ''))
+            group = others if c is None else stats[c]
+            inv['sous_thematique'] = group['id']
+            group['nb_inventaires'] += 1
+            group['nb_notices'] += inv.get('nb_notices', 0)
+            yield inv
+        stats.sort(key=lambda g: g['nb_notices'], reverse=True)
+        groupes[:] = [g for g in stats + [others] if g['nb_inventaires']]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sous-thematiques des grandes series")
+    parser.add_argument('--inventaires', type=Path, default=INVENTAIRES_PATH,
+                        help="Fichier d'inventaires (JSON ou NDJSON)")
+    parser.add_argument('--serie', action='append', default=[],
+                        help="Serie a regrouper (repetable ; defaut: les series "
+                             f"d'au moins {MIN_INVENTAIRES} inventaires)")
+    args = parser.parse_args(argv)
+
+    if not args.inventaires.exists():
+        print(f"Erreur: {args.inventaires} non trouve")
+        return
+
+    # build_full_visualization importe ce module
+    from build_full_visualization import extract_serie
+
+    start = time.perf_counter()
+    samples = defaultdict(TitleSample)
+    for fonds in iter_records(args.inventaires, 'fonds'):
+        samples[extract_serie(fonds.get('cote', ''))].add(fonds.get('titre', ''))
+
+    for serie, sample in sorted(samples.items()):
+        if args.serie and serie not in args.serie:
+            continue
+        if not args.serie and sample.count < MIN_INVENTAIRES:
+            continue
+        fit_start = time.perf_counter()
+        model = TitleClusters.fit(sample.titres, cluster_count(sample.count))
+        groupes = []
+        for _ in model.annotate(({'titre': t} for t in sample.titres), groupes):
+            pass
+        print(f"\nSerie {serie} : {sample.count} inventaires, {len(groupes)} groupes "
+              f"({time.perf_counter() - fit_start:.2f}s)")
+        for group in groupes:
+            print(f"  {group['nb_inventaires']:6}  {group['nom']}")
+
+    print(f"\nTermine en {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Apercu statique du treemap, insere dans docs/index.html.
+
+Calcule la disposition "squarified" (algorithme de d3-hierarchy, utilise par
+Plotly) des niveaux fonction et thematique, avec les memes valeurs et les
+memes couleurs que DataService.buildHierarchy (branchvalues 'remainder' :
+la surface d'un noeud est sa valeur plus celle de ses enfants). Le resultat
+est un SVG en ligne, affiche des le premier rendu de la page, que
+TreemapViz remplace par le treemap Plotly une fois les scripts charges.
+
+Les coordonnees sont en pourcentages : l'apercu suit la taille du conteneur
+sans deformer le texte.
+
+Usage:
+    python scripts/treemap_snapshot.py
+
+Auteur: Barbara Proenca
+"""
+
+import argparse
+import json
+import re
+from html import escape
+from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+
+# Chemins
+ARCHIVES_JSON_PATH = PROJECT_ROOT / "docs" / "data" / "archives.json"
+INDEX_PATH = PROJECT_ROOT / "docs" / "index.html"
+
+# Reperes de l'apercu dans index.html
+SNAPSHOT_START = "<!-- apercu-treemap:debut -->"
+SNAPSHOT_END = "<!-- apercu-treemap:fin -->"
+SNAPSHOT_RE = re.compile(re.escape(SNAPSHOT_START) + r".*?" + re.escape(SNAPSHOT_END), re.S)
+
+# Memes valeurs que DataService.js et TreemapViz.js
+ROOT_NAME = "Archives departementales 13"
+ROOT_COLOR = "#6366F1"
+COLOR_PALETTE = [
+    '#4A90D9', '#50C8C6', '#6B8E8E', '#7CB342', '#A4A424',
+    '#FF9800', '#5C4A72', '#FF4081', '#9C7BB8', '#E53935',
+    '#00ACC1', '#8D6E63', '#5E35B1', '#43A047', '#FB8C00'
+]
+PAD = {'t': 28, 'l': 6, 'r': 6, 'b': 6}
+MARGIN = {'t': 40, 'l': 5, 'r': 5, 'b': 5}
+
+# Taille de reference du conteneur (pixels) pour le calcul de la disposition
+WIDTH = 1100
+HEIGHT = 640
+
+FONT_SIZE = 12
+CHAR_WIDTH = 7.2  # Largeur moyenne d'un caractere de JetBrains Mono a 12px
+MIN_LABEL_WIDTH = 40
+MIN_LABEL_HEIGHT = 20
+
+
+def adjust_color(hex_color, percent):
+    """Eclaircit (ou assombrit) une couleur, comme DataService.adjustColor."""
+    num = int(hex_color.lstrip('#'), 16)
+    amt = round(2.55 * percent * 100)
+    r = min(255, max(0, (num >> 16) + amt))
+    g = min(255, max(0, ((num >> 8) & 0xFF) + amt))
+    b = min(255, max(0, (num & 0xFF) + amt))
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def squarify(values, x0, y0, x1, y1, total=None, ratio=1):
+    """
+    Disposition squarified (d3.treemapSquarify) de `values` (tries par
+    valeur decroissante) dans le rectangle donne. `total` (>= somme des
+    valeurs) laisse une partie du rectangle vide, comme branchvalues
+    'remainder'.
+
+    Returns:
+        Liste de rectangles (x0, y0, x1, y1), dans l'ordre de `values`
+    """
+    rects = [None] * len(values)
+    nodes = [(value, i) for i, value in enumerate(values) if value > 0]
+    remaining = total if total is not None else sum(v for v, _ in nodes)
+    i0 = 0
+    n = len(nodes)
+
+    while i0 < n and remaining > 0:
+        dx, dy = x1 - x0, y1 - y0
+        if dx <= 0 or dy <= 0:
+            break
+        sum_value = min_value = max_value = nodes[i0][0]
+        alpha = max(dy / dx, dx / dy) / (remaining * ratio)
+        beta = sum_value * sum_value * alpha
+        min_ratio = max(max_value / beta, beta / min_value)
+
+        # Ajouter des noeuds a la ligne tant que le pire rapport s'ameliore
+        i1 = i0 + 1
+        while i1 < n:
+            node_value = nodes[i1][0]
+            sum_value += node_value
+            min_value = min(min_value, node_value)
+            max_value = max(max_value, node_value)
+            beta = sum_value * sum_value * alpha
+            new_ratio = max(max_value / beta, beta / min_value)
+            if new_ratio > min_ratio:
+                sum_value -= node_value
+                break
+            min_ratio = new_ratio
+            i1 += 1
+
+        row = nodes[i0:i1]
+        if dx < dy:
+            # Ligne horizontale en haut du rectangle restant
+            y = y0 + dy * sum_value / remaining
+            x = x0
+            for value, i in row:
+                width = (x1 - x0) * value / sum_value
+                rects[i] = (x, y0, x + width, y)
+                x += width
+            y0 = y
+        else:
+            # Colonne a gauche du rectangle restant
+            x = x0 + dx * sum_value / remaining
+            y = y0
+            for value, i in row:
+                height = (y1 - y0) * value / sum_value
+                rects[i] = (x0, y, x, y + height)
+                y += height
+            x0 = x
+        remaining -= sum_value
+        i0 = i1
+
+    return rects
+
+
+def build_nodes(archives_data):
+    """
+    Noeuds du treemap (racine, fonctions, thematiques) avec leurs valeurs
+    propres et couleurs, comme DataService.buildHierarchy.
+    """
+    fonctions = archives_data.get('fonctions', [])
+    thematiques = archives_data.get('thematiques', [])
+
+    colors = {f['fonction']: COLOR_PALETTE[i % len(COLOR_PALETTE)] for i, f in enumerate(fonctions)}
+    children = {f['fonction']: [] for f in fonctions}
+    for theme in thematiques:
+        func_name = theme.get('Fonction') or theme.get('fonction')
+        if func_name not in children:
+            continue
+        value = theme.get('Métrage réel') or theme.get('nb_notices') or 0
+        children[func_name].append({
+            'label': theme.get('Thématique') or theme.get('Thematique') or '',
+            'value': value,
+            'total': value,
+            'color': adjust_color(colors[func_name], 0.15),
+            'children': []
+        })
+
+    nodes = []
+    for func in fonctions:
+        own = func.get('Métrage réel') or 0
+        kids = children[func['fonction']]
+        nodes.append({
+            'label': func['fonction'],
+            'value': own,
+            'total': own + sum(k['total'] for k in kids),
+            'color': colors[func['fonction']],
+            'children': kids
+        })
+
+    return {
+        'label': ROOT_NAME,
+        'value': 0,
+        'total': sum(node['total'] for node in nodes),
+        'color': ROOT_COLOR,
+        'children': nodes
+    }
+
+
+def layout(root, width=WIDTH, height=HEIGHT):
+    """
+    Positionne la racine, les fonctions et les thematiques.
+
+    Returns:
+        Liste de (noeud, rectangle, pourcentage du parent, profondeur)
+    """
+    placed = []
+
+    def place(node, rect, percent, depth):
+        placed.append((node, rect, percent, depth))
+        kids = sorted((k for k in node['children'] if k['total'] > 0),
+                      key=lambda k: k['total'], reverse=True)
+        if not kids:
+            return
+        x0, y0, x1, y1 = rect
+        inner = (x0 + PAD['l'], y0 + PAD['t'], x1 - PAD['r'], y1 - PAD['b'])
+        if inner[2] <= inner[0] or inner[3] <= inner[1]:
+            return
+        rects = squarify([k['total'] for k in kids], *inner, total=node['total'])
+        for kid, kid_rect in zip(kids, rects):
+            if kid_rect is not None:
+                place(kid, kid_rect, kid['total'] / node['total'], depth + 1)
+
+    place(root, (MARGIN['l'], MARGIN['t'], width - MARGIN['r'], height - MARGIN['b']), None, 0)
+    return placed
+
+
+def format_percent(fraction):
+    """0.1234 -> '12.3%' (trois chiffres significatifs, comme Plotly)."""
+    return f"{fraction * 100:.3g}%"
+
+
+def fit_label(text, width):
+    """Tronque un libelle a la largeur disponible."""
+    max_chars = int((width - 8) // CHAR_WIDTH)
+    if max_chars <= 1:
+        return ''
+    return text if len(text) <= max_chars else text[:max_chars - 1] + '…'
+
+
+def render_svg(placed, width=WIDTH, height=HEIGHT):
+    """SVG de l'apercu, coordonnees en pourcentages de la taille de reference."""
+    def pct(value, size):
+        return f"{value / size * 100:.3f}%"
+
+    parts = [
+        f'<svg id="treemap-snapshot" class="treemap-snapshot" width="100%" height="100%" '
+        f'role="img" aria-label="Apercu du treemap des fonds" '
+        f'font-family="JetBrains Mono, monospace" font-size="{FONT_SIZE}">',
+        f'<text x="{pct(MARGIN["l"] + 8, width)}" y="{pct(MARGIN["t"] - 14, height)}" '
+        f'fill="#94a3b8" font-size="11">{escape(ROOT_NAME)}</text>'
+    ]
+    for node, (x0, y0, x1, y1), percent, depth in placed:
+        title = node['label'] if percent is None else f"{node['label']} ({format_percent(percent)})"
+        parts.append(
+            f'<g><title>{escape(title)}</title>'
+            f'<rect x="{pct(x0, width)}" y="{pct(y0, height)}" '
+            f'width="{pct(x1 - x0, width)}" height="{pct(y1 - y0, height)}" '
+            f'fill="{node["color"]}" stroke="rgba(15, 15, 26, 0.6)" stroke-width="1.5"/>'
+        )
+        # Libelle en haut a gauche, puis le pourcentage du parent s'il y a la place
+        if x1 - x0 >= MIN_LABEL_WIDTH and y1 - y0 >= MIN_LABEL_HEIGHT:
+            label = fit_label(node['label'], x1 - x0)
+            if label:
+                parts.append(
+                    f'<text x="{pct(x0, width)}" y="{pct(y0, height)}" dx="5" dy="17" '
+                    f'fill="white">{escape(label)}</text>'
+                )
+            if percent is not None and y1 - y0 >= MIN_LABEL_HEIGHT + FONT_SIZE + 4 and not node['children']:
+                parts.append(
+                    f'<text x="{pct(x0, width)}" y="{pct(y0, height)}" dx="5" dy="33" '
+                    f'fill="white" fill-opacity="0.8">{format_percent(percent)}</text>'
+                )
+        parts.append('</g>')
+    parts.append('</svg>')
+    return '\n'.join(parts)
+
+
+def build_snapshot(archives_data):
+    """SVG de l'apercu pour les donnees de la visualisation."""
+    return render_svg(layout(build_nodes(archives_data)))
+
+
+def inject_snapshot(svg, index_path=INDEX_PATH):
+    """
+    Remplace l'apercu entre les reperes de index.html.
+
+    Returns:
+        True si index.html a ete modifie
+    """
+    index_path = Path(index_path)
+    html = index_path.read_text(encoding='utf-8')
+    if SNAPSHOT_START not in html:
+        print(f"Attention: reperes de l'apercu absents de {index_path}")
+        return False
+    updated = SNAPSHOT_RE.sub(lambda m: f"{SNAPSHOT_START}\n{svg}\n{SNAPSHOT_END}", html, count=1)
+    if updated == html:
+        return False
+    index_path.write_text(updated, encoding='utf-8')
+    return True
+
+
+def write_snapshot(archives_data, index_path=INDEX_PATH):
+    """Calcule et insere l'apercu (appele apres chaque publication de archives.json)."""
+    if not Path(index_path).exists():
+        return False
+    return inject_snapshot(build_snapshot(archives_data), index_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apercu statique du treemap dans index.html")
+    parser.add_argument('archives', nargs='?', type=Path, default=ARCHIVES_JSON_PATH)
+    parser.add_argument('--index', type=Path, default=INDEX_PATH)
+    args = parser.parse_args(argv)
+
+    with open(args.archives, 'r', encoding='utf-8') as f:
+        archives_data = json.load(f)
+    changed = write_snapshot(archives_data, args.index)
+    print(f"Apercu du treemap {'mis a jour' if changed else 'inchange'} dans {args.index}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Mode surveillance : reconstruction a la volee et serveur de developpement.
+
+Surveille les fichiers d'entree et relance uniquement l'etape concernee
+apres un court delai sans nouvelle modification (un classeur enregistre
+par Excel ou LibreOffice est ecrit en plusieurs fois) :
+
+    data/archives.xlsx          -> convert_excel_to_json (docs/data/archives.json)
+    data/inventaires_ad13.json  -> build_full_visualization (archives.json et pages)
+
+Les etapes sont executees dans ce processus : pandas et les modules restent
+importes d'une reconstruction a l'autre. docs/ est servi localement ; la
+page recoit un evenement (Server-Sent Events) et se recharge apres chaque
+reconstruction ou modification d'un fichier du site.
+
+Usage:
+    python scripts/watch_site.py --port 8000
+
+Auteur: Barbara Proenca
+"""
+
+import argparse
+import importlib
+import queue
+import threading
+import time
+import traceback
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from ad13_paths import PROJECT_ROOT
+
+# Chemins
+DATA_DIR = PROJECT_ROOT / "data"
+DOCS_DIR = PROJECT_ROOT / "docs"
+
+# Entrees surveillees -> commande (module, arguments) qui reconstruit leurs sorties
+WATCH_RULES = [
+    {
+        'name': 'convert',
+        'inputs': [DATA_DIR / "archives.xlsx"],
+        'module': 'convert_excel_to_json',
+        'argv': []
+    },
+    {
+        'name': 'build',
+        'inputs': [DATA_DIR / "inventaires_ad13.json"],
+        'module': 'build_full_visualization',
+        'argv': []
+    },
+]
+
+# Sorties des commandes, non surveillees comme fichiers du site
+GENERATED_DIRS = [DOCS_DIR / "data"]
+
+POLL_INTERVAL = 0.2  # Secondes entre deux verifications
+DEBOUNCE_DELAY = 0.3  # Secondes sans modification avant reconstruction
+KEEPALIVE_INTERVAL = 15  # Secondes entre deux commentaires SSE
+
+RELOAD_PATH = "/__reload"
+RELOAD_SNIPPET = f"""<script>
+  // Ajoute par watch_site.py : rechargement apres reconstruction
+  new EventSource('{RELOAD_PATH}').onmessage = () => location.reload();
+</script>
+"""
+
+
+def snapshot(paths):
+    """Date de modification et taille de chaque fichier (None s'il n'existe pas)."""
+    state = {}
+    for path in paths:
+        try:
+            stat = path.stat()
+            state[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            state[path] = None
+    return state
+
+
+def site_files(docs_dir=DOCS_DIR, generated_dirs=GENERATED_DIRS):
+    """Fichiers du site hors sorties generees."""
+    return [path for path in docs_dir.rglob('*')
+            if path.is_file() and not any(d in path.parents for d in generated_dirs)]
+
+
+class ReloadHub:
+    """Diffuse les evenements de rechargement aux pages connectees."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = []
+
+    def subscribe(self):
+        client = queue.Queue()
+        with self._lock:
+            self._clients.append(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.remove(client)
+
+    def publish(self, event):
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.put(event)
+        return len(clients)
+
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+    """Sert docs/ sans cache, avec le flux d'evenements de rechargement."""
+
+    def __init__(self, *args, hub=None, **kwargs):
+        self.hub = hub
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def end_headers(self):
+        self.send_header('Cache-Control', 'no-cache')
+        super().end_headers()
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == RELOAD_PATH:
+            self.stream_events()
+        elif path in ('/', '/index.html'):
+            self.send_index()
+        else:
+            super().do_GET()
+
+    def send_index(self):
+        """index.html avec le script de rechargement."""
+        html = (Path(self.directory) / "index.html").read_text(encoding='utf-8')
+        if '</body>' in html:
+            html = html.replace('</body>', RELOAD_SNIPPET + '</body>', 1)
+        else:
+            html += RELOAD_SNIPPET
+        body = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_events(self):
+        """Flux Server-Sent Events, jusqu'a la deconnexion de la page."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'keep-alive')
+        self.end_headers()
+        client = self.hub.subscribe()
+        try:
+            while True:
+                try:
+                    event = client.get(timeout=KEEPALIVE_INTERVAL)
+                    self.wfile.write(f"data: {event}\n\n".encode('utf-8'))
+                except queue.Empty:
+                    self.wfile.write(b": ping\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.hub.unsubscribe(client)
+            self.close_connection = True
+
+
+def start_server(hub, host, port, docs_dir=DOCS_DIR):
+    """Demarre le serveur de developpement dans un thread."""
+    handler = partial(DevRequestHandler, directory=str(docs_dir), hub=hub)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_rule(rule):
+    """
+    Execute la commande d'une regle dans ce processus.
+
+    Returns:
+        True si la reconstruction a reussi
+    """
+    start = time.perf_counter()
+    print(f"\n[{rule['name']}] {', '.join(p.name for p in rule['inputs'])} modifie, reconstruction...")
+    try:
+        module = importlib.import_module(rule['module'])
+        module.main(rule['argv'])
+    except SystemExit as e:
+        if e.code:
+            print(f"[{rule['name']}] Echec (code {e.code})")
+            return False
+    except Exception:
+        traceback.print_exc()
+        print(f"[{rule['name']}] Echec, en attente d'une nouvelle modification")
+        return False
+    print(f"[{rule['name']}] Reconstruit en {time.perf_counter() - start:.2f}s")
+    return True
+
+
+def watch(hub=None, rules=WATCH_RULES, interval=POLL_INTERVAL, debounce=DEBOUNCE_DELAY,
+          docs_dir=DOCS_DIR, stop=None):
+    """
+    Boucle de surveillance : attend que les fichiers modifies soient stables
+    pendant `debounce` secondes, relance les regles concernees et previent
+    les pages (`hub`). S'arrete quand `stop` (threading.Event) est leve.
+    """
+    stop = stop or threading.Event()
+    inputs = [path for rule in rules for path in rule['inputs']]
+    state = snapshot(inputs + site_files(docs_dir))
+    changed = set()
+    last_change = None
+
+    while not stop.wait(interval):
+        current = snapshot(inputs + site_files(docs_dir))
+        modified = {path for path in state.keys() | current.keys()
+                    if state.get(path) != current.get(path)}
+        state = current
+        if modified:
+            changed |= modified
+            last_change = time.monotonic()
+            continue
+        if not changed or time.monotonic() - last_change < debounce:
+            continue
+
+        rebuilt = [rule for rule in rules if changed & set(rule['inputs'])]
+        ok = all([run_rule(rule) for rule in rebuilt])
+        assets_changed = bool(changed - set(inputs))
+        changed = set()
+        # Les sorties ecrites par les regles ne declenchent pas de nouvelle reconstruction
+        state = snapshot(inputs + site_files(docs_dir))
+
+        if hub is not None and ok and (rebuilt or assets_changed):
+            event = 'data' if rebuilt else 'assets'
+            clients = hub.publish(event)
+            print(f"Rechargement envoye a {clients} page(s) ({event})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Surveillance des donnees et serveur de developpement")
+    parser.add_argument('--host', default='127.0.0.1', help="Adresse du serveur (defaut: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8000, help="Port du serveur (defaut: 8000)")
+    parser.add_argument('--no-serve', action='store_true',
+                        help="Reconstruit sans servir docs/")
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL,
+                        help="Intervalle de verification des fichiers (secondes)")
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE_DELAY,
+                        help="Delai sans modification avant reconstruction (secondes)")
+    args = parser.parse_args(argv)
+
+    hub = None
+    if not args.no_serve:
+        hub = ReloadHub()
+        server = start_server(hub, args.host, args.port)
+        print(f"Site servi sur http://{args.host}:{server.server_address[1]}/")
+
+    for rule in WATCH_RULES:
+        print(f"Surveillance: {', '.join(str(p.relative_to(PROJECT_ROOT)) for p in rule['inputs'])}"
+              f" -> {rule['name']}")
+    print("Ctrl+C pour arreter")
+
+    try:
+        watch(hub, interval=args.interval, debounce=args.debounce)
+    except KeyboardInterrupt:
+        print("\nArret de la surveillance")
+
+
+if __name__ == "__main__":
+    main()